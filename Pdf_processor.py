@@ -6,8 +6,14 @@ import io
 import re  # Import regular expressions
 import tempfile
 import streamlit as st
-import numpy as np
-from PIL import Image
+from logo_detection import LogoDetector
+from raster_logo_detection import RasterLogoDetector
+from pdf_optimizer import merge_duplicate_images
+from image_redaction import apply_grouped
+from redaction_records import RedactionBatch, TERM, NUMBER, LOGO
+
+WINDOW_PAGES = int(os.environ.get("PDF_WINDOW_PAGES", "50"))  # Pages held in memory per window
+WINDOWED_MIN_PAGES = int(os.environ.get("PDF_WINDOWED_MIN_PAGES", "300"))  # Longer documents are processed in windows
 
 # --- Display/Preview Functions ---
 
@@ -262,72 +268,70 @@ def merge_rects(rects, tolerance=5):
     merged.append(fitz.Rect(current_rect)) # Add the last one
     return merged
 
-def remove_all_logos(page, add_watermarks=True):
-    """Refined approach to remove logos."""
+def new_logo_detector(doc):
+    """LogoDetector with the thresholds used by remove_all_logos (top 10%, 20-200pt, max 40% width)."""
+    return LogoDetector(doc, header_ratio=0.10, max_width_ratio=0.40, min_dim=20, max_dim=200, image_padding=2)
+
+# Company-name suffixes that mark header text as part of a logo
+LOGO_TEXT_RE = re.compile(r"\b(?:" + "|".join(re.escape(p) for p in ["Ltd","Inc","GmbH","LLC","Corp","Limited","S.A.","B.V.","AG","Co.","Group","Tech","Solutions","Software","Intl","Holdings","PwC"]) + r")\b", re.IGNORECASE)
+
+def remove_all_logos(page, add_watermarks=True, detector=None, image_strategy=None, raster_detector=None):
+    """Refined approach to remove logos. Pass a shared LogoDetector to keep one xref placement map for the document.
+    Logos inside scanned page images are found in the pixels (RasterLogoDetector), as in custom.redact_pdf_bytes.
+    Images fully inside a logo box are removed, partly covered ones blanked only in the overlap (see image_redaction)."""
     log_entries = []
-    watermark_areas = []
-    potential_logo_rects = []
+    batch = RedactionBatch()
     try:
         page_width = page.rect.width; page_height = page.rect.height
-        max_logo_y0 = page_height * 0.10; max_logo_width = page_width * 0.40
-        min_dim = 20; max_dim = 200
+        max_logo_y0 = page_height * 0.10
+        if detector is None: detector = new_logo_detector(page.parent)
+        if raster_detector is None: raster_detector = RasterLogoDetector()
 
         # Strategy 1: Images
         try:
-            img_list = page.get_images(full=True)
-            for _, img_info in enumerate(img_list):
-                xref = img_info[0]; img_instances = page.get_image_rects(xref, transform=False)
-                for r in img_instances:
-                    if r.y0 < max_logo_y0 and min_dim < r.width < max_logo_width and min_dim < r.height < max_dim and r.is_valid and not r.is_empty:
-                        exp_r = (r + (-2, -2, 2, 2)).normalize()
-                        potential_logo_rects.append(exp_r); watermark_areas.append({"rect": exp_r, "priority": 1, "type": "image"})
+            for exp_r in detector.image_logo_rects(page):
+                batch.add_rect(exp_r, LOGO)
         except Exception as e: log_entries.append(f"Warn: Img L Rmv pg {page.number + 1}: {e}")
 
         # Strategy 2: Drawings
         try:
-            draw_rect = fitz.Rect(0, 0, page_width, max_logo_y0 + 10)
-            drawings = page.get_drawings(rect=draw_rect)
-            for d in drawings:
-                if "rect" in d:
-                    r = fitz.Rect(d["rect"])
-                    if r.y0 < max_logo_y0 and min_dim < r.width < max_logo_width and min_dim < r.height < max_dim and r.is_valid and not r.is_empty:
-                        potential_logo_rects.append(r); watermark_areas.append({"rect": r, "priority": 1, "type": "drawing"})
+            for r in detector.vector_logo_rects(page):
+                batch.add_rect(r, LOGO)
         except Exception as e: log_entries.append(f"Warn: Draw L Rmv pg {page.number + 1}: {e}")
 
+        # Strategy 2b: Logos inside scanned page images
+        try:
+            for r in raster_detector.logo_rects(page):
+                batch.add_rect(r, LOGO)
+        except Exception as e: log_entries.append(f"Warn: Raster L Rmv pg {page.number + 1}: {e}")
+
         # Strategy 3: Text Patterns
         try:
-            patterns = ["Ltd","Inc","GmbH","LLC","Corp","Limited","S.A.","B.V.","AG","Co.","Group","Tech","Solutions","Software","Intl","Holdings","PwC"]
             txt_rect = fitz.Rect(0, 0, page_width, page_height * 0.15)
             blocks = page.get_text("dict", flags=fitz.TEXT_PRESERVE_LIGATURES, clip=txt_rect)["blocks"]
             for block in blocks:
                 if block["type"] == 0:
                     for line in block.get("lines", []):
                         for span in line.get("spans", []):
-                            txt = span.get("text",""); r = fitz.Rect(span.get("bbox",(0,0,0,0)))
-                            if r.y0 < max_logo_y0:
-                                for p in patterns:
-                                    if re.search(r'\b' + re.escape(p) + r'\b', txt, re.IGNORECASE):
-                                        exp_r = (r + (-5, -3, 5, 3)).normalize()
-                                        if exp_r.is_valid and not exp_r.is_empty:
-                                            potential_logo_rects.append(exp_r); watermark_areas.append({"rect": exp_r, "priority": 2, "type": "text", "text": p})
-                                            break # Found pattern, next span
+                            x0, y0, x1, y1 = span.get("bbox",(0,0,0,0))
+                            if y0 < max_logo_y0 and LOGO_TEXT_RE.search(span.get("text","")):
+                                x0, x1 = min(x0, x1) - 5, max(x0, x1) + 5; y0, y1 = min(y0, y1) - 3, max(y0, y1) + 3
+                                if x1 > x0 and y1 > y0: batch.add(x0, y0, x1, y1, LOGO)
         except Exception as e: log_entries.append(f"Warn: Text L Rmv pg {page.number + 1}: {e}")
 
         # Consolidate and Apply Redactions
         applied_count = 0
-        if potential_logo_rects:
-            final_rects = merge_rects(potential_logo_rects, tolerance=5)
+        if len(batch):
+            final_rects = merge_rects(batch.rects(), tolerance=5)
             if final_rects:
                 log_entries.append(f"Applying {len(final_rects)} logo redaction(s) pg {page.number + 1}")
-                for r in final_rects:
-                    if r.is_valid and not r.is_empty: page.add_redact_annot(r, fill=(1, 1, 1))
-                applied_count = page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_REMOVE)
+                final_batch = RedactionBatch(); final_batch.extend((r for r in final_rects if r.is_valid and not r.is_empty), LOGO, (1, 1, 1))
+                applied_count = len(final_batch) if apply_grouped(page, final_batch, image_strategy) else 0
                 if applied_count > 0: log_entries.append(f"Applied {applied_count} logo annot(s) pg {page.number + 1}")
 
         # Add Watermarks
         if add_watermarks and applied_count > 0:
             color=(0.7,0.0,0.7); fill=(0.98,0.9,0.98); fs=9; max_wm=2
-            watermark_areas.sort(key=lambda x: x["priority"])
             placed = []
             for r in final_rects: # Base placement on actual redacted rects
                 if len(placed) >= max_wm: break
@@ -354,7 +358,7 @@ def remove_all_logos(page, add_watermarks=True):
 def mask_currency_values(page):
     """Finds currency symbols and masks the adjacent numerical value."""
     log_entries = []
-    redaction_rects_data = []
+    batch = RedactionBatch()
     processed_indices = set()
     num_re = re.compile(r"^-?([0-9]{1,3}(?:[,.\s][0-9]{3})*|[0-9]+)(?:[,.][0-9]+)?$")
     pre_sym = {"$", "£", "€", "₹", "¥"}; post_sym = {"€", "₽", "zł"}
@@ -363,46 +367,42 @@ def mask_currency_values(page):
         words = sorted(page.get_text("words", delimiters="", flags=fitz.TEXT_PRESERVE_WHITESPACE), key=lambda w: (w[1], w[0]))
         for i, w_info in enumerate(words):
             if i in processed_indices: continue
-            x0,y0,x1,y1,w_txt,_,_,_ = w_info; curr_r=fitz.Rect(x0,y0,x1,y1); w_strip=w_txt.strip()
-            found_val, comb_r, match_idx, curr_x1 = None, None, {i}, x1
+            x0,y0,x1,y1,w_txt,_,_,_ = w_info; w_strip=w_txt.strip()
+            comb, match_idx, curr_x1 = None, None, x1  # comb: union (x0, y0, x1, y1) of the matched words
 
             # Check 1: Pre-symbol -> Number(s)
             if w_strip in pre_sym:
-                curr_r=fitz.Rect(x0,y0,x1,y1); parts=[w_txt]
+                cx0,cy0,cx1,cy1 = x0,y0,x1,y1; match_idx=[i]
                 for j in range(i+1, len(words)):
-                    nw_info=words[j]; nx0,ny0,nx1,ny1,ntxt,_,_,_=nw_info
+                    nx0,ny0,nx1,ny1,ntxt,_,_,_=words[j]
                     if abs(ny0-y0)>5 or j in processed_indices: break
                     if nx0 > curr_x1 + 15: break
                     ntxt_strip = ntxt.strip()
                     if num_re.match(ntxt_strip):
-                        curr_r|=fitz.Rect(nx0,ny0,nx1,ny1); parts.append(ntxt); match_idx.add(j); curr_x1=nx1
+                        cx0,cy0,cx1,cy1 = min(cx0,nx0),min(cy0,ny0),max(cx1,nx1),max(cy1,ny1); match_idx.append(j); curr_x1=nx1
                     elif ntxt_strip and not ntxt_strip.startswith(("-","+")): break
-                if len(parts)>1: found_val="".join(parts); comb_r=curr_r
+                if len(match_idx)>1: comb=(cx0,cy0,cx1,cy1)
 
             # Check 2: Number -> Post-symbol
             elif num_re.match(w_strip):
-                num_r=curr_r; parts=[w_txt]; match_idx={i}; curr_x1=x1
                 for k in range(i+1, min(i+3, len(words))):
-                    nw_info=words[k]; nx0,ny0,nx1,ny1,ntxt,_,_,_=nw_info
+                    nx0,ny0,nx1,ny1,ntxt,_,_,_=words[k]
                     if abs(ny0-y0)>5 or k in processed_indices: continue
-                    ntxt_strip = ntxt.strip()
-                    if ntxt_strip in post_sym and nx0 < curr_x1+15:
-                        comb_r=num_r|fitz.Rect(nx0,ny0,nx1,ny1); found_val="".join(parts+[ntxt]); match_idx.add(k); break
+                    if ntxt.strip() in post_sym and nx0 < curr_x1+15:
+                        comb=(min(x0,nx0),min(y0,ny0),max(x1,nx1),max(y1,ny1)); match_idx=[i,k]; break
 
             # Process match
-            if found_val and comb_r and comb_r.is_valid and not comb_r.is_empty:
-                redaction_rects_data.append({"rect": comb_r, "text": found_val.strip()})
+            if comb and comb[2] > comb[0] and comb[3] > comb[1]:
+                batch.add(*comb, NUMBER, (1,1,1))
                 processed_indices.update(match_idx)
 
     except Exception as e: log_entries.append(f"ERROR Currency Search pg {page.number + 1}: {e}")
 
     # Apply redactions
     applied_count = 0
-    if redaction_rects_data:
-        log_entries.append(f"Applying {len(redaction_rects_data)} currency val redaction(s) pg {page.number + 1}")
-        for item in redaction_rects_data:
-            r=item["rect"]; repl="XXXX"
-            page.add_redact_annot(r, text=repl, fill=(1,1,1), fontsize=8, text_color=(0,0,0), align=fitz.TEXT_ALIGN_CENTER)
+    if len(batch):
+        log_entries.append(f"Applying {len(batch)} currency val redaction(s) pg {page.number + 1}")
+        batch.add_annots(page, text="XXXX", fontsize=8, text_color=(0,0,0), align=fitz.TEXT_ALIGN_CENTER)
         applied_count = page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_NONE)
         if applied_count > 0: log_entries.append(f"Applied {applied_count} currency val annot(s) pg {page.number + 1}")
 
@@ -412,7 +412,7 @@ def mask_currency_values(page):
 def replace_text_efficiently(page, words_to_replace):
     """Efficiently replaces user-defined words/phrases with 'X's."""
     log_entries = []
-    redaction_items = []
+    batch = RedactionBatch()
     if not isinstance(words_to_replace, (list, tuple, set)): words_to_replace = []
 
     for word in words_to_replace:
@@ -425,36 +425,106 @@ def replace_text_efficiently(page, words_to_replace):
                 for inst in instances:
                     if inst.is_valid and not inst.is_empty:
                         num_xxx = max(3, round(inst.width / 5.0))
-                        redaction_items.append((inst, "X" * num_xxx))
+                        batch.add_rect(inst, TERM, (1,1,1), "X" * num_xxx)
         except Exception as e: log_entries.append(f"Warn: Search User Word '{word_str}' pg {page.number + 1}: {e}")
 
     applied_count = 0
-    if redaction_items:
-        log_entries.append(f"Applying {len(redaction_items)} user word redaction(s) pg {page.number + 1}")
-        for rect, replacement in redaction_items:
-            page.add_redact_annot(rect, text=replacement, fill=(1,1,1), fontsize=8, text_color=(0,0,0), align=fitz.TEXT_ALIGN_CENTER)
+    if len(batch):
+        log_entries.append(f"Applying {len(batch)} user word redaction(s) pg {page.number + 1}")
+        batch.add_annots(page, fontsize=8, text_color=(0,0,0), align=fitz.TEXT_ALIGN_CENTER)
         applied_count = page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_NONE)
         if applied_count > 0: log_entries.append(f"Applied {applied_count} user word annot(s) pg {page.number + 1}")
 
     return log_entries
 
 # --- Main Processing Function ---
-def process_pdf_with_enhanced_protection(pdf_path, words_to_replace, output_path, remove_logos=True, add_watermarks=True):
-    """Main processing function for standard PDFs."""
+def process_page(page, words_to_replace, remove_logos=True, add_watermarks=True, logo_detector=None):
+    """Applies logo, currency and user-word masking to one page; returns its log entries."""
+    page_logs = []
+    if remove_logos: page_logs.extend(remove_all_logos(page, add_watermarks, detector=logo_detector))
+    page_logs.extend(mask_currency_values(page))
+    if words_to_replace: page_logs.extend(replace_text_efficiently(page, words_to_replace))
+    return page_logs
+
+def process_window(src_path, start, end, words_to_replace, output_path, remove_logos, add_watermarks, word_pages, log_data):
+    """Redacts pages start..end-1 of src_path in a document of their own and appends them to output_path."""
+    src = fitz.open(src_path); window = fitz.open(); out = None
+    try:
+        window.insert_pdf(src, from_page=start, to_page=end - 1)
+        src.close(); src = None  # Drops the source objects loaded for this window
+        logo_detector = new_logo_detector(window) if remove_logos else None  # Decisions are keyed by xref, which is per document
+        for offset in range(len(window)):
+            page_num = start + offset; page_words = words_to_replace
+            if word_pages is not None: page_words = [w for w in words_to_replace if page_num in word_pages[w]]
+            page_logs = process_page(window[offset], page_words, remove_logos, add_watermarks, logo_detector)
+            if page_logs: log_data.append(f"--- Page {page_num + 1} ---"); log_data.extend(page_logs)
+
+        merged = merge_duplicate_images(window)["merged"]  # Once, on the redacted output
+        if merged: log_data.append(f"Merged {merged} duplicate image stream(s) in pages {start + 1}-{end}")
+        if start == 0:
+            window.save(output_path, garbage=4, deflate=True, clean=True)
+        else:
+            # Incremental save appends only this window's objects to the file on disk
+            out = fitz.open(output_path)
+            out.insert_pdf(window)
+            out.save(output_path, incremental=True, deflate=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+    finally:
+        for d in (out, window, src):
+            if d: d.close()
+        fitz.TOOLS.store_shrink(100)  # Empties MuPDF's cache of decoded fonts and images
+
+def process_pdf_windowed(pdf_path, words_to_replace, output_path, page_count, remove_logos=True, add_watermarks=True, word_pages=None, window_pages=WINDOW_PAGES, log_data=None):
+    """Processes a long PDF window_pages at a time so memory stays flat whatever its length.
+    The output is assembled on disk with incremental saves; resources shared between windows (fonts, letterhead images) are stored once per window.
+    Only the standard route is windowed: scanned documents go through scanned_files.process_scanned_pdf (not part of this tree), which loads them whole."""
+    log_data = [] if log_data is None else log_data
+    tmp_path = f"{output_path}.partial"
+    try:
+        for start in range(0, page_count, window_pages):
+            end = min(start + window_pages, page_count)
+            process_window(pdf_path, start, end, words_to_replace, tmp_path, remove_logos, add_watermarks, word_pages, log_data)
+            log_data.append(f"Window pages {start + 1}-{end} of {page_count} written")
+        os.replace(tmp_path, output_path)
+        log_data.append(f"Output {os.path.getsize(output_path)} bytes (input {os.path.getsize(pdf_path)})")
+    finally:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+    return log_data
+
+def process_pdf_with_enhanced_protection(pdf_path, words_to_replace, output_path, remove_logos=True, add_watermarks=True, term_index=None, window_pages=None):
+    """Main processing function for standard PDFs. A TermIndex limits word searches to pages that can match.
+    Documents over WINDOWED_MIN_PAGES pages (or any document when window_pages is given) are processed in page windows."""
     doc = None; log_data = []; filename = os.path.basename(pdf_path); success = False
     try:
         doc = fitz.open(pdf_path)
         if len(doc) == 0: log_data.append(f"Skip '{filename}': 0 pages."); return log_data
         log_data.append(f"Processing '{filename}'...")
 
+        if window_pages or len(doc) > WINDOWED_MIN_PAGES:
+            page_count = len(doc); doc.close(); doc = None
+            word_pages = None
+            if term_index is not None and words_to_replace:
+                word_pages = {w: term_index.candidate_pages(str(w)) for w in words_to_replace}
+            log_data.append(f"Windowed mode: {window_pages or WINDOW_PAGES} pages at a time")
+            process_pdf_windowed(pdf_path, words_to_replace, output_path, page_count, remove_logos, add_watermarks,
+                                 word_pages, window_pages or WINDOW_PAGES, log_data)
+            success = True; log_data.append(f"--- FINISHED OK: '{filename}' ---")
+            return log_data
+
+        logo_detector = new_logo_detector(doc) if remove_logos else None
+        word_pages = None
+        if term_index is not None and words_to_replace:
+            word_pages = {w: term_index.candidate_pages(str(w)) for w in words_to_replace}
+
         for page_num in range(len(doc)):
-            page = doc[page_num]; page_logs = []
-            if remove_logos: logo_logs = remove_all_logos(page, add_watermarks); page_logs.extend(logo_logs)
-            curr_logs = mask_currency_values(page); page_logs.extend(curr_logs)
-            if words_to_replace: user_logs = replace_text_efficiently(page, words_to_replace); page_logs.extend(user_logs)
+            page_words = words_to_replace
+            if word_pages is not None: page_words = [w for w in words_to_replace if page_num in word_pages[w]]
+            page_logs = process_page(doc[page_num], page_words, remove_logos, add_watermarks, logo_detector)
             if page_logs: log_data.append(f"--- Page {page_num + 1} ---"); log_data.extend(page_logs)
 
+        merge_stats = merge_duplicate_images(doc)  # Once, on the redacted output; duplicates are dropped by the garbage=4 save
         doc.save(output_path, garbage=4, deflate=True, clean=True, linear=False)
+        log_data.append(f"Merged {merge_stats['merged']} of {merge_stats['images']} image stream(s); "
+                        f"output {os.path.getsize(output_path)} bytes (input {os.path.getsize(pdf_path)})")
         success = True; log_data.append(f"--- FINISHED OK: '{filename}' ---")
     except fitz.fitz.FileNotFoundError: log_data.append(f"FATAL Error: Not found '{pdf_path}'")
     except Exception as e:
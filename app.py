@@ -1,25 +1,69 @@
 import os
 import io
 import json
+import uuid
+import hashlib
+import time
 import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait
+from functools import partial
 from datetime import datetime
-from zipfile import ZipFile
-from flask import Flask, render_template, request, send_file, jsonify
+from zipfile import ZipFile, ZIP_DEFLATED
+from flask import Flask, Response, render_template, request, send_file, jsonify
 from werkzeug.utils import secure_filename
 from werkzeug.exceptions import RequestEntityTooLarge
 
 # Import your custom processor
-from custom import redact_pdf_bytes, validate_pdf_bytes
+from custom import redact_page, redact_pdf_file, check_pdf_signature, HEADER_WINDOW
+from incremental import IncrementalRedactor
+from term_index import TermIndex
+from job_manifest import JobManifest, hash_bytes, hash_options
+from content_store import ContentStore
+from presets import PRESETS, redact_with_preset, redact_preset_file, parse_page_range
+from resource_governor import ResourceGovernor, BudgetExceeded, DEFAULT_MAX_MEMORY_MB
+from streaming_upload import iter_multipart, UploadPart
+from chunked_upload import ChunkedUploads, UploadError
+from page_stream import PageSpool, sse_event, page_event, stream_job_pages
+from raster_logo_detection import RasterLogoDetector
 
 # Configuration
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_MB', '500')) * 1024 * 1024  # Whole multi-file upload body
 ALLOWED_EXTENSIONS = {'pdf'}
+PREVIEW_SESSION_LIMIT = 8  # Incremental preview documents kept in memory
+TERM_INDEX_LIMIT = 32  # Per-document term indexes kept in memory
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', min(4, os.cpu_count() or 1)))  # BGV / offer worker processes
+
+STORE_MAX_BYTES = int(os.environ.get('STORE_MAX_MB', '2048')) * 1024 * 1024
 
 # Ensure upload directory exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Originals and outputs stored once by SHA-256, evicted LRU beyond the cap
+content_store = ContentStore(os.path.join(UPLOAD_FOLDER, "store"), max_bytes=STORE_MAX_BYTES)
+
+# Resumable chunked uploads for files over MAX_FILE_SIZE (one chunk per request)
+chunked_uploads = ChunkedUploads(os.path.join(UPLOAD_FOLDER, "chunks"))
+
+# Budgets for chunked uploads (up to CHUNKED_MAX_MB); the per-request
+# defaults are sized for files under MAX_FILE_SIZE
+LARGE_FILE_LIMITS = {
+    "max_pages": int(os.environ.get('CHUNKED_MAX_PAGES', '5000')),
+    "max_seconds": float(os.environ.get('CHUNKED_MAX_SECONDS', '900')),
+    "max_memory_mb": DEFAULT_MAX_MEMORY_MB
+}
+
+# Persistent job records - a repeated or restarted /custom batch reuses finished files
+job_manifest = JobManifest(os.path.join(UPLOAD_FOLDER, "jobs.sqlite3"))
+
+# Field rectangles of known letter/BGV templates, learned from full runs
+# (one SQLite registry shared by all worker processes)
+TEMPLATE_REGISTRY_PATH = os.path.join(UPLOAD_FOLDER, "templates.sqlite3")
+
 # Flask app setup
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
@@ -43,18 +87,73 @@ def validate_pdf_file(file):
     if not allowed_file(file.filename):
         return False, "Only PDF files are allowed"
     
-    # Read file content for validation
-    file_content = file.read()
+    # Constant-time check of the header only; the document is parsed once,
+    # by the processing stage
+    file.seek(0)
+    head = file.read(HEADER_WINDOW)
     file.seek(0)  # Reset file pointer
-    
-    if len(file_content) == 0:
+    if not head:
         return False, "File is empty"
     
-    if not validate_pdf_bytes(file_content):
-        return False, "Invalid PDF file"
+    is_valid, message = check_pdf_signature(head)
+    if not is_valid:
+        return False, f"Invalid PDF file: {message}"
     
     return True, "Valid"
 
+def stored_uploads(value):
+    """
+    Files sent beforehand through the chunked upload routes
+    
+    Args:
+        value: The ``stored_files`` form field, a JSON list of
+            {file_id, filename} from ``/uploads/<id>/complete``
+    
+    Returns:
+        list: dicts with filename, path and sha256 (the file_id)
+    
+    Raises:
+        ValueError: If the field is malformed or names an unknown file
+    """
+    try:
+        entries = json.loads(value or '[]')
+    except json.JSONDecodeError:
+        raise ValueError("Invalid stored files")
+    if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+        raise ValueError("Invalid stored files")
+    files = []
+    for entry in entries:
+        file_id = str(entry.get("file_id", ""))
+        if len(file_id) != 64 or not content_store.contains(file_id):
+            raise ValueError(f"Unknown uploaded file '{entry.get('filename')}'")
+        files.append({"filename": secure_filename(entry.get("filename") or '') or f"{file_id[:12]}.pdf",
+                      "path": content_store.path(file_id), "sha256": file_id})
+    return files
+
+def requested_page_range(form):
+    """
+    The page range asked for on a BGV / offer form
+    
+    Args:
+        form: Flask or Starlette form data with ``page_range`` and
+            ``page_range_value``
+    
+    Returns:
+        str or None: The range ("1,3,5-12"), or None for all pages
+    
+    Raises:
+        ValueError: If the range cannot be parsed
+    """
+    if form.get('page_range') != 'specific':
+        return None
+    page_range = (form.get('page_range_value') or '').strip() or None
+    if page_range:
+        try:
+            parse_page_range(page_range, 0)
+        except ValueError:
+            raise ValueError("Invalid page range")
+    return page_range
+
 def generate_output_filename(original_filename, suffix="_redacted"):
     """Generate output filename with timestamp"""
     name, ext = os.path.splitext(original_filename)
@@ -63,8 +162,15 @@ def generate_output_filename(original_filename, suffix="_redacted"):
 
 @app.errorhandler(RequestEntityTooLarge)
 def handle_file_too_large(e):
+    if e.description != RequestEntityTooLarge.description:
+        # Per-file limit from streaming_upload, naming the file
+        return jsonify({"error": e.description}), 413
     return jsonify({"error": "File too large. Maximum size is 50MB."}), 413
 
+@app.errorhandler(BudgetExceeded)
+def handle_budget_exceeded(e):
+    return jsonify({"error": str(e)}), 422
+
 @app.errorhandler(Exception)
 def handle_general_error(e):
     logger.error(f"Unexpected error: {e}")
@@ -100,74 +206,330 @@ def about():
 def custom():
     if request.method == 'POST':
         try:
-            files = request.files.getlist('pdfs')
-            if not files or all(f.filename == '' for f in files):
+            boundary = request.mimetype_params.get('boundary')
+            if request.mimetype != 'multipart/form-data' or not boundary:
                 return jsonify({"error": "No files uploaded"}), 400
-
-            # Validate files
-            for file in files:
-                is_valid, message = validate_pdf_file(file)
-                if not is_valid:
-                    return jsonify({"error": f"File '{file.filename}': {message}"}), 400
-
-            # Parse terms map
-            terms_map = {}
-            try:
-                terms_data = request.form.get('custom_terms', '{}')
-                terms_map = json.loads(terms_data)
-                logger.info(f"Parsed terms map: {terms_map}")
-            except json.JSONDecodeError as e:
-                logger.error(f"JSON decode error: {e}")
-                return jsonify({"error": "Invalid terms format"}), 400
-            
-            # FIXED: Correct parameter checking for checkboxes
-            redact_logos = request.form.get('redact_logos') == 'on'
-            redact_numbers = request.form.get('redact_numbers') == 'on'
             
-            logger.info(f"Processing with redact_logos={redact_logos}, redact_numbers={redact_numbers}")
-            logger.info(f"Form data received: {dict(request.form)}")
+            # A batch may hold many files: the body is capped at MAX_BATCH_SIZE
+            # and each file part at MAX_FILE_SIZE while it is parsed
+            if (request.content_length or 0) > MAX_BATCH_SIZE:
+                return jsonify({"error": f"Upload too large. Maximum request size is {MAX_BATCH_SIZE // (1024 * 1024)}MB."}), 413
+            request.max_content_length = MAX_BATCH_SIZE
             
-            return process_custom_files(files, terms_map, redact_logos, redact_numbers)
+            # Parsed straight from the body stream - files are redacted while
+            # later files are still uploading
+            return process_custom_upload(request.stream, boundary, stream_pages=wants_page_stream())
 
+        except RequestEntityTooLarge:
+            raise
         except Exception as e:
             logger.error(f"Custom processing error: {e}")
             return jsonify({"error": f"Processing failed: {str(e)}"}), 500
 
     return render_template('custom.html')
 
-def process_custom_files(files, terms_map, redact_logos, redact_numbers=False):
-    """Process custom redaction files with proper parameter handling"""
-    outputs = []
+def wants_page_stream():
+    """Whether the client asked for redacted pages as server-sent events"""
+    return (request.args.get('stream') == 'pages' or
+            request.accept_mimetypes.best == 'text/event-stream')
+
+def process_custom_upload(stream, boundary, stream_pages=False):
+    """
+    Redact /custom uploads while the request body is still arriving
     
-    for file in files:
-        try:
-            filename = secure_filename(file.filename)
-            terms = terms_map.get(filename, [])
-            
-            # Ensure terms is a list
-            if not isinstance(terms, list):
-                terms = []
-            
-            file_content = file.read()
-            
+    The multipart body is parsed incrementally. As soon as the options
+    (custom_terms, redact_logos, redact_numbers - sent before the files by
+    custom.html) and a complete file part are in, that file is dispatched to
+    the worker pool, so redaction overlaps with the rest of the upload.
+    Files that arrive before the options wait until the options are known
+    (or the body ends).
+    
+    With ``stream_pages`` the response is a server-sent event stream instead
+    of a download: each redacted page is sent as soon as the worker finishes
+    it (see ``stream_custom_jobs``).
+    """
+    incoming = os.path.join(UPLOAD_FOLDER, "incoming")
+    pool = get_batch_pool()
+    limits = ResourceGovernor().limits()
+    fields = {}
+    terms_map = {}
+    waiting = []
+    jobs = []
+    spooled = []
+    streaming = False
+
+    def options_ready():
+        return all(name in fields for name in ('custom_terms', 'redact_logos', 'redact_numbers'))
+
+    def dispatch(part, spooled_file=True):
+        filename = secure_filename(part.filename)
+        terms = terms_map.get(filename, [])
+        if not isinstance(terms, list):
+            terms = []
+        redact_logos = fields.get('redact_logos') == 'on'
+        redact_numbers = fields.get('redact_numbers') == 'on'
+        job = {
+            "filename": filename,
+            "input_hash": part.sha256,
+            "options_hash": hash_options({
+                "engine": "custom",
+                "terms": sorted(terms),
+                "redact_logos": redact_logos,
+                "redact_numbers": redact_numbers
+            })
+        }
+        
+        # Identical input and options - serve the stored output
+        record = job_manifest.completed(job["input_hash"], job["options_hash"])
+        output_id = os.path.splitext(os.path.basename(record['output_path']))[0] if record else None
+        if stream_pages:
+            # Streamed results are downloaded from the store, not read here
+            stored_bytes = b"" if record and content_store.contains(output_id) else None
+        else:
+            stored_bytes = content_store.get(output_id) if record else None
+        if stored_bytes is not None:
+            logger.info(f"Reusing stored output for {filename}")
+            job["output"] = stored_bytes
+            job["output_id"] = output_id
+        else:
             logger.info(f"Processing {filename} with {len(terms)} terms, redact_logos={redact_logos}, redact_numbers={redact_numbers}")
-            
-            # Use enhanced redact_pdf_bytes function with proper boolean values
-            redacted_bytes = redact_pdf_bytes(
-                pdf_bytes=file_content, 
-                terms=terms, 
-                redact_logos=redact_logos,
-                redact_numbers=redact_numbers
-            )
-            outputs.append((generate_output_filename(filename), redacted_bytes))
-            
-        except Exception as e:
-            logger.error(f"Error processing {file.filename}: {e}")
-            continue
+            job["start"] = job_manifest.start(job["input_hash"], job["options_hash"], name=filename)
+            if spooled_file:
+                job["path"] = part.path
+            if stream_pages:
+                job["spool"] = PageSpool(os.path.join(UPLOAD_FOLDER, "pages", uuid.uuid4().hex))
+            job["future"] = pool.submit(redact_pdf_file, part.path, terms, redact_logos, redact_numbers,
+                                        TEMPLATE_REGISTRY_PATH, limits if spooled_file else LARGE_FILE_LIMITS,
+                                        job.get("spool"), job["spool"].output_path if stream_pages else None)
+        if not spooled_file:
+            # Reference taken by upload_complete, held until this job is done
+            job["stored"] = part.sha256
+        jobs.append(job)
     
-    if not outputs:
-        return jsonify({"error": "No files were successfully processed"}), 500
+    def cleanup():
+        # Early returns leave work in flight; it must stop reading the spool
+        # files before they are removed
+        running = [job["future"] for job in jobs if "future" in job and not job["future"].cancel()]
+        wait(running)
+        for path in spooled:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        for job in jobs:
+            if "spool" in job:
+                job["spool"].remove()
+            if "stored" in job:
+                content_store.release(job["stored"])
+
+    try:
+        for part in iter_multipart(stream, boundary, incoming, max_file_size=MAX_FILE_SIZE):
+            if part.is_file:
+                spooled.append(part.path)
+                if part.name != 'pdfs' or not part.filename:
+                    continue
+                if not allowed_file(part.filename):
+                    return jsonify({"error": f"File '{part.filename}': Only PDF files are allowed"}), 400
+                if part.size == 0:
+                    return jsonify({"error": f"File '{part.filename}': File is empty"}), 400
+                is_valid, message = check_pdf_signature(part.head)
+                if not is_valid:
+                    return jsonify({"error": f"File '{part.filename}': Invalid PDF file: {message}"}), 400
+                if options_ready():
+                    dispatch(part)
+                else:
+                    waiting.append((part, True))
+                continue
+
+            fields[part.name] = part.value
+            if part.name == 'custom_terms':
+                try:
+                    terms_map = json.loads(part.value or '{}')
+                    logger.info(f"Parsed terms map: {terms_map}")
+                except json.JSONDecodeError as e:
+                    logger.error(f"JSON decode error: {e}")
+                    return jsonify({"error": "Invalid terms format"}), 400
+            if part.name == 'stored_files':
+                try:
+                    stored_files = stored_uploads(part.value)
+                except ValueError as e:
+                    return jsonify({"error": str(e)}), 400
+                for entry in stored_files:
+                    stored = UploadPart('pdfs', entry["filename"])
+                    stored.path = entry["path"]
+                    stored.sha256 = entry["sha256"]
+                    waiting.append((stored, False))
+                continue
+            if options_ready():
+                for waiting_part, spooled_file in waiting:
+                    dispatch(waiting_part, spooled_file)
+                waiting = []
+
+        # Body complete - options that were never sent keep their defaults
+        for waiting_part, spooled_file in waiting:
+            dispatch(waiting_part, spooled_file)
+        if not jobs:
+            return jsonify({"error": "No files uploaded"}), 400
+
+        if stream_pages:
+            streaming = True
+            return Response(stream_custom_jobs(jobs, cleanup), mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+        outputs = []
+        budget_errors = []
+        invalid_errors = []
+        for job in jobs:
+            status, result = finish_custom_job(job)
+            if status == "ok":
+                outputs.append((generate_output_filename(job["filename"]), result))
+            elif status == "budget":
+                budget_errors.append(f"{job['filename']}: {result}")
+            elif status == "invalid":
+                invalid_errors.append(f"File '{job['filename']}': Invalid PDF file: {result}")
+        
+        if not outputs and invalid_errors:
+            return jsonify({"error": "; ".join(invalid_errors)}), 400
+        if not outputs and budget_errors:
+            return jsonify({"error": "; ".join(budget_errors)}), 422
+        if not outputs:
+            return jsonify({"error": "No files were successfully processed"}), 500
+        return send_outputs(outputs)
+    finally:
+        if not streaming:
+            cleanup()
+
+def finish_custom_job(job):
+    """
+    Wait for one /custom job and record its outcome
+    
+    A page-streamed job's worker writes its output into the job's spool
+    directory; it is moved into the content store from there and its store
+    id is kept in ``job["output_id"]``, so the whole document never passes
+    through this process.
+    
+    Returns:
+        tuple: ("ok", redacted bytes, or None for a page-streamed job),
+        ("budget", error), ("invalid", error) or ("error", error)
+    """
+    if "output" in job:
+        return "ok", job["output"]
+    try:
+        redacted_bytes = job["future"].result()
+    except BudgetExceeded as e:
+        logger.warning(f"Rejected {job['filename']}: {e}")
+        job_manifest.fail(job["input_hash"], job["options_hash"], e, name=job["filename"])
+        return "budget", e
+    except ValueError as e:
+        # Raised by open_pdf_bytes: damaged, encrypted or empty document
+        logger.warning(f"Rejected {job['filename']}: {e}")
+        job_manifest.fail(job["input_hash"], job["options_hash"], e, name=job["filename"])
+        return "invalid", e
+    except Exception as e:
+        logger.error(f"Error processing {job['filename']}: {e}")
+        job_manifest.fail(job["input_hash"], job["options_hash"], e, name=job["filename"])
+        return "error", e
+    if "path" in job:
+        content_store.put_file(job["path"])  # Keep the original
+    if redacted_bytes is None:
+        job["output_id"] = content_store.put_file(job["spool"].output_path)
+    else:
+        job["output_id"] = content_store.put(redacted_bytes)
+    output_path = content_store.path(job["output_id"])
+    job_manifest.finish(job["input_hash"], job["options_hash"], output_path,
+                        time.perf_counter() - job["start"], name=job["filename"])
+    return "ok", redacted_bytes
+
+def stream_custom_jobs(jobs, cleanup):
+    """
+    Server-sent events for /custom?stream=pages
     
+    Events, in order for each file:
+        file      {"file", "index", "files"}
+        page      {"file", "page", "total", "pdf"} - base64 single-page PDF,
+                  sent as soon as the worker has redacted the page
+        done      {"file", "pages", "output"} or error {"file", "error"};
+                  no pages are sent when an identical earlier job is reused
+    and a final ``end`` event. ``output`` is the content store id of the
+    whole redacted file, downloadable from /custom/outputs/<output>. The
+    output is also recorded in the job manifest, so a normal /custom request
+    with the same file and options afterwards is served from the store.
+    """
+    try:
+        for index, job in enumerate(jobs):
+            name = job["filename"]
+            yield sse_event("file", {"file": name, "index": index, "files": len(jobs)})
+            if "output" in job:
+                yield sse_event("done", {"file": name, "pages": 0, "output": job["output_id"]})
+                continue
+            
+            pages = 0
+            for event in stream_job_pages(name, job["future"], job["spool"]):
+                pages += 1
+                yield event
+            status, result = finish_custom_job(job)
+            if status == "ok":
+                yield sse_event("done", {"file": name, "pages": pages, "output": job["output_id"]})
+            else:
+                yield sse_event("error", {"file": name, "error": str(result)})
+        yield sse_event("end", {"files": len(jobs)})
+    finally:
+        # Also runs when the client disconnects and the generator is closed
+        cleanup()
+
+@app.route('/custom/outputs/<output_id>')
+def custom_output(output_id):
+    """Download a redacted file announced by a /custom?stream=pages ``done`` event"""
+    if len(output_id) != 64 or not all(c in '0123456789abcdef' for c in output_id) or not content_store.contains(output_id):
+        return jsonify({"error": "Unknown output"}), 404
+    name = secure_filename(request.args.get('name', '')) or 'document.pdf'
+    return send_file(content_store.path(output_id), as_attachment=True,
+                     download_name=generate_output_filename(name), mimetype='application/pdf')
+
+# ─── Chunked Uploads ──────────────────────────────────────────────────────
+
+@app.errorhandler(UploadError)
+def handle_upload_error(e):
+    return jsonify({"error": str(e)}), e.status
+
+@app.route('/uploads', methods=['POST'])
+def upload_init():
+    """Start a chunked upload: {filename, size, sha256?} -> {upload_id, chunk_size, total_chunks}"""
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get('filename', ''))
+    if not filename or not allowed_file(filename):
+        return jsonify({"error": "Only PDF files are allowed"}), 400
+    return jsonify(chunked_uploads.init(filename, data.get('size'), data.get('sha256')))
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Received and missing chunks, for resuming after a disconnect"""
+    return jsonify(chunked_uploads.status(upload_id))
+
+@app.route('/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+def upload_chunk(upload_id, index):
+    """Store one chunk; the body is the raw chunk, X-Chunk-Sha256 its hash"""
+    return jsonify(chunked_uploads.put_chunk(upload_id, index, request.stream, request.headers.get('X-Chunk-Sha256')))
+
+@app.route('/uploads/<upload_id>/complete', methods=['POST'])
+def upload_complete(upload_id):
+    """Assemble the chunks and move the file into the content store"""
+    assembled = chunked_uploads.complete(upload_id, os.path.join(UPLOAD_FOLDER, "incoming"))
+    with open(assembled["path"], "rb") as f:
+        head = f.read(HEADER_WINDOW)
+    is_valid, message = check_pdf_signature(head)
+    if not is_valid:
+        os.remove(assembled["path"])
+        return jsonify({"error": f"Invalid PDF file: {message}"}), 400
+
+    # Referenced until the /custom, /bgv or /offer job that names it has run
+    # (or for the store's stale_after if it is never submitted)
+    file_id = content_store.put_file(assembled["path"], ref=True, sha=assembled["sha256"])
+    logger.info(f"Assembled {assembled['filename']} ({assembled['size']} bytes) from chunks")
+    return jsonify({"file_id": file_id, "filename": assembled["filename"], "size": assembled["size"]})
+
+def send_outputs(outputs):
+    """Single file directly, several files as a ZIP"""
     # Single file - return directly
     if len(outputs) == 1:
         filename, content = outputs[0]
@@ -192,8 +554,290 @@ def process_custom_files(files, terms_map, redact_logos, redact_numbers=False):
         mimetype='application/zip'
     )
 
+# ─── BGV and Offer Letter Modules ─────────────────────────────────────────
+
+# Shared worker processes for the module batches (PyMuPDF is not thread-safe)
+_batch_pool = None
+_batch_pool_lock = threading.Lock()
+
+def get_batch_pool():
+    """Process pool shared by all /bgv and /offer requests"""
+    global _batch_pool
+    with _batch_pool_lock:
+        if _batch_pool is None:
+            _batch_pool = ProcessPoolExecutor(max_workers=BATCH_WORKERS)
+        return _batch_pool
+
+class ZipStream(io.RawIOBase):
+    """Write-only buffer for ZipFile whose contents are drained chunk by chunk"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def module_uploads(*field_names):
+    """Uploaded files under any of the given form field names"""
+    files = []
+    for name in field_names:
+        files.extend(f for f in request.files.getlist(name) if f and f.filename)
+    return files
+
+def process_module_files(module, files, fields, page_range=None, stored_files=()):
+    """
+    Redact a batch for a module preset and stream the results as a ZIP
+
+    Files run concurrently in the shared worker pool; each finished file is
+    written to the ZIP as soon as it completes, so the download starts with
+    the first result instead of after the whole batch. ``stored_files``
+    (from ``stored_uploads``) are redacted from the content store by path.
+    """
+    jobs = []
+    options_hash = hash_options({"engine": module, "fields": sorted(fields), "page_range": page_range or "all"})
+    for entry in stored_files:
+        jobs.append({"filename": entry["filename"], "path": entry["path"],
+                     "input_hash": entry["sha256"], "options_hash": options_hash})
+    for file in files:
+        filename = secure_filename(file.filename)
+        file_content = file.read()
+        jobs.append({
+            "filename": filename,
+            "content": file_content,
+            "input_hash": hash_bytes(file_content),
+            "options_hash": options_hash
+        })
+
+    def results():
+        pool = get_batch_pool()
+        futures = {}
+        for job in jobs:
+            # Identical input and options - serve the stored output
+            record = job_manifest.completed(job["input_hash"], job["options_hash"])
+            stored_bytes = content_store.get(os.path.splitext(os.path.basename(record['output_path']))[0]) if record else None
+            if stored_bytes is not None:
+                if "path" in job:
+                    content_store.release(job["input_hash"])
+                yield job, stored_bytes, None
+                continue
+            job["start"] = job_manifest.start(job["input_hash"], job["options_hash"], name=job["filename"])
+            if "path" in job:
+                # Chunked upload, still referenced by upload_complete
+                future = pool.submit(redact_preset_file, job["path"], module, fields, page_range,
+                                     TEMPLATE_REGISTRY_PATH, LARGE_FILE_LIMITS)
+            else:
+                future = pool.submit(redact_with_preset, job["content"], module, fields, page_range,
+                                     TEMPLATE_REGISTRY_PATH, ResourceGovernor().limits())
+            futures[future] = job
+
+        for future in as_completed(futures):
+            job = futures[future]
+            if "path" in job:
+                content_store.release(job["input_hash"])
+            try:
+                redacted_bytes = future.result()
+            except Exception as e:
+                job_manifest.fail(job["input_hash"], job["options_hash"], e, name=job["filename"])
+                yield job, None, e
+                continue
+            output_path = content_store.path(content_store.put(redacted_bytes))
+            job_manifest.finish(job["input_hash"], job["options_hash"], output_path,
+                                time.perf_counter() - job["start"], name=job["filename"])
+            yield job, redacted_bytes, None
+
+    def generate():
+        stream = ZipStream()
+        errors = []
+        with ZipFile(stream, 'w', ZIP_DEFLATED) as zipf:
+            for job, content, error in results():
+                if error is not None:
+                    logger.error(f"Error processing {job['filename']}: {error}")
+                    errors.append(f"{job['filename']}: {error}")
+                    continue
+                zipf.writestr(generate_output_filename(job["filename"]), content)
+                yield stream.drain()
+            if errors:
+                zipf.writestr("errors.txt", "\n".join(errors) + "\n")
+        yield stream.drain()
+
+    logger.info(f"{module}: streaming {len(jobs)} file(s) with fields {sorted(fields)}")
+    download_name = f'redacted_{module}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.zip'
+    return Response(generate(), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename={download_name}'})
+
+def module_route(module, upload_fields, fields_key):
+    """Shared POST handling for the BGV and offer letter modules"""
+    files = module_uploads('files[]', *upload_fields)
+    try:
+        stored_files = stored_uploads(request.form.get('stored_files'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not files and not stored_files:
+        return jsonify({"error": "No files uploaded"}), 400
+
+    for file in files:
+        is_valid, message = validate_pdf_file(file)
+        if not is_valid:
+            return jsonify({"error": f"File '{file.filename}': {message}"}), 400
+
+    known_fields = PRESETS[module]["fields"]
+    fields = [f for f in request.form.getlist(fields_key) if f in known_fields]
+    if not fields:
+        return jsonify({"error": "Select at least one field to redact"}), 400
+
+    try:
+        page_range = requested_page_range(request.form)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return process_module_files(module, files, fields, page_range, stored_files)
+
+@app.route('/bgv', methods=['GET', 'POST'])
+def bgv():
+    if request.method == 'POST':
+        return module_route('bgv', ['reports'], 'redact_options')
+    return render_template('bgv.html')
+
+@app.route('/offer', methods=['GET', 'POST'])
+def offer():
+    if request.method == 'POST':
+        return module_route('offer', ['letters'], 'fields')
+    return render_template('offer.html')
+
+# ─── Term Index ───────────────────────────────────────────────────────────
+
+# Inverted index per uploaded document, keyed by content hash
+_term_indexes = OrderedDict()
+_term_indexes_lock = threading.Lock()
+
+def get_term_index(file_content, doc_id=None, build=True):
+    """Return the cached TermIndex for a document, building it on first use
+    (or returning None when ``build`` is False and it is not cached yet)"""
+    doc_id = doc_id or hashlib.sha256(file_content).hexdigest()
+    with _term_indexes_lock:
+        index = _term_indexes.get(doc_id)
+        if index is not None:
+            _term_indexes.move_to_end(doc_id)
+            return index
+    if not build:
+        return None
+    
+    index = TermIndex.from_bytes(file_content)
+    with _term_indexes_lock:
+        _term_indexes[doc_id] = index
+        while len(_term_indexes) > TERM_INDEX_LIMIT:
+            _term_indexes.popitem(last=False)
+    return index
+
+@app.route('/term_index', methods=['POST'])
+def term_index():
+    """Build the term index for an uploaded PDF; returns the id used for lookups"""
+    try:
+        pdf_file = request.files.get('pdf')
+        if not pdf_file:
+            return jsonify({"error": "No file uploaded"}), 400
+
+        is_valid, message = validate_pdf_file(pdf_file)
+        if not is_valid:
+            return jsonify({"error": message}), 400
+
+        file_content = pdf_file.read()
+        doc_id = hashlib.sha256(file_content).hexdigest()
+        index = get_term_index(file_content, doc_id)
+        
+        return jsonify({"doc_id": doc_id, "page_count": index.page_count})
+
+    except Exception as e:
+        logger.error(f"Term index error: {e}")
+        return jsonify({"error": "Could not index PDF"}), 500
+
+@app.route('/term_hits')
+def term_hits():
+    """Hit count, pages and rectangles for a candidate term (uses the cached index)"""
+    doc_id = request.args.get('doc_id', '')
+    term = request.args.get('term', '')
+    prefix = request.args.get('prefix') == 'true'
+    
+    with _term_indexes_lock:
+        index = _term_indexes.get(doc_id)
+    if index is None:
+        return jsonify({"error": "Unknown document, upload it to /term_index first"}), 404
+    
+    result = index.lookup(term, prefix=prefix)
+    return jsonify({
+        "term": term,
+        "count": result["count"],
+        "pages": result["pages"],
+        "rects": [[page, rect.x0, rect.y0, rect.x1, rect.y1] for page, rect in result["hits"]],
+        "completions": index.complete(term.split()[-1]) if prefix and term.split() else []
+    })
+
 # ─── AJAX Preview ─────────────────────────────────────────────────────────
 
+# Previews are re-requested every time a term is added or removed; keep the
+# last few documents open so only the pages whose matches changed are redone.
+_preview_sessions = OrderedDict()
+_preview_sessions_lock = threading.Lock()
+
+def get_preview_redactor(file_content, redact_logos, redact_numbers):
+    """Return the cached incremental redactor for this file and option set"""
+    doc_id = hashlib.sha256(file_content).hexdigest()
+    key = (doc_id, redact_logos, redact_numbers)
+    with _preview_sessions_lock:
+        redactor = _preview_sessions.get(key)
+        if redactor is not None:
+            _preview_sessions.move_to_end(key)
+            return redactor
+        
+        # Indexing reads every page, so it is only used if the client already
+        # built it; without it the redactor searches just the requested pages.
+        # Raster detection runs per page, as the download does on scanned pages
+        redactor = IncrementalRedactor(
+            file_content,
+            partial(redact_page, redact_logos=redact_logos, redact_numbers=redact_numbers,
+                    raster_detector=RasterLogoDetector() if redact_logos else None),
+            logo_terms_sensitive=redact_logos,
+            term_index=get_term_index(file_content, doc_id, build=False)
+        )
+        _preview_sessions[key] = redactor
+        while len(_preview_sessions) > PREVIEW_SESSION_LIMIT:
+            _, evicted = _preview_sessions.popitem(last=False)
+            evicted.close()
+        return redactor
+
+def preview_governor():
+    """
+    Budgets for one preview request
+    
+    Previews run in Flask request threads, where the process RSS also grows
+    with other requests, so only the page and time budgets apply.
+    """
+    return ResourceGovernor(max_memory_mb=0)
+
+def stream_preview_pages(redactor, terms, filename, first, last, governor):
+    """Server-sent ``page`` events for pages first..last-1, then ``end``"""
+    try:
+        for page_num in range(first, last):
+            page_bytes = redactor.update(terms, range(page_num, page_num + 1), governor=governor)
+            yield page_event(filename, page_num, redactor.page_count, page_bytes)
+        yield sse_event("end", {"file": filename, "pages": last - first})
+    except BudgetExceeded as e:
+        logger.warning(f"Preview stopped for {filename}: {e}")
+        yield sse_event("error", {"file": filename, "error": str(e)})
+    except Exception as e:
+        # Headers are already sent; the error goes to the client as an event
+        logger.error(f"Preview stream error: {e}")
+        yield sse_event("error", {"file": filename, "error": "Preview generation failed"})
+
 @app.route('/preview_redacted', methods=['POST'])
 def preview_redacted():
     """AJAX endpoint for previewing redacted PDF with proper parameter handling"""
@@ -231,25 +875,54 @@ def preview_redacted():
         redact_logos = request.form.get('remove_logos') == 'true'
         redact_numbers = request.form.get('redact_numbers') == 'true'
         
+        # Optional 1-based inclusive page range; only those pages are redacted and returned
+        try:
+            page_start = int(request.form.get('page_start') or 1)
+            page_end = request.form.get('page_end')
+            page_end = int(page_end) if page_end else None
+        except ValueError:
+            return jsonify({"error": "Invalid page range"}), 400
+        if page_start < 1 or (page_end is not None and page_end < page_start):
+            return jsonify({"error": "Invalid page range"}), 400
+        
         logger.info(f"Preview for {filename} with {len(terms)} terms")
         logger.info(f"Preview with redact_logos={redact_logos}, redact_numbers={redact_numbers}")
         logger.info(f"Preview form data: {dict(request.form)}")
         
         file_content = pdf_file.read()
         
-        # Use enhanced redact_pdf_bytes function
-        redacted_bytes = redact_pdf_bytes(
-            pdf_bytes=file_content, 
-            terms=terms, 
-            redact_logos=redact_logos,
-            redact_numbers=redact_numbers
-        )
+        # Incremental redaction - only pages affected by term edits are redone
+        redactor = get_preview_redactor(file_content, redact_logos, redact_numbers)
+        total_pages = redactor.page_count
+        if page_start > total_pages:
+            return jsonify({"error": "Page range is outside the document"}), 400
+        page_end = min(page_end or total_pages, total_pages)
         
-        return send_file(
+        # The most requested endpoint: every request is held to a budget
+        governor = preview_governor()
+        governor.check_pages(page_end - page_start + 1)
+        if wants_page_stream():
+            return Response(stream_preview_pages(redactor, terms, filename, page_start - 1, page_end, governor),
+                            mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        
+        redacted_bytes = redactor.update(terms, range(page_start - 1, page_end), governor=governor)
+        logger.info(f"Preview re-rendered {redactor.last_pages_rendered} page(s)")
+        
+        response = send_file(
             io.BytesIO(redacted_bytes),
             mimetype='application/pdf'
         )
-
+        response.headers['X-Total-Pages'] = str(total_pages)
+        response.headers['X-Page-Start'] = str(page_start)
+        response.headers['X-Page-End'] = str(page_end)
+        return response
+
+    except BudgetExceeded:
+        raise  # 422 with the reason
+    except ValueError as e:
+        # Damaged, encrypted or empty document (open_pdf_bytes)
+        return jsonify({"error": f"Invalid PDF file: {e}"}), 400
     except Exception as e:
         logger.error(f"Preview error: {e}")
         return jsonify({"error": "Preview generation failed"}), 500
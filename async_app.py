@@ -0,0 +1,349 @@
+# async_app.py
+"""
+Async (ASGI) serving mode for the upload-heavy endpoints.
+
+Uploads for /custom, /bgv and /offer are received on the event loop, so a
+slow client only costs a coroutine, not a worker thread. File parts are
+streamed to disk (hashed on the way) and the CPU-bound redaction runs in a
+process pool via ``run_in_executor``. Every other route is served by the
+Flask app, mounted as WSGI.
+
+Concurrency limits:
+    ASYNC_MAX_UPLOADS        uploads received at the same time (default 32)
+    ASYNC_UPLOAD_WAIT        seconds a request waits for an upload slot
+                             before getting a 503 (default 10)
+    ASYNC_UPLOAD_TIMEOUT     seconds allowed to receive one request body
+                             (default 300)
+    MAX_BATCH_MB             largest request body (default 500, see app.py);
+                             single files are capped at 50MB
+    BATCH_WORKERS            redaction worker processes (see app.py)
+
+Usage:
+    uvicorn async_app:app --host 0.0.0.0 --port 5000
+"""
+import os
+import io
+import json
+import time
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+from zipfile import ZipFile, ZIP_DEFLATED
+
+from starlette.applications import Starlette
+from starlette.datastructures import FormData
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import parse_options_header
+from werkzeug.utils import secure_filename
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+from app import (
+    app as flask_app, UPLOAD_FOLDER, MAX_FILE_SIZE, MAX_BATCH_SIZE, BATCH_WORKERS, TEMPLATE_REGISTRY_PATH,
+    LARGE_FILE_LIMITS, allowed_file, generate_output_filename, job_manifest, content_store, stored_uploads,
+    requested_page_range
+)
+from custom import check_pdf_signature, redact_pdf_file
+from job_manifest import hash_options
+from presets import PRESETS, redact_preset_file
+from resource_governor import ResourceGovernor, BudgetExceeded
+from streaming_upload import aiter_multipart
+
+logger = logging.getLogger(__name__)
+
+MAX_ACTIVE_UPLOADS = int(os.environ.get("ASYNC_MAX_UPLOADS", "32"))
+UPLOAD_WAIT_SECONDS = float(os.environ.get("ASYNC_UPLOAD_WAIT", "10"))
+UPLOAD_TIMEOUT_SECONDS = float(os.environ.get("ASYNC_UPLOAD_TIMEOUT", "300"))
+MAX_FILES_PER_REQUEST = 200
+INCOMING_FOLDER = os.path.join(UPLOAD_FOLDER, "incoming")
+
+
+async def limit_body(chunks, limit):
+    """Pass body chunks through, stopping once the request is over ``limit`` bytes"""
+    received = 0
+    async for chunk in chunks:
+        received += len(chunk)
+        if received > limit:
+            raise HTTPException(413, f"Upload too large. Maximum request size is {limit // (1024 * 1024)}MB.")
+        yield chunk
+
+
+async def receive_uploads(request, *field_names):
+    """
+    Receive the form and its files within the upload limits
+
+    The body is parsed from ``request.stream()`` as it arrives: file parts
+    are written once, straight to INCOMING_FOLDER, and a part over
+    MAX_FILE_SIZE (or a body over MAX_BATCH_SIZE) is rejected as soon as it
+    crosses the limit.
+
+    Returns:
+        tuple: (form, saved files)
+
+    Raises:
+        HTTPException: 503 when no upload slot frees up in time, 408 when
+            the body takes too long, 413 for oversize parts or bodies, 400
+            for invalid files
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get("boundary")
+    if content_type != "multipart/form-data" or not boundary:
+        raise HTTPException(400, "No files uploaded")
+    if int(request.headers.get("content-length") or 0) > MAX_BATCH_SIZE:
+        raise HTTPException(413, f"Upload too large. Maximum request size is {MAX_BATCH_SIZE // (1024 * 1024)}MB.")
+
+    slots = request.app.state.upload_slots
+    try:
+        await asyncio.wait_for(slots.acquire(), UPLOAD_WAIT_SECONDS)
+    except asyncio.TimeoutError:
+        raise HTTPException(503, "Server busy - too many uploads in progress, please retry")
+
+    fields = []
+    saved = []
+    spooled = []
+
+    async def receive():
+        parts = aiter_multipart(limit_body(request.stream(), MAX_BATCH_SIZE), boundary,
+                                INCOMING_FOLDER, max_file_size=MAX_FILE_SIZE)
+        async for part in parts:
+            if not part.is_file:
+                fields.append((part.name, part.value))
+                continue
+            spooled.append({"path": part.path})
+            if part.name not in field_names or not part.filename:
+                continue
+            if not allowed_file(part.filename):
+                raise HTTPException(400, f"File '{part.filename}': Only PDF files are allowed")
+            if len(saved) >= MAX_FILES_PER_REQUEST:
+                raise HTTPException(400, f"Too many files. Maximum is {MAX_FILES_PER_REQUEST} per request.")
+            is_valid, message = check_pdf_signature(part.head)
+            if not is_valid:
+                raise HTTPException(400, f"File '{part.filename}': Invalid PDF file: {message}")
+            saved.append({"filename": secure_filename(part.filename), "path": part.path,
+                          "size": part.size, "sha256": part.sha256})
+
+    try:
+        try:
+            await asyncio.wait_for(receive(), UPLOAD_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            raise HTTPException(408, "Upload timed out")
+        except RequestEntityTooLarge as e:
+            raise HTTPException(413, e.description)
+        except ValueError:
+            # Malformed multipart body
+            raise HTTPException(400, "Invalid upload body")
+        kept = {info["path"] for info in saved}
+        discard([info for info in spooled if info["path"] not in kept])
+        return FormData(fields), saved
+    except BaseException:
+        discard(spooled)
+        raise
+    finally:
+        slots.release()
+
+
+async def add_stored_files(form, saved):
+    """
+    Append the files named by the ``stored_files`` field (chunked uploads)
+
+    Raises:
+        HTTPException: 400 for a malformed field or an unknown file
+    """
+    try:
+        stored = await asyncio.to_thread(stored_uploads, form.get("stored_files"))
+    except ValueError as e:
+        discard(saved)
+        raise HTTPException(400, str(e))
+    return saved + [dict(entry, stored=True) for entry in stored]
+
+
+def discard(saved):
+    """Remove received files; chunked uploads only drop their store reference"""
+    for info in saved:
+        if info.get("stored"):
+            content_store.release(info["sha256"])
+            continue
+        try:
+            os.remove(info["path"])
+        except OSError:
+            pass
+
+
+async def run_jobs(request, saved, options_for, submit):
+    """
+    Run one redaction per saved file in the process pool
+
+    Args:
+        saved: Files from ``receive_uploads``
+        options_for: Callable(info) -> options dict for the job manifest
+        submit: Callable(info) -> (function, args) to run in the pool
+
+    Returns:
+        tuple: (outputs [(filename, bytes)], budget errors, invalid PDF
+        errors, other errors)
+    """
+    loop = asyncio.get_running_loop()
+    pool = request.app.state.pool
+
+    async def run_one(info):
+        options_hash = hash_options(options_for(info))
+        record = await asyncio.to_thread(job_manifest.completed, info["sha256"], options_hash)
+        if record:
+            stored = await asyncio.to_thread(
+                content_store.get, os.path.splitext(os.path.basename(record["output_path"]))[0])
+            if stored is not None:
+                return stored
+        start = await asyncio.to_thread(job_manifest.start, info["sha256"], options_hash, info["filename"])
+        try:
+            function, args = submit(info)
+            redacted = await loop.run_in_executor(pool, function, *args)
+        except Exception as e:
+            await asyncio.to_thread(job_manifest.fail, info["sha256"], options_hash, e,
+                                    time.perf_counter() - start, info["filename"])
+            raise
+        output_path = content_store.path(await asyncio.to_thread(content_store.put, redacted))
+        await asyncio.to_thread(job_manifest.finish, info["sha256"], options_hash, output_path,
+                                time.perf_counter() - start, info["filename"])
+        return redacted
+
+    try:
+        results = await asyncio.gather(*(run_one(info) for info in saved), return_exceptions=True)
+    finally:
+        discard(saved)
+
+    outputs, budget_errors, invalid_errors, errors = [], [], [], []
+    for info, result in zip(saved, results):
+        if isinstance(result, BudgetExceeded):
+            budget_errors.append(f"{info['filename']}: {result}")
+        elif isinstance(result, ValueError):
+            # Raised by open_pdf_bytes: damaged, encrypted or empty document
+            invalid_errors.append(f"File '{info['filename']}': Invalid PDF file: {result}")
+        elif isinstance(result, Exception):
+            logger.error(f"Error processing {info['filename']}: {result}")
+            errors.append(f"{info['filename']}: {result}")
+        else:
+            outputs.append((generate_output_filename(info["filename"]), result))
+    return outputs, budget_errors, invalid_errors, errors
+
+
+def build_response(outputs, budget_errors, invalid_errors, errors, prefix):
+    """Single PDF, or ZIP for several files (same contract as the Flask routes)"""
+    if not outputs and invalid_errors:
+        return JSONResponse({"error": "; ".join(invalid_errors)}, status_code=400)
+    if not outputs and budget_errors:
+        return JSONResponse({"error": "; ".join(budget_errors)}, status_code=422)
+    if not outputs:
+        return JSONResponse({"error": "No files were successfully processed"}, status_code=500)
+
+    errors = budget_errors + invalid_errors + errors
+    if len(outputs) == 1 and not errors:
+        filename, content = outputs[0]
+        return Response(content, media_type="application/pdf",
+                        headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+    memory_file = io.BytesIO()
+    with ZipFile(memory_file, "w", ZIP_DEFLATED) as zipf:
+        for filename, content in outputs:
+            zipf.writestr(filename, content)
+        if errors:
+            zipf.writestr("errors.txt", "\n".join(errors) + "\n")
+    download_name = f'{prefix}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.zip'
+    return Response(memory_file.getvalue(), media_type="application/zip",
+                    headers={"Content-Disposition": f"attachment; filename={download_name}"})
+
+
+async def custom(request):
+    form, saved = await receive_uploads(request, "pdfs")
+    saved = await add_stored_files(form, saved)
+    if not saved:
+        return JSONResponse({"error": "No files uploaded"}, status_code=400)
+
+    try:
+        terms_map = json.loads(form.get("custom_terms", "{}"))
+    except json.JSONDecodeError:
+        discard(saved)
+        return JSONResponse({"error": "Invalid terms format"}, status_code=400)
+    redact_logos = form.get("redact_logos") == "on"
+    redact_numbers = form.get("redact_numbers") == "on"
+    limits = ResourceGovernor().limits()
+
+    def terms_for(info):
+        terms = terms_map.get(info["filename"], [])
+        return terms if isinstance(terms, list) else []
+
+    outputs, budget_errors, invalid_errors, errors = await run_jobs(
+        request, saved,
+        lambda info: {"engine": "custom", "terms": sorted(terms_for(info)),
+                      "redact_logos": redact_logos, "redact_numbers": redact_numbers},
+        lambda info: (redact_pdf_file, (info["path"], terms_for(info), redact_logos, redact_numbers, TEMPLATE_REGISTRY_PATH,
+                                        LARGE_FILE_LIMITS if info.get("stored") else limits))
+    )
+    return build_response(outputs, budget_errors, invalid_errors, errors, "redacted_custom")
+
+
+def module_endpoint(module, upload_field, fields_key):
+    async def endpoint(request):
+        form, saved = await receive_uploads(request, "files[]", upload_field)
+        saved = await add_stored_files(form, saved)
+        if not saved:
+            return JSONResponse({"error": "No files uploaded"}, status_code=400)
+
+        fields = [f for f in form.getlist(fields_key) if f in PRESETS[module]["fields"]]
+        if not fields:
+            discard(saved)
+            return JSONResponse({"error": "Select at least one field to redact"}, status_code=400)
+        try:
+            page_range = requested_page_range(form)
+        except ValueError as e:
+            discard(saved)
+            return JSONResponse({"error": str(e)}, status_code=400)
+        limits = ResourceGovernor().limits()
+
+        outputs, budget_errors, invalid_errors, errors = await run_jobs(
+            request, saved,
+            lambda info: {"engine": module, "fields": sorted(fields), "page_range": page_range or "all"},
+            lambda info: (redact_preset_file, (info["path"], module, fields, page_range, TEMPLATE_REGISTRY_PATH,
+                                               LARGE_FILE_LIMITS if info.get("stored") else limits))
+        )
+        return build_response(outputs, budget_errors, invalid_errors, errors, f"redacted_{module}")
+    return endpoint
+
+
+async def http_error(request, exc):
+    return JSONResponse({"error": exc.detail}, status_code=exc.status_code)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.upload_slots = asyncio.Semaphore(MAX_ACTIVE_UPLOADS)
+    app.state.pool = ProcessPoolExecutor(max_workers=BATCH_WORKERS)
+    try:
+        yield
+    finally:
+        app.state.pool.shutdown(wait=False, cancel_futures=True)
+
+
+app = Starlette(
+    routes=[
+        Route("/custom", custom, methods=["POST"]),
+        Route("/bgv", module_endpoint("bgv", "reports", "redact_options"), methods=["POST"]),
+        Route("/offer", module_endpoint("offer", "letters", "fields"), methods=["POST"]),
+        # Everything else (pages, previews, term index) stays on Flask
+        Mount("/", app=WSGIMiddleware(flask_app)),
+    ],
+    exception_handlers={HTTPException: http_error},
+    lifespan=lifespan,
+)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run("async_app:app", host="0.0.0.0", port=5000)
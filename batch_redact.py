@@ -0,0 +1,279 @@
+# batch_redact.py
+"""
+Headless batch redaction over a directory tree.
+
+Walks an input directory for PDFs, looks up per-file terms in a manifest
+(the same shape as the ``custom_terms`` map posted to ``/custom``), redacts
+files in parallel with a process pool and writes a summary report with
+per-file timings. Progress is recorded in a SQLite job manifest
+(OUTPUT_DIR/batch_jobs.sqlite3), so a restarted run skips every file whose
+content and options were already completed - even under another path.
+
+Usage:
+    python batch_redact.py INPUT_DIR OUTPUT_DIR --manifest terms.json --workers 8
+    python batch_redact.py INPUT_DIR OUTPUT_DIR --manifest terms.csv --engine enhanced
+
+Manifest formats:
+    JSON: {"offer.pdf": ["John Smith", "Acme"], "sub/dir/file.pdf": [...]}
+    CSV:  file,term  (one row per term; header row optional)
+"""
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from job_manifest import JobManifest, hash_options
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "batch_jobs.sqlite3"
+OUTPUT_SUFFIX = "_redacted"
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(path):
+    """
+    Load a per-file term map from JSON or CSV
+
+    Args:
+        path: Manifest path (.json or .csv), or None
+
+    Returns:
+        dict: file name or relative path -> list of terms
+    """
+    if not path:
+        return {}
+
+    if path.lower().endswith(".csv"):
+        terms_map = {}
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.reader(f):
+                if len(row) < 2 or not row[0].strip():
+                    continue
+                if row[0].strip().lower() == "file" and row[1].strip().lower() == "term":
+                    continue  # Header row
+                terms_map.setdefault(row[0].strip(), []).append(row[1].strip())
+        return terms_map
+
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError("JSON manifest must be an object mapping file names to term lists")
+    return {name: terms for name, terms in data.items() if isinstance(terms, list)}
+
+
+def find_pdfs(input_dir, exclude_dir=None):
+    """Yield relative paths of PDFs under input_dir (skipping exclude_dir)"""
+    exclude_dir = os.path.abspath(exclude_dir) if exclude_dir else None
+    for root, dirs, files in os.walk(input_dir):
+        if exclude_dir:
+            dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != exclude_dir]
+        for name in sorted(files):
+            if name.lower().endswith(".pdf"):
+                yield os.path.relpath(os.path.join(root, name), input_dir)
+        dirs.sort()
+
+
+def terms_for(rel_path, terms_map, default_terms):
+    """Manifest entries can be keyed by relative path or bare file name"""
+    key = rel_path.replace(os.sep, "/")
+    if key in terms_map:
+        return terms_map[key]
+    return terms_map.get(os.path.basename(rel_path), default_terms)
+
+
+def output_path_for(rel_path, output_dir):
+    """Mirror the input tree under output_dir with a _redacted suffix"""
+    name, ext = os.path.splitext(rel_path)
+    return os.path.join(output_dir, f"{name}{OUTPUT_SUFFIX}{ext}")
+
+
+def redact_file(job):
+    """
+    Redact one file (runs in a worker process)
+
+    Args:
+        job: dict with input/output paths, terms, options and the
+             job manifest path
+
+    Returns:
+        dict: Per-file result for the report and the job manifest
+    """
+    start = time.perf_counter()
+    result = {
+        "file": job["rel_path"],
+        "output": job["output_path"],
+        "status": "failed",
+        "seconds": 0.0,
+        "input_sha256": "",
+        "options_hash": job["options_hash"],
+        "error": "",
+    }
+    try:
+        result["input_sha256"] = file_sha256(job["input_path"])
+
+        # Resume: identical content with identical options was already done
+        previous = JobManifest(job["manifest_path"]).completed(result["input_sha256"], job["options_hash"])
+        if previous:
+            if os.path.abspath(previous["output_path"]) != os.path.abspath(job["output_path"]):
+                os.makedirs(os.path.dirname(job["output_path"]) or ".", exist_ok=True)
+                shutil.copyfile(previous["output_path"], job["output_path"])
+            result["status"] = "skipped"
+            return result
+
+        os.makedirs(os.path.dirname(job["output_path"]) or ".", exist_ok=True)
+        tmp_path = job["output_path"] + ".part"
+        options = job["options"]
+
+        if options["engine"] == "enhanced":
+            from Pdf_processor import process_pdf_with_enhanced_protection
+            log_data = process_pdf_with_enhanced_protection(
+                job["input_path"], job["terms"], tmp_path,
+                remove_logos=options["redact_logos"],
+                add_watermarks=options["add_watermarks"]
+            )
+            if not log_data or "FINISHED OK" not in log_data[-1]:
+                raise RuntimeError(next((l for l in log_data if "FATAL" in l), "processing failed"))
+        else:
+            from custom import redact_pdf_bytes
+            with open(job["input_path"], "rb") as f:
+                pdf_bytes = f.read()
+            redacted = redact_pdf_bytes(
+                pdf_bytes, job["terms"],
+                redact_logos=options["redact_logos"],
+                redact_numbers=options["redact_numbers"]
+            )
+            with open(tmp_path, "wb") as f:
+                f.write(redacted)
+
+        os.replace(tmp_path, job["output_path"])
+        result["status"] = "done"
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def write_report(report_path, results, totals):
+    """Write the summary as JSON, or CSV when the path ends in .csv"""
+    if report_path.lower().endswith(".csv"):
+        with open(report_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=["file", "status", "seconds", "input_sha256", "output", "error"],
+                                    extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(results)
+    else:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump({"totals": totals, "files": results}, f, indent=2)
+
+
+def run_batch(input_dir, output_dir, terms_map, options, default_terms=None, workers=None, report_path=None):
+    """
+    Redact every PDF under input_dir into output_dir
+
+    Returns:
+        dict: Totals (files, done, skipped, failed, seconds)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = JobManifest(os.path.join(output_dir, MANIFEST_FILENAME))
+    default_terms = default_terms or []
+
+    jobs = []
+    for rel_path in find_pdfs(input_dir, exclude_dir=output_dir):
+        terms = terms_for(rel_path, terms_map, default_terms)
+        job_options = dict(options, terms=sorted(terms))
+        jobs.append({
+            "rel_path": rel_path,
+            "input_path": os.path.join(input_dir, rel_path),
+            "output_path": output_path_for(rel_path, output_dir),
+            "terms": terms,
+            "options": options,
+            "options_hash": hash_options(job_options),
+            "manifest_path": manifest.db_path,
+        })
+
+    logger.info("Found %d PDF(s) under %s", len(jobs), input_dir)
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(redact_file, job) for job in jobs]
+        for count, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            results.append(result)
+            # Recorded as each file finishes, so a crash loses nothing finished
+            if result["status"] == "done":
+                manifest.finish(result["input_sha256"], result["options_hash"], result["output"],
+                                result["seconds"], name=result["file"])
+            elif result["status"] == "failed":
+                logger.error("Failed %s: %s", result["file"], result["error"])
+                if result["input_sha256"]:
+                    manifest.fail(result["input_sha256"], result["options_hash"], result["error"],
+                                  result["seconds"], name=result["file"])
+            if count % 100 == 0:
+                logger.info("%d/%d file(s) finished", count, len(jobs))
+
+    results.sort(key=lambda r: r["file"])
+    totals = {
+        "files": len(results),
+        "done": sum(r["status"] == "done" for r in results),
+        "skipped": sum(r["status"] == "skipped" for r in results),
+        "failed": sum(r["status"] == "failed" for r in results),
+        "seconds": round(time.perf_counter() - start, 3),
+        "processing_seconds": round(sum(r["seconds"] for r in results if r["status"] == "done"), 3),
+    }
+    write_report(report_path or os.path.join(output_dir, "batch_report.json"), results, totals)
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Redact a directory tree of PDFs")
+    parser.add_argument("input_dir", help="Directory to scan for PDFs")
+    parser.add_argument("output_dir", help="Directory for redacted files (mirrors the input tree)")
+    parser.add_argument("--manifest", help="JSON or CSV per-file term map")
+    parser.add_argument("--terms", nargs="*", default=[], help="Terms for files not listed in the manifest")
+    parser.add_argument("--engine", choices=["custom", "enhanced"], default="custom",
+                        help="custom = redact_pdf_bytes (Flask), enhanced = process_pdf_with_enhanced_protection (Streamlit)")
+    parser.add_argument("--redact-logos", action="store_true", help="Redact logos")
+    parser.add_argument("--redact-numbers", action="store_true", help="Redact currency amounts (custom engine)")
+    parser.add_argument("--no-watermarks", action="store_true", help="Skip logo placeholders (enhanced engine)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--report", help="Report path (.json or .csv); default OUTPUT_DIR/batch_report.json")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    # Per-page logging from the redaction engines is far too chatty for bulk runs
+    logging.getLogger().setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    options = {
+        "engine": args.engine,
+        "redact_logos": args.redact_logos,
+        "redact_numbers": args.redact_numbers,
+        "add_watermarks": not args.no_watermarks,
+    }
+    totals = run_batch(
+        args.input_dir, args.output_dir,
+        load_manifest(args.manifest), options,
+        default_terms=args.terms, workers=args.workers, report_path=args.report
+    )
+    print(json.dumps(totals, indent=2))
+    return 1 if totals["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
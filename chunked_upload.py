@@ -0,0 +1,216 @@
+# chunked_upload.py
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024        # Well below MAX_CONTENT_LENGTH per request
+MAX_ASSEMBLED_SIZE = int(os.environ.get("CHUNKED_MAX_MB", "2048")) * 1024 * 1024
+STALE_AFTER = 24 * 3600                     # Unfinished uploads are removed after a day
+COPY_BLOCK = 64 * 1024 * 1024
+
+
+class UploadError(Exception):
+    """A chunked upload request that cannot be accepted (maps to a 4xx)"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def append_file(dst, src_path):
+    """
+    Append a file to an open destination without copying through Python
+
+    Uses ``os.copy_file_range`` (in-kernel copy, Linux) and falls back to a
+    buffered copy where it is not available or not supported by the file
+    system.
+    """
+    with open(src_path, "rb") as src:
+        remaining = os.fstat(src.fileno()).st_size
+        if hasattr(os, "copy_file_range"):
+            try:
+                while remaining > 0:
+                    copied = os.copy_file_range(src.fileno(), dst.fileno(), min(remaining, COPY_BLOCK))
+                    if copied == 0:
+                        break
+                    remaining -= copied
+                if remaining == 0:
+                    return
+            except OSError as e:
+                logging.info("copy_file_range unavailable (%s) - using a buffered copy", e)
+            src.seek(os.fstat(src.fileno()).st_size - remaining)
+        shutil.copyfileobj(src, dst, COPY_BLOCK)
+
+
+class ChunkedUploads:
+    """
+    Resumable chunked uploads assembled on the server
+
+    Protocol (see the /uploads routes in app.py):
+
+    1. ``init`` with file name, total size and optionally the file's SHA-256;
+       returns an upload id, the chunk size and the chunk count.
+    2. ``put_chunk`` for each chunk index with its SHA-256; chunks can be sent
+       in any order and re-sent after a disconnect.
+    3. ``status`` lists the chunks already received, so a client resumes by
+       sending only the missing ones.
+    4. ``complete`` concatenates the chunks into one file, checks the total
+       size and hash, and returns the assembled file's path and SHA-256.
+
+    Each upload lives in ``root/<upload id>/`` with an ``upload.json`` and one
+    file per chunk, so nothing is held in memory between requests.
+
+    Args:
+        root: Directory for upload state (e.g. UPLOAD_FOLDER/chunks)
+        chunk_size: Chunk size offered to clients
+        max_size: Largest file accepted
+    """
+
+    def __init__(self, root, chunk_size=DEFAULT_CHUNK_SIZE, max_size=MAX_ASSEMBLED_SIZE):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        os.makedirs(root, exist_ok=True)
+
+    def _dir(self, upload_id):
+        if not upload_id or not all(c in "0123456789abcdef" for c in upload_id):
+            raise UploadError("Unknown upload", 404)
+        return os.path.join(self.root, upload_id)
+
+    def _meta(self, upload_id):
+        try:
+            with open(os.path.join(self._dir(upload_id), "upload.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UploadError("Unknown upload", 404)
+
+    def init(self, filename, size, sha256=None):
+        """
+        Start an upload
+
+        Returns:
+            dict: upload_id, chunk_size and total_chunks
+        """
+        self.cleanup()
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError("File size must be a positive integer")
+        if size > self.max_size:
+            raise UploadError(f"File too large. Maximum size is {self.max_size // (1024 * 1024)}MB.", 413)
+
+        upload_id = uuid.uuid4().hex
+        total_chunks = -(-size // self.chunk_size)
+        meta = {
+            "filename": filename,
+            "size": size,
+            "sha256": (sha256 or "").lower() or None,
+            "chunk_size": self.chunk_size,
+            "total_chunks": total_chunks,
+            "created": time.time(),
+        }
+        os.makedirs(self._dir(upload_id))
+        with open(os.path.join(self._dir(upload_id), "upload.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        return {"upload_id": upload_id, "chunk_size": self.chunk_size, "total_chunks": total_chunks}
+
+    def put_chunk(self, upload_id, index, stream, sha256):
+        """
+        Store one chunk, verified against its SHA-256
+
+        Args:
+            upload_id: Id from ``init``
+            index: Chunk index (0-based)
+            stream: Request body stream
+            sha256: Expected SHA-256 of the chunk (hex)
+        """
+        meta = self._meta(upload_id)
+        if not 0 <= index < meta["total_chunks"]:
+            raise UploadError("Chunk index out of range")
+        if not sha256:
+            raise UploadError("Missing chunk hash")
+        expected_size = min(meta["chunk_size"], meta["size"] - index * meta["chunk_size"])
+
+        chunk_path = os.path.join(self._dir(upload_id), f"{index:06d}.chunk")
+        tmp_path = f"{chunk_path}.{uuid.uuid4().hex}.tmp"
+        digest = hashlib.sha256()
+        received = 0
+        try:
+            with open(tmp_path, "wb") as out:
+                while True:
+                    data = stream.read(1024 * 1024)
+                    if not data:
+                        break
+                    received += len(data)
+                    if received > expected_size:
+                        raise UploadError("Chunk larger than expected")
+                    digest.update(data)
+                    out.write(data)
+            if received != expected_size:
+                raise UploadError(f"Chunk size mismatch ({received} != {expected_size})")
+            if digest.hexdigest() != sha256.lower():
+                raise UploadError("Chunk hash mismatch - please resend", 422)
+            os.replace(tmp_path, chunk_path)  # Re-sent chunks simply replace
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return {"index": index, "received": received}
+
+    def status(self, upload_id):
+        """Received and missing chunk indexes (for resuming)"""
+        meta = self._meta(upload_id)
+        received = sorted(int(name.split(".")[0]) for name in os.listdir(self._dir(upload_id))
+                          if name.endswith(".chunk"))
+        present = set(received)
+        missing = [i for i in range(meta["total_chunks"]) if i not in present]
+        return {"upload_id": upload_id, "filename": meta["filename"], "size": meta["size"],
+                "chunk_size": meta["chunk_size"], "received": received, "missing": missing}
+
+    def complete(self, upload_id, target_dir):
+        """
+        Assemble the chunks into one file
+
+        Args:
+            upload_id: Id from ``init``
+            target_dir: Directory for the assembled file
+
+        Returns:
+            dict: filename, path, size and sha256 of the assembled file
+        """
+        meta = self._meta(upload_id)
+        state = self.status(upload_id)
+        if state["missing"]:
+            raise UploadError(f"{len(state['missing'])} chunk(s) missing", 409)
+
+        os.makedirs(target_dir, exist_ok=True)
+        path = os.path.join(target_dir, f"{upload_id}.pdf")
+        with open(path, "wb") as out:
+            for index in range(meta["total_chunks"]):
+                append_file(out, os.path.join(self._dir(upload_id), f"{index:06d}.chunk"))
+
+        # One sequential read for the whole-file hash (chunk hashes cannot be combined)
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(COPY_BLOCK), b""):
+                digest.update(block)
+        sha256 = digest.hexdigest()
+        size = os.path.getsize(path)
+        if size != meta["size"] or (meta["sha256"] and sha256 != meta["sha256"]):
+            os.remove(path)
+            raise UploadError("Assembled file does not match the declared size/hash", 422)
+
+        shutil.rmtree(self._dir(upload_id), ignore_errors=True)
+        return {"filename": meta["filename"], "path": path, "size": size, "sha256": sha256}
+
+    def cleanup(self):
+        """Remove uploads that were never completed"""
+        cutoff = time.time() - STALE_AFTER
+        for upload_id in os.listdir(self.root):
+            path = os.path.join(self.root, upload_id)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
@@ -0,0 +1,183 @@
+# content_store.py
+import os
+import time
+import hashlib
+import sqlite3
+import logging
+import tempfile
+
+
+class ContentStore:
+    """
+    Content-addressed storage for original and redacted PDFs
+
+    Objects are stored once under their SHA-256 (``objects/ab/abcd....pdf``),
+    so the same template uploaded hundreds of times takes the space of one
+    file and two uploads with the same name can never be confused. Each
+    object carries a reference count; callers pin objects they are using
+    (e.g. files of an active Streamlit session) and release them when done.
+    When the store grows beyond ``max_bytes``, unreferenced objects are
+    evicted least-recently-used first.
+
+    Which output belongs to which (input, options) pair is recorded in the
+    job manifest (``job_manifest.JobManifest``); this class only stores bytes.
+
+    Args:
+        root: Store directory (created if missing)
+        max_bytes: Size cap that triggers eviction
+        stale_after: Seconds after which a still-referenced object that has
+            not been accessed is treated as unreferenced (sessions that
+            ended without releasing their pins)
+    """
+
+    def __init__(self, root, max_bytes=2 * 1024 ** 3, stale_after=24 * 3600):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.stale_after = stale_after
+        self.objects_dir = os.path.join(root, "objects")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.db_path = os.path.join(root, "store.sqlite3")
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS objects (
+                    sha         TEXT PRIMARY KEY,
+                    size        INTEGER NOT NULL,
+                    refcount    INTEGER NOT NULL DEFAULT 0,
+                    last_access REAL NOT NULL
+                )
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def path(self, sha):
+        """Filesystem path of an object (which may or may not exist)"""
+        return os.path.join(self.objects_dir, sha[:2], f"{sha}.pdf")
+
+    def contains(self, sha):
+        return os.path.exists(self.path(sha))
+
+    def _register(self, sha, size, ref):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO objects (sha, size, refcount, last_access) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(sha) DO UPDATE SET refcount=refcount+excluded.refcount, last_access=excluded.last_access",
+                (sha, size, 1 if ref else 0, time.time())
+            )
+
+    def put(self, data, ref=False):
+        """
+        Store bytes (no-op if the same content is already stored)
+
+        Args:
+            data: Raw bytes
+            ref: Also take a reference on the object
+
+        Returns:
+            str: SHA-256 of the content
+        """
+        sha = hashlib.sha256(data).hexdigest()
+        target = self.path(sha)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".part")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, target)
+        self._register(sha, len(data), ref)
+        self.evict(keep=sha)
+        return sha
+
+    def put_file(self, file_path, ref=False, sha=None):
+        """
+        Move a finished file (e.g. a processing output) into the store
+
+        Args:
+            file_path: File to move in
+            ref: Also take a reference on the object
+            sha: SHA-256 of the file if the caller already computed it
+        """
+        if sha is None:
+            digest = hashlib.sha256()
+            with open(file_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            sha = digest.hexdigest()
+        size = os.path.getsize(file_path)
+        target = self.path(sha)
+        if os.path.exists(target):
+            os.remove(file_path)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(file_path, target)
+        self._register(sha, size, ref)
+        self.evict(keep=sha)
+        return sha
+
+    def get(self, sha):
+        """Read an object's bytes, or None if it is not (or no longer) stored"""
+        try:
+            with open(self.path(sha), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        self.touch(sha)
+        return data
+
+    def touch(self, sha):
+        with self._connect() as conn:
+            conn.execute("UPDATE objects SET last_access=? WHERE sha=?", (time.time(), sha))
+
+    def add_ref(self, sha):
+        with self._connect() as conn:
+            conn.execute("UPDATE objects SET refcount=refcount+1, last_access=? WHERE sha=?", (time.time(), sha))
+
+    def release(self, sha):
+        with self._connect() as conn:
+            conn.execute("UPDATE objects SET refcount=MAX(refcount-1, 0) WHERE sha=?", (sha,))
+
+    def total_size(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+
+    def evict(self, keep=None):
+        """
+        Delete unreferenced objects, oldest access first, until under the cap
+
+        Args:
+            keep: SHA that must survive (the object that was just stored)
+
+        Returns:
+            int: Bytes freed
+        """
+        total = self.total_size()
+        if total <= self.max_bytes:
+            return 0
+
+        stale_cutoff = time.time() - self.stale_after
+        with self._connect() as conn:
+            candidates = conn.execute(
+                "SELECT sha, size FROM objects WHERE refcount=0 OR last_access<? ORDER BY last_access",
+                (stale_cutoff,)
+            ).fetchall()
+
+        freed = 0
+        for sha, size in candidates:
+            if total - freed <= self.max_bytes:
+                break
+            if sha == keep:
+                continue
+            try:
+                os.remove(self.path(sha))
+            except FileNotFoundError:
+                pass
+            with self._connect() as conn:
+                conn.execute("DELETE FROM objects WHERE sha=?", (sha,))
+            freed += size
+
+        if total - freed > self.max_bytes:
+            logging.warning("Content store over cap (%d bytes) - remaining objects are referenced", total - freed)
+        elif freed:
+            logging.info("Content store evicted %d bytes", freed)
+        return freed
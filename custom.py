@@ -1,90 +1,171 @@
 import io
+import os
 import re
 import fitz
 import logging
 
+from logo_detection import LogoDetector
+from template_registry import layout_signature, get_registry
+from resource_governor import BudgetExceeded, ResourceGovernor
+from page_stream import single_page_pdf
+from pdf_optimizer import write_optimized
+from image_redaction import apply_grouped
+from raster_logo_detection import RasterLogoDetector
+from redaction_records import RedactionBatch, TERM, NUMBER, LOGO
+
 IGNORECASE = 1
+HEADER_WINDOW = 1024   # The PDF header may be preceded by up to 1 KB of junk
+FIELD_PADDING = 3      # Points above and below a stored template field searched for its value
+
+# Number detection: spans to skip (dates, addresses) and currency patterns
+NUMBER_SKIP_PATTERN = re.compile(r"\d{1,2}[./]\d{1,2}[./]\d{4}|\d{6}|street|phone|email", re.IGNORECASE)
+NUMBER_PATTERNS = [re.compile(pattern) for pattern in (
+    r"€\s*\d+[.,]\d{2}",           # €123.45
+    r"\$\s*\d+[.,]\d{2}",          # $123.45
+    r"CHF\s*\d+[.,]\d{2}",         # CHF 123.45
+    r"\b\d{1,4}[.,]\d{2}\b",       # 123.45, 1234.56
+    r"\b\d+[.,]0{1,2}\b",          # 123.00, 45.0
+    r"\b[1-9]\d{0,2}[.,]\d{1,2}\b" # 1.2, 12.34, 123.45
+)]
 
-def redact_pdf_bytes(pdf_bytes, terms, redact_logos=False, redact_numbers=False, logo_replacement_text="LOGO", text_redaction_color=(0, 0, 0), logo_redaction_color=(1, 1, 1)):
+
+def redact_pdf_bytes(pdf_bytes, terms, redact_logos=False, redact_numbers=False, logo_replacement_text="LOGO", text_redaction_color=(0, 0, 0), logo_redaction_color=(1, 1, 1), term_index=None, template_registry=None, pages=None, doc=None, governor=None, pages_only=False, page_sink=None, image_strategy=None):
     """
     Main PDF redaction function that handles text, numbers, and visual logos
     
     Args:
-        pdf_bytes: Raw PDF bytes
+        pdf_bytes: Raw PDF bytes, or None when ``doc`` was opened from a file
+            (``open_pdf_file``)
         terms: List of text terms to redact
         redact_logos: Whether to redact visual logo elements
         redact_numbers: Whether to redact currency/numbers
         logo_replacement_text: Text to show in logo placeholders
         text_redaction_color: Color for text redaction (black)
         logo_redaction_color: Color for logo redaction (white)
+        term_index: Optional TermIndex for this document; terms are then only
+            searched on pages whose text can contain them
+        template_registry: Optional TemplateRegistry; documents with a known
+            layout get their stored field rectangles instead of a search,
+            and unknown layouts are learned after the full pipeline
+        pages: Optional set of 0-based page numbers to redact (default: all)
+        doc: Optional document already opened from ``pdf_bytes`` (e.g. by
+            ``open_pdf_bytes``) or from a file; it is used instead of parsing
+            the bytes again and closed when done
+        governor: Optional ResourceGovernor; its budgets are checked between
+            pages (also during raster logo detection), and drawings-based and
+            raster logo detection are skipped once it reports degraded mode
+        pages_only: With ``pages``, return only the redacted pages instead
+            of the whole document (e.g. for a first-screen preview)
+        page_sink: Optional callable ``(page_num, page_count, pdf_bytes)``
+            called with each page as a single-page PDF as soon as it is
+            redacted (e.g. a ``page_stream.PageSpool``)
+        image_strategy: Image handling for redactions, "targeted" or
+            "pixels" (see ``image_redaction``; default from
+            REDACT_IMAGE_STRATEGY)
     
     Returns:
         bytes: Redacted PDF as raw bytes
+    
+    Raises:
+        ValueError: If the bytes are not a usable PDF (see ``open_pdf_bytes``)
+        BudgetExceeded: If the governor's page, time or memory budget is hit
     """
-    doc = None
     new_doc = None
+    if doc is None:
+        doc = open_pdf_bytes(pdf_bytes)  # ValueError passes through: the input is at fault
     
     try:
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        if governor is not None:
+            governor.check_pages(doc.page_count)
+        
+        # One detector per document so repeated letterhead logos are decided once
+        logo_detector = new_logo_detector(doc) if redact_logos else None
+        
+        # Logos inside scanned page images are only visible in the pixels
+        raster_logos = {}
+        if redact_logos:
+            candidates = RasterLogoDetector().detect(doc, pages, governor)
+            raster_logos = {page_num: [c["rect"] for c in found]
+                            for page_num, found in candidates.items()}
         
-        if not doc.page_count:
-            raise ValueError("PDF contains no pages")
+        term_pages = None
+        if term_index is not None:
+            term_pages = {term: term_index.candidate_pages(term) for term in terms}
+        
+        # Known templates supply their field rectangles; only what the
+        # template does not cover is searched (and learned afterwards)
+        signature = None
+        template = None
+        template_misses = 0
+        found_by_page = {}
+        if template_registry is not None and pages is None:
+            # Partial runs would store partial fields, so they are not learned
+            signature = layout_signature(doc)
+            template = template_registry.match(signature, terms, redact_numbers)
         
         for page_num, page in enumerate(doc):
+            if pages is not None and page_num not in pages:
+                continue
+            if governor is not None:
+                governor.check(f"page {page_num + 1}")
+                if governor.degraded and logo_detector and logo_detector.vectors:
+                    logging.warning("Skipping drawings-based logo detection from page %d", page_num + 1)
+                    logo_detector.vectors = False
             logging.info("Processing page %d", page_num + 1)
-            logging.info("User terms to redact: %s", terms)
-            logging.info("Logo redaction enabled: %s", redact_logos)
-            logging.info("Number redaction enabled: %s", redact_numbers)
-            
-            # Redact keyword terms (black redaction)
-            for term in terms:
-                if not term.strip():
-                    continue
-                search_results = page.search_for(term.strip(), flags=IGNORECASE)
-                for rect in search_results:
-                    page.add_redact_annot(rect, fill=text_redaction_color)
-                    logging.info("Redacting keyword: '%s' at %s", term, rect)
-            
-            # Redact numbers if requested (black redaction)
-            number_boxes = []
-            if redact_numbers:
-                logging.info("Redacting numbers")
-                number_boxes = find_numbers_simple(page)
-                for bbox in number_boxes:
-                    page.add_redact_annot(bbox, fill=text_redaction_color)
-                    logging.info("Redacting number at %s", bbox)
-                    
-            # Redact visual logos if requested (white redaction)
-            logo_boxes = []
-            if redact_logos:
-                logging.info("Redacting visual logos")
-                # Pass the user terms to logo detection so they can be excluded
-                logo_boxes = find_logos_simple(page, exclude_terms=terms)
-                for bbox in logo_boxes:
-                    page.add_redact_annot(bbox, fill=logo_redaction_color)
-                    logging.info("Redacting visual logo at %s", bbox)
-            
-            # Apply all redactions
-            page.apply_redactions()
-            
-            # Add logo placeholders after redaction
-            if redact_logos and logo_boxes:
-                for bbox in logo_boxes:
-                    try:
-                        add_simple_placeholder(page, bbox, logo_replacement_text)
-                        logging.info("Added logo placeholder at %s", bbox)
-                    except Exception as e:
-                        logging.warning("Could not add placeholder: %s", e)
-            
-            logging.info("Page %d processing complete. Applied %d keyword redactions, %d number redactions, %d logo redactions", 
-                        page_num + 1, len(terms), len(number_boxes), len(logo_boxes))
+            search_terms = None
+            if term_pages is not None:
+                search_terms = [term for term in terms if page_num in term_pages[term]]
+            known_boxes = {}
+            if template is not None:
+                known_boxes = verified_template_boxes(page, template, terms)
+                if len(known_boxes) < sum(template[kind] is not None for kind in ("terms", "numbers")):
+                    template_misses += 1
+            found_by_page[page_num] = {}
+            redact_page(
+                page, terms,
+                search_terms=search_terms,
+                logo_detector=logo_detector,
+                known_boxes=known_boxes,
+                found_boxes=found_by_page[page_num] if signature else None,
+                redact_logos=redact_logos,
+                redact_numbers=redact_numbers,
+                logo_replacement_text=logo_replacement_text,
+                text_redaction_color=text_redaction_color,
+                logo_redaction_color=logo_redaction_color,
+                image_strategy=image_strategy,
+                extra_logo_boxes=raster_logos.get(page_num)
+            )
+            if page_sink is not None:
+                page_sink(page_num, doc.page_count, single_page_pdf(doc, page_num))
+        
+        if logo_detector:
+            logo_detector.log_stats()
+        
+        if signature:
+            numbers_known = not redact_numbers or (template is not None and template["numbers"] is not None)
+            if template is None or template["terms"] is None or not numbers_known or template_misses:
+                template_registry.learn(signature, terms, found_by_page, numbers_learned=redact_numbers)
+            else:
+                logging.info("Template %s: all fields taken from the registry", signature[:12])
+            if template_misses:
+                logging.info("Template %s: %d page(s) did not match their stored fields and were searched",
+                             signature[:12], template_misses)
         
         # Create new document
         new_doc = fitz.open()
-        new_doc.insert_pdf(doc)
-        out_bytes = new_doc.write()
+        if pages is not None and pages_only:
+            for page_num in sorted(pages):
+                new_doc.insert_pdf(doc, from_page=page_num, to_page=page_num)
+        else:
+            new_doc.insert_pdf(doc)
+        out_bytes, merge_stats = write_optimized(new_doc)
+        logging.info("Output %d bytes (input %d), %d of %d image stream(s) merged", len(out_bytes),
+                     len(pdf_bytes) if pdf_bytes is not None else os.path.getsize(doc.name),
+                     merge_stats["merged"], merge_stats["images"])
         return out_bytes
         
+    except BudgetExceeded:
+        raise
     except Exception as e:
         logging.error("PDF redaction failed: %s", e)
         raise Exception("Failed to process PDF: " + str(e))
@@ -96,7 +177,189 @@ def redact_pdf_bytes(pdf_bytes, terms, redact_logos=False, redact_numbers=False,
             new_doc.close()
 
 
-def find_logos_simple(page, exclude_terms=None):
+def redact_pdf_file(pdf_path, terms, redact_logos=False, redact_numbers=False, registry_path=None, limits=None, page_sink=None, output_path=None):
+    """
+    Redact a PDF from disk (entry point for worker processes)
+    
+    The document is opened by path, so MuPDF reads it from the file as
+    needed instead of the worker holding the whole upload in memory.
+    
+    Args:
+        pdf_path: Uploaded PDF on disk
+        terms: List of text terms to redact
+        redact_logos: Whether to redact visual logo elements
+        redact_numbers: Whether to redact currency/numbers
+        registry_path: Optional template registry path (SQLite)
+        limits: Optional ResourceGovernor limits (the governor is created in
+            the worker so its clock and memory baseline belong to it)
+        page_sink: Optional per-page callback (see ``redact_pdf_bytes``)
+        output_path: Optional file to write the result to instead of
+            returning it, so it is not sent back through the pool
+    
+    Returns:
+        bytes: Redacted PDF as raw bytes, or None with ``output_path``
+    """
+    redacted_bytes = redact_pdf_bytes(
+        None, terms,
+        redact_logos=redact_logos,
+        redact_numbers=redact_numbers,
+        doc=open_pdf_file(pdf_path),
+        template_registry=get_registry(registry_path) if registry_path else None,
+        governor=ResourceGovernor(**limits) if limits is not None else None,
+        page_sink=page_sink
+    )
+    if output_path is None:
+        return redacted_bytes
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(redacted_bytes)
+    os.replace(tmp_path, output_path)
+    return None
+
+
+def verified_template_boxes(page, template, terms):
+    """
+    Redaction boxes for a page from its stored template fields
+    
+    Each stored field's text line (the field's height padded by
+    FIELD_PADDING, across the page) is searched again for the terms or the
+    number patterns, so the hits are the same boxes the full search finds on
+    that line. A kind (terms or numbers) is only returned when the page has
+    a stored entry and every field still holds a hit; otherwise the page is
+    searched normally for that kind.
+    
+    Args:
+        page: fitz.Page
+        template: Result of ``TemplateRegistry.match``
+        terms: The requested term list
+    
+    Returns:
+        dict: "terms" and/or "numbers" -> list of fitz.Rect
+    """
+    known = {}
+    for kind in ("terms", "numbers"):
+        fields = template[kind]
+        if fields is None or page.number not in fields:
+            continue
+        hits_by_line = {}
+        for field in fields[page.number]:
+            line = (round(field.y0 - FIELD_PADDING, 1), round(field.y1 + FIELD_PADDING, 1))
+            if line not in hits_by_line:
+                textpage = page.get_textpage(clip=fitz.Rect(page.rect.x0, line[0], page.rect.x1, line[1]))
+                if kind == "terms":
+                    hits_by_line[line] = [hit for term in terms if term.strip()
+                                          for hit in page.search_for(term.strip(), textpage=textpage)]
+                else:
+                    hits_by_line[line] = find_numbers_simple(page, textpage=textpage).rects(NUMBER)
+            if not any(hit.intersects(field) for hit in hits_by_line[line]):
+                logging.info("Page %d: stored %s field %s no longer matches, searching", page.number + 1, kind, field)
+                break
+        else:
+            known[kind] = [hit for hits in hits_by_line.values() for hit in hits]
+    return known
+
+
+def redact_page(page, terms, redact_logos=False, redact_numbers=False, logo_replacement_text="LOGO", text_redaction_color=(0, 0, 0), logo_redaction_color=(1, 1, 1), search_terms=None, logo_detector=None, known_boxes=None, found_boxes=None, image_strategy=None, extra_logo_boxes=None, raster_detector=None):
+    """
+    Apply keyword, number and logo redactions to a single page
+    
+    Args:
+        page: PyMuPDF page object (modified in place)
+        terms: List of text terms to redact
+        redact_logos: Whether to redact visual logo elements
+        redact_numbers: Whether to redact currency/numbers
+        logo_replacement_text: Text to show in logo placeholders
+        text_redaction_color: Color for text redaction (black)
+        logo_redaction_color: Color for logo redaction (white)
+        search_terms: Subset of terms to search for on this page (defaults to
+            all terms); the full list is still used for logo exclusion
+        logo_detector: Optional LogoDetector shared across the document's pages
+        known_boxes: Optional dict with precomputed "terms" and/or "numbers"
+            boxes (e.g. template fields); the matching search is skipped
+        found_boxes: Optional dict that receives the "terms" and "numbers"
+            boxes that were redacted
+        image_strategy: "targeted" (default) touches images only where a
+            redaction needs it; "pixels" blanks pixels under every box
+        extra_logo_boxes: Optional logo boxes found elsewhere (e.g. by
+            raster detection on scanned pages), redacted with the others
+        raster_detector: Optional RasterLogoDetector run on this page when
+            ``extra_logo_boxes`` is not given (e.g. for previews, which
+            redact one page at a time)
+    
+    Returns:
+        RedactionBatch: The redactions applied to the page
+    """
+    known_boxes = known_boxes or {}
+    logging.info("User terms to redact: %s", terms)
+    logging.info("Logo redaction enabled: %s", redact_logos)
+    logging.info("Number redaction enabled: %s", redact_numbers)
+    
+    batch = RedactionBatch()
+    
+    # Redact keyword terms (black redaction)
+    term_boxes = known_boxes.get("terms")
+    if term_boxes is None:
+        for term in (terms if search_terms is None else search_terms):
+            if not term.strip():
+                continue
+            search_results = page.search_for(term.strip(), flags=IGNORECASE)
+            if search_results:
+                logging.info("Redacting keyword '%s': %d hit(s)", term, len(search_results))
+            batch.extend(search_results, TERM, text_redaction_color)
+    else:
+        batch.extend(term_boxes, TERM, text_redaction_color)
+    
+    # Redact numbers if requested (black redaction)
+    if redact_numbers:
+        logging.info("Redacting numbers")
+        number_boxes = known_boxes.get("numbers")
+        if number_boxes is None:
+            find_numbers_simple(page, batch, text_redaction_color)
+        else:
+            batch.extend(number_boxes, NUMBER, text_redaction_color)
+            
+    # Redact visual logos if requested (white redaction)
+    logo_boxes = []
+    if redact_logos:
+        logging.info("Redacting visual logos")
+        # Pass the user terms to logo detection so they can be excluded
+        logo_boxes = find_logos_simple(page, exclude_terms=terms, detector=logo_detector)
+        if extra_logo_boxes is None and raster_detector is not None:
+            extra_logo_boxes = raster_detector.logo_rects(page)
+        logo_boxes.extend(extra_logo_boxes or [])
+        for bbox in logo_boxes:
+            logging.info("Redacting visual logo at %s", bbox)
+        batch.extend(logo_boxes, LOGO, logo_redaction_color)
+    
+    if found_boxes is not None:
+        found_boxes["terms"] = batch.rects(TERM)
+        found_boxes["numbers"] = batch.rects(NUMBER)
+    
+    # Apply all redactions, touching images only where needed
+    apply_grouped(page, batch, image_strategy)
+    
+    # Add logo placeholders after redaction
+    if redact_logos and logo_boxes:
+        for bbox in logo_boxes:
+            try:
+                add_simple_placeholder(page, bbox, logo_replacement_text)
+                logging.info("Added logo placeholder at %s", bbox)
+            except Exception as e:
+                logging.warning("Could not add placeholder: %s", e)
+    
+    logging.info("Page %d processing complete. Applied %d keyword redactions, %d number redactions, %d logo redactions", 
+                page.number + 1, batch.count(TERM), batch.count(NUMBER), len(logo_boxes))
+    
+    return batch
+
+
+def new_logo_detector(doc):
+    """LogoDetector with the thresholds used by find_logos_simple"""
+    # Top 15% for logos, max 40% width, 15-200pt in size
+    return LogoDetector(doc, header_ratio=0.15, max_width_ratio=0.40, min_dim=15, max_dim=200, image_padding=2)
+
+
+def find_logos_simple(page, exclude_terms=None, detector=None):
     """
     COMPREHENSIVE logo detection - images, drawings, and company text patterns
     Based on the working pdf_processor.py approach
@@ -104,10 +367,14 @@ def find_logos_simple(page, exclude_terms=None):
     Args:
         page: PyMuPDF page object
         exclude_terms: List of user-specified terms to exclude from logo detection
+        detector: Optional LogoDetector shared across the document's pages
     """
     if exclude_terms is None:
         exclude_terms = []
     
+    if detector is None:
+        detector = new_logo_detector(page.parent)
+    
     # Convert exclude_terms to lowercase for case-insensitive comparison
     exclude_terms_lower = [term.lower().strip() for term in exclude_terms if term.strip()]
     
@@ -121,52 +388,21 @@ def find_logos_simple(page, exclude_terms=None):
         page_width = page_rect.width
         page_height = page_rect.height
         max_logo_y0 = page_height * 0.15  # Top 15% for logos
-        max_logo_width = page_width * 0.40  # Max 40% width
-        min_dim = 15
-        max_dim = 200
         
-        # Strategy 1: Image-based logos
+        # Strategy 1: Image-based logos (header-band placements, cached per xref)
         try:
-            images = page.get_images(full=True)
-            logging.info("Found %d images on page", len(images))
-            
-            for img_index, img_info in enumerate(images):
-                try:
-                    xref = img_info[0]
-                    img_instances = page.get_image_rects(xref, transform=False)
-                    
-                    for rect in img_instances:
-                        if (rect.y0 < max_logo_y0 and 
-                            min_dim < rect.width < max_logo_width and 
-                            min_dim < rect.height < max_dim and 
-                            rect.is_valid and not rect.is_empty):
-                            
-                            # Expand slightly for better coverage
-                            expanded_rect = (rect + (-2, -2, 2, 2)).normalize()
-                            logo_boxes.append(expanded_rect)
-                            logging.info("*** IMAGE LOGO DETECTED: %s ***", expanded_rect)
-                            
-                except Exception as e:
-                    logging.warning("Error processing image %d: %s", img_index, e)
+            for rect in detector.image_logo_rects(page):
+                logo_boxes.append(rect)
+                logging.info("*** IMAGE LOGO DETECTED: %s ***", rect)
                     
         except Exception as e:
             logging.warning("Error in image logo detection: %s", e)
         
-        # Strategy 2: Vector drawings/graphics
+        # Strategy 2: Vector drawings/graphics (reused for identical headers)
         try:
-            draw_rect = fitz.Rect(0, 0, page_width, max_logo_y0 + 10)
-            drawings = page.get_drawings(rect=draw_rect)
-            
-            for drawing in drawings:
-                if "rect" in drawing:
-                    rect = fitz.Rect(drawing["rect"])
-                    if (rect.y0 < max_logo_y0 and 
-                        min_dim < rect.width < max_logo_width and 
-                        min_dim < rect.height < max_dim and 
-                        rect.is_valid and not rect.is_empty):
-                        
-                        logo_boxes.append(rect)
-                        logging.info("*** VECTOR LOGO DETECTED: %s ***", rect)
+            for rect in detector.vector_logo_rects(page):
+                logo_boxes.append(rect)
+                logging.info("*** VECTOR LOGO DETECTED: %s ***", rect)
                         
         except Exception as e:
             logging.warning("Error in vector logo detection: %s", e)
@@ -267,7 +503,7 @@ def merge_logo_rects(rects, tolerance=5):
     return merged
 
 
-def find_numbers_simple(page):
+def find_numbers_simple(page, batch=None, fill=(0, 0, 0), textpage=None):
     """
     Enhanced number detection for currency amounts and financial data
     
@@ -282,58 +518,48 @@ def find_numbers_simple(page):
     - Phone numbers
     - Reference numbers
     
+    Args:
+        page: fitz.Page
+        batch: RedactionBatch to add the hits to (default: a new one)
+        fill: Fill colour recorded for the hits
+        textpage: Optional TextPage to read instead of the whole page (e.g.
+            one clipped to a template field)
+    
     Returns:
-        list: List of bounding boxes for detected numbers
+        RedactionBatch: The batch, with one NUMBER entry per hit
     """
-    number_boxes = []
+    if batch is None:
+        batch = RedactionBatch()
+    found = 0
     
     try:
-        text_dict = page.get_text("dict")
+        text_dict = page.get_text("dict", textpage=textpage)
         for block in text_dict.get("blocks", []):
             if "lines" in block:
                 for line in block["lines"]:
                     for span in line.get("spans", []):
                         text = span.get("text", "").strip()
-                        bbox = fitz.Rect(span["bbox"])
-                        
                         if not text:
                             continue
                         
                         # Skip dates and addresses
-                        if re.search(r"\d{1,2}[./]\d{1,2}[./]\d{4}|\d{6}|street|phone|email", text, re.IGNORECASE):
+                        if NUMBER_SKIP_PATTERN.search(text):
                             continue
                         
-                        # Enhanced currency patterns
-                        patterns = [
-                            r"€\s*\d+[.,]\d{2}",           # €123.45
-                            r"\$\s*\d+[.,]\d{2}",          # $123.45
-                            r"CHF\s*\d+[.,]\d{2}",         # CHF 123.45
-                            r"\b\d{1,4}[.,]\d{2}\b",       # 123.45, 1234.56
-                            r"\b\d+[.,]0{1,2}\b",          # 123.00, 45.0
-                            r"\b[1-9]\d{0,2}[.,]\d{1,2}\b" # 1.2, 12.34, 123.45
-                        ]
-                        
-                        for pattern in patterns:
-                            matches = list(re.finditer(pattern, text))
-                            for match in matches:
-                                start_char = match.start()
-                                end_char = match.end()
-                                char_width = bbox.width / len(text) if len(text) > 0 else 0
-                                
-                                number_bbox = fitz.Rect(
-                                    bbox.x0 + (start_char * char_width),
-                                    bbox.y0,
-                                    bbox.x0 + (end_char * char_width),
-                                    bbox.y1
-                                )
-                                
-                                number_boxes.append(number_bbox)
-                                logging.info("Found currency: '%s' in '%s'", match.group(), text)
+                        x0, y0, x1, y1 = span["bbox"]
+                        char_width = (x1 - x0) / len(text)
+                        for pattern in NUMBER_PATTERNS:
+                            for match in pattern.finditer(text):
+                                batch.add(x0 + match.start() * char_width, y0,
+                                          x0 + match.end() * char_width, y1, NUMBER, fill)
+                                found += 1
                                 
     except Exception as e:
         logging.warning("Error in number detection: %s", e)
     
-    return number_boxes
+    if found:
+        logging.info("Found %d currency value(s) on page %d", found, page.number + 1)
+    return batch
 
 
 def remove_overlaps(boxes):
@@ -399,44 +625,108 @@ def add_simple_placeholder(page, bbox, text="LOGO"):
         logging.warning("Could not add placeholder: %s", e)
 
 
-def validate_pdf_bytes(pdf_bytes):
+def check_pdf_signature(head):
     """
-    Validate that the provided bytes represent a valid PDF
+    Constant-time first tier of PDF validation
+    
+    Only looks at the start of the file: the ``%PDF-`` header must appear in
+    the first HEADER_WINDOW bytes. The end of the file is not checked - a
+    missing ``%%EOF`` marker is repaired by MuPDF, which rebuilds the xref
+    of truncated or damaged files when they are opened. Nothing is parsed.
     
     Args:
-        pdf_bytes: Raw PDF bytes to validate
+        head: First bytes of the file (at least HEADER_WINDOW if available)
         
     Returns:
-        bool: True if valid PDF, False otherwise
+        tuple: (is_valid, message)
     """
+    if not head:
+        return False, "File is empty"
+    if b"%PDF-" not in head[:HEADER_WINDOW]:
+        return False, "Missing PDF header"
+    return True, "Valid"
+
+
+def open_pdf_bytes(pdf_bytes):
+    """
+    Tiered PDF validation that returns the opened document
+    
+    Tier 1 is ``check_pdf_signature``. Tier 2 opens the document, which reads
+    the xref table, and takes the page count from the page tree without
+    loading any page. The open document is returned so the processing stage
+    can use it instead of parsing the bytes again.
+    
+    Args:
+        pdf_bytes: Raw PDF bytes
+        
+    Returns:
+        fitz.Document: The open document (caller closes it)
+        
+    Raises:
+        ValueError: If the bytes are not a usable PDF
+    """
+    return _open_validated(pdf_bytes[:HEADER_WINDOW], stream=pdf_bytes)
+
+
+def open_pdf_file(pdf_path):
+    """
+    ``open_pdf_bytes`` for a file on disk, without reading it into memory
+    
+    Only the header window is read for tier 1; MuPDF then opens the file by
+    path.
+    
+    Raises:
+        ValueError: If the file is not a usable PDF
+    """
+    with open(pdf_path, "rb") as f:
+        head = f.read(HEADER_WINDOW)
+    return _open_validated(head, filename=pdf_path)
+
+
+def _open_validated(head, **source):
+    """Signature check, then open ``source`` (fitz.open keywords) and check the document"""
+    is_valid, message = check_pdf_signature(head)
+    if not is_valid:
+        raise ValueError(message)
+    
     try:
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        is_valid = doc.page_count > 0
+        doc = fitz.open(filetype="pdf", **source)
+    except Exception as e:
+        raise ValueError(f"Unreadable PDF: {e}")
+    
+    if doc.needs_pass:
+        doc.close()
+        raise ValueError("PDF is password protected")
+    if not doc.page_count:
         doc.close()
-        return is_valid
-    except:
-        return False
+        raise ValueError("PDF contains no pages")
+    return doc
 
 
-def get_pdf_info(pdf_bytes):
+def get_pdf_info(pdf_bytes, doc=None):
     """
     Extract basic information about the PDF
     
     Args:
         pdf_bytes: Raw PDF bytes
+        doc: Optional already open document for these bytes (left open)
         
     Returns:
         dict: PDF information including page count, metadata, etc.
     """
+    owned = doc is None
     try:
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        if owned:
+            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
         info = {
             "page_count": doc.page_count,
             "metadata": doc.metadata,
             "is_encrypted": doc.is_encrypted,
             "needs_pass": doc.needs_pass
         }
-        doc.close()
         return info
     except Exception as e:
         return {"error": str(e)}
+    finally:
+        if owned and doc is not None:
+            doc.close()
@@ -0,0 +1,139 @@
+# image_redaction.py
+"""
+Image handling for redactions, chosen per redaction box.
+
+``page.apply_redactions()`` takes one image policy for the whole page, and
+the default (blank the overlapping pixels) decodes and re-encodes every
+image a box touches. A scanned page with one background image is then
+re-encoded for every text redaction. Boxes are therefore grouped:
+
+    remove  a logo box that fully covers every image it touches - the
+            images are dropped, nothing is decoded
+    pixels  a logo box that only partly covers an image, or text over an
+            image that the reader does not see (invisible or fully
+            transparent, like an OCR layer, or drawn before an image that
+            paints over it) - the image may show the same words, so
+            pixels inside the overlap are blanked
+    none    everything else: visible text, or boxes that touch no image -
+            images are left alone
+
+and ``apply_redactions`` runs once per non-empty group. The "pixels"
+strategy blanks pixels under every box (the old ``custom.redact_page``
+behaviour).
+"""
+import os
+import logging
+
+import fitz
+
+from redaction_records import LOGO
+
+STRATEGIES = ("targeted", "pixels")
+DEFAULT_STRATEGY = os.environ.get("REDACT_IMAGE_STRATEGY", "targeted")
+COVER_TOLERANCE = 3  # Points an image may stick out of a logo box and still count as covered
+INVISIBLE_TEXT = 3   # Text trace type for text that is not drawn (OCR layers)
+IMAGE_KINDS = ("fill-image", "fill-imgmask")  # get_bboxlog entries that draw an image
+
+REMOVE = fitz.PDF_REDACT_IMAGE_REMOVE
+PIXELS = fitz.PDF_REDACT_IMAGE_PIXELS
+NONE = fitz.PDF_REDACT_IMAGE_NONE
+
+
+class PageImages:
+    """Image placements and hidden text on a page, read on first use"""
+
+    def __init__(self, page):
+        self.page = page
+        self._images = None
+        self._hidden_rects = None
+
+    @property
+    def images(self):
+        """(seqno, rect) per image drawn, in content-stream order"""
+        if self._images is None:
+            self._images = [(seqno, fitz.Rect(bbox)) for seqno, (kind, bbox, *_) in enumerate(self.page.get_bboxlog())
+                            if kind in IMAGE_KINDS]
+        return self._images
+
+    @property
+    def image_rects(self):
+        return [rect for _, rect in self.images]
+
+    @property
+    def hidden_rects(self):
+        """Text spans the reader does not see: invisible, transparent, or painted over by a later image"""
+        if self._hidden_rects is None:
+            self._hidden_rects = []
+            for span in self.page.get_texttrace():
+                rect = fitz.Rect(span["bbox"])
+                if (span.get("type") == INVISIBLE_TEXT or span.get("opacity") == 0 or
+                        any(seqno > span["seqno"] and image.intersects(rect) for seqno, image in self.images)):
+                    self._hidden_rects.append(rect)
+        return self._hidden_rects
+
+    def touching(self, box):
+        return [rect for rect in self.image_rects if rect.intersects(box)]
+
+
+def logo_policy(box, images):
+    """REMOVE when the box covers every image it touches, PIXELS for a partial cover, else NONE"""
+    touched = images.touching(box)
+    if not touched:
+        return NONE
+    covered = box + (-COVER_TOLERANCE, -COVER_TOLERANCE, COVER_TOLERANCE, COVER_TOLERANCE)
+    if all(covered.contains(rect) for rect in touched):
+        return REMOVE
+    return PIXELS
+
+
+def text_policy(box, images):
+    """PIXELS for hidden text over an image (the image may show the words), else NONE"""
+    if not images.touching(box):
+        return NONE
+    if any(rect.intersects(box) for rect in images.hidden_rects):
+        return PIXELS
+    return NONE
+
+
+def apply_grouped(page, batch, strategy=None):
+    """
+    Add and apply a page's redactions with per-box image handling
+
+    Args:
+        page: fitz.Page
+        batch: RedactionBatch; LOGO entries follow the logo rules, all
+            other kinds the text rules
+        strategy: "targeted" or "pixels" (default: REDACT_IMAGE_STRATEGY)
+
+    Returns:
+        int: Number of apply_redactions calls made
+    """
+    strategy = strategy or DEFAULT_STRATEGY
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown image redaction strategy: {strategy}")
+
+    groups = {}
+    if strategy == "pixels":
+        if len(batch):
+            groups[PIXELS] = batch.indexes()
+    else:
+        images = PageImages(page)
+        for i in batch.indexes():
+            rect = batch.rect(i)
+            policy = logo_policy(rect, images) if batch.kinds[i] == LOGO else text_policy(rect, images)
+            groups.setdefault(policy, []).append(i)
+
+    calls = 0
+    # Image-free groups first: later pixel blanking then sees the final text
+    for policy in (NONE, REMOVE, PIXELS):
+        indexes = groups.get(policy)
+        if not indexes:
+            continue
+        batch.add_annots(page, indexes)
+        page.apply_redactions(images=policy)
+        calls += 1
+    if calls > 1 or PIXELS in groups:
+        logging.info("Page %d image handling: %s", page.number + 1,
+                     {name: len(groups.get(policy, [])) for name, policy in
+                      (("none", NONE), ("remove", REMOVE), ("pixels", PIXELS))})
+    return calls
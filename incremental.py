@@ -0,0 +1,185 @@
+# incremental.py
+import threading
+import logging
+import fitz
+
+from custom import IGNORECASE, open_pdf_bytes
+
+
+class IncrementalRedactor:
+    """
+    Re-redacts a document incrementally while the term list is being edited
+
+    The original bytes are opened once. For every term the redactor remembers
+    which pages it matched, so adding or removing a term only re-renders the
+    pages whose match set changed. Those pages are copied fresh from the
+    original, redacted, and spliced into the previously rendered output.
+
+    Work is lazy: ``update`` can be limited to a page range, and only those
+    pages are searched and redacted. Pages outside the range keep whatever
+    state they had until a later request covers them, so the first screen of
+    a long document is ready without touching the rest of it.
+
+    Args:
+        pdf_bytes: Raw bytes of the original PDF
+        redact_page_fn: Callable ``(page, terms)`` that redacts one page in place
+            using only the given terms (e.g. a partial of ``custom.redact_page``)
+        logo_terms_sensitive: Set when logo detection excludes user terms
+            (``custom.find_logos_simple``); header text on each page is then
+            indexed so a term that changes logo exclusion also marks the page dirty
+        header_ratio: Height fraction of the header band used for that index
+        term_index: Optional TermIndex; new terms are then only searched on
+            pages whose text can contain them
+    """
+
+    def __init__(self, pdf_bytes, redact_page_fn, logo_terms_sensitive=False, header_ratio=0.15, term_index=None):
+        self.redact_page_fn = redact_page_fn
+        self.logo_terms_sensitive = logo_terms_sensitive
+        self.header_ratio = header_ratio
+        self.term_index = term_index
+        # Raises ValueError for damaged, encrypted or empty documents
+        self.source = open_pdf_bytes(pdf_bytes)
+
+        # Output starts as an unredacted copy of the pages only (no metadata,
+        # outline or embedded files, as in redact_pdf_bytes); pages are
+        # redacted on first request
+        self.output = fitz.open()
+        self.output.insert_pdf(self.source)
+        self.page_keys = [None] * self.source.page_count  # Terms applied per page (None: not redacted yet)
+        self.term_hits = {}  # Normalised term -> {page number: matches}
+        self.term_candidates = {}  # Normalised term -> candidate pages from the term index
+        self.header_texts = {}  # Page number -> lowercase header span texts
+        self.last_pages_rendered = 0
+        self.lock = threading.Lock()
+
+    @property
+    def page_count(self):
+        return self.source.page_count
+
+    @staticmethod
+    def normalise(term):
+        """Terms are matched case-insensitively, so they are keyed that way"""
+        return str(term).strip().lower()
+
+    def _term_on_page(self, key, page_num):
+        """Whether a term matches on a page (searched once, then remembered)"""
+        hits = self.term_hits.setdefault(key, {})
+        hit = hits.get(page_num)
+        if hit is None:
+            if self.term_index is not None:
+                candidates = self.term_candidates.get(key)
+                if candidates is None:
+                    candidates = self.term_candidates[key] = self.term_index.candidate_pages(key)
+                if page_num not in candidates:
+                    hits[page_num] = False
+                    return False
+            hit = hits[page_num] = bool(self.source[page_num].search_for(key, flags=IGNORECASE))
+        return hit
+
+    def _header_spans(self, page_num):
+        """Lowercase span texts in a page's header band"""
+        spans = self.header_texts.get(page_num)
+        if spans is None:
+            page = self.source[page_num]
+            clip = fitz.Rect(0, 0, page.rect.width, page.rect.height * self.header_ratio)
+            spans = []
+            for block in page.get_text("dict", flags=fitz.TEXT_PRESERVE_LIGATURES, clip=clip)["blocks"]:
+                for line in block.get("lines", []):
+                    for span in line.get("spans", []):
+                        text = span.get("text", "").strip().lower()
+                        if text:
+                            spans.append(text)
+            self.header_texts[page_num] = spans
+        return spans
+
+    def _header_matches(self, key, page_num):
+        """Whether a term would exclude header text on a page from logo detection"""
+        # Mirrors the exclusion test in find_logos_simple
+        return any(key in text or text in key for text in self._header_spans(page_num))
+
+    def _page_key_for(self, keys, page_num):
+        """The set of terms that affect one page"""
+        return frozenset(
+            key for key in keys
+            if self._term_on_page(key, page_num)
+            or (self.logo_terms_sensitive and self._header_matches(key, page_num))
+        )
+
+    def _render_page(self, page_num, key):
+        """Replace one output page with a freshly redacted copy of the original"""
+        self.output.delete_page(page_num)
+        self.output.insert_pdf(self.source, from_page=page_num, to_page=page_num, start_at=page_num)
+        self.redact_page_fn(self.output[page_num], sorted(key))
+
+    def update(self, terms, page_range=None, governor=None):
+        """
+        Redact the document for a new term list, reusing unchanged pages
+
+        Args:
+            terms: Full list of terms to redact
+            page_range: Optional ``range`` of 0-based page numbers; only these
+                pages are brought up to date and returned
+            governor: Optional ResourceGovernor; the requested range is held
+                to its page budget and time/memory are checked before each
+                page that needs rendering
+
+        Returns:
+            bytes: Redacted PDF as raw bytes (only the requested pages when
+                ``page_range`` is given)
+
+        Raises:
+            BudgetExceeded: If the governor's page, time or memory budget is hit
+        """
+        with self.lock:
+            if page_range is None:
+                page_range = range(self.source.page_count)
+                whole = True
+            else:
+                page_range = range(max(page_range.start, 0), min(page_range.stop, self.source.page_count))
+                whole = len(page_range) == self.source.page_count
+                if not page_range:
+                    raise ValueError("Page range is outside the document")
+
+            if governor is not None:
+                governor.check_pages(len(page_range))
+
+            keys = {self.normalise(term) for term in terms} - {""}
+            rendered = 0
+            for page_num in page_range:
+                if governor is not None:
+                    governor.check(f"preview page {page_num + 1}")
+                key = self._page_key_for(keys, page_num)
+                if self.page_keys[page_num] is None:
+                    # First render: the page also needs its term-independent redactions
+                    self.redact_page_fn(self.output[page_num], sorted(key))
+                elif key != self.page_keys[page_num]:
+                    self._render_page(page_num, key)
+                else:
+                    continue
+                self.page_keys[page_num] = key
+                rendered += 1
+
+            self.last_pages_rendered = rendered
+            logging.info("Incremental redaction re-rendered %d page(s) of %d-%d (%d in document)",
+                         rendered, page_range.start + 1, page_range.stop, self.source.page_count)
+
+            if whole:
+                # garbage=1 drops the objects of pages that were replaced
+                return self.output.write(garbage=1)
+
+            part = fitz.open()
+            try:
+                part.insert_pdf(self.output, from_page=page_range.start, to_page=page_range.stop - 1)
+                return part.write(garbage=1)
+            finally:
+                part.close()
+
+    def close(self):
+        """Release both documents"""
+        with self.lock:
+            if self.output:
+                self.output.close()
+                self.output = None
+            if self.source:
+                self.source.close()
+                self.source = None
@@ -0,0 +1,119 @@
+# job_manifest.py
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+from datetime import datetime
+
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+def hash_bytes(data):
+    """SHA-256 hex digest of raw bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_options(options):
+    """Stable hash of the options that affect a job's output (terms, flags, engine)"""
+    return hashlib.sha256(json.dumps(options, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class JobManifest:
+    """
+    Persistent per-file job records for resumable batches
+
+    One row per (input hash, options hash) with status, output path, timing
+    and optional details (e.g. the processing log). A batch that is restarted
+    after a crash asks ``completed()`` first and skips work that already
+    finished. Backed by SQLite so the Streamlit app, the Flask app and the
+    batch CLI can all share it; every call opens its own short-lived
+    connection, which keeps it safe across threads and processes.
+
+    Args:
+        db_path: SQLite file (created if missing), e.g. ``downloads/jobs.sqlite3``
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    input_hash   TEXT NOT NULL,
+                    options_hash TEXT NOT NULL,
+                    name         TEXT,
+                    status       TEXT NOT NULL,
+                    output_path  TEXT,
+                    seconds      REAL,
+                    error        TEXT,
+                    details      TEXT,
+                    updated_at   TEXT,
+                    PRIMARY KEY (input_hash, options_hash)
+                )
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _upsert(self, input_hash, options_hash, **fields):
+        fields["updated_at"] = datetime.now().isoformat(timespec="seconds")
+        columns = ["input_hash", "options_hash"] + list(fields)
+        placeholders = ", ".join("?" for _ in columns)
+        updates = ", ".join(f"{name}=excluded.{name}" for name in fields)
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO jobs ({', '.join(columns)}) VALUES ({placeholders}) "
+                f"ON CONFLICT(input_hash, options_hash) DO UPDATE SET {updates}",
+                [input_hash, options_hash] + list(fields.values())
+            )
+
+    def get(self, input_hash, options_hash):
+        """Return the job record as a dict, or None"""
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE input_hash=? AND options_hash=?",
+                (input_hash, options_hash)
+            ).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        record["details"] = json.loads(record["details"]) if record["details"] else None
+        return record
+
+    def completed(self, input_hash, options_hash):
+        """
+        Finished job record whose output still exists on disk
+
+        Returns:
+            dict or None: The record, or None if the work has to be (re)done
+        """
+        record = self.get(input_hash, options_hash)
+        if record and record["status"] == STATUS_DONE and record["output_path"] and os.path.exists(record["output_path"]):
+            return record
+        return None
+
+    def start(self, input_hash, options_hash, name=None):
+        """Mark a job as running"""
+        self._upsert(input_hash, options_hash, name=name, status=STATUS_RUNNING, error=None)
+        return time.perf_counter()
+
+    def finish(self, input_hash, options_hash, output_path, seconds, name=None, details=None):
+        """Mark a job as done with its output path and timing"""
+        self._upsert(input_hash, options_hash, name=name, status=STATUS_DONE, output_path=output_path,
+                     seconds=seconds, error=None, details=json.dumps(details) if details is not None else None)
+
+    def fail(self, input_hash, options_hash, error, seconds=None, name=None):
+        """Mark a job as failed"""
+        self._upsert(input_hash, options_hash, name=name, status=STATUS_FAILED, seconds=seconds, error=str(error))
+        logging.warning("Job %s failed: %s", name or input_hash[:12], error)
+
+    def summary(self):
+        """Counts per status"""
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
@@ -2,10 +2,10 @@
 import streamlit as st
 import os
 import base64
-from PIL import Image
 
+@st.cache_resource(show_spinner=False)
 def get_base64_encoded_image(image_path):
-    """Get base64 encoded version of an image file"""
+    """Get base64 encoded version of an image file (encoded once per process)"""
     try:
         with open(image_path, "rb") as img_file:
             return base64.b64encode(img_file.read()).decode()
@@ -13,6 +13,12 @@ def get_base64_encoded_image(image_path):
         st.error(f"Error reading image file: {e}")
         return ""
 
+@st.cache_resource(show_spinner=False)
+def get_image_bytes(image_path):
+    """Read an image file once per process so reruns don't hit the disk or PIL"""
+    with open(image_path, "rb") as img_file:
+        return img_file.read()
+
 def show_landing_page():
     """
     Display the landing page using Streamlit's native components
@@ -94,8 +100,7 @@ def show_landing_page():
     
     # Logo with reduced bottom margin
     if os.path.exists(logo_path):
-        image = Image.open(logo_path)
-        st.image(image, width=80)
+        st.image(get_image_bytes(logo_path), width=80)
     
     # Title with reduced spacing
     st.markdown("<h1 style='color: white; margin-top: 10px; margin-bottom: 20px;'>Data Shield Platform</h1>", unsafe_allow_html=True)
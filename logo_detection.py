@@ -0,0 +1,158 @@
+# logo_detection.py
+import logging
+import fitz
+
+MAX_HEADER_PATHS = 2000  # Logos are a handful of paths; more means charts/CAD
+PATH_KINDS = ("fill-path", "stroke-path")
+
+
+def iter_header_path_rects(page, band_bottom, max_paths=MAX_HEADER_PATHS):
+    """
+    Stream bounding boxes of vector paths that start inside the header band
+
+    Uses ``page.get_bboxlog()``, which reports one (kind, bbox) tuple per
+    drawing operation, instead of ``get_drawings()``, which builds a dict
+    with the full item list for every path on the page. ``get_bboxlog``
+    takes no clip, so the whole page is still interpreted and its full
+    list built first; the header filter and the ``max_paths`` cap only
+    apply afterwards and bound the per-path work, not that pass.
+
+    Args:
+        page: PyMuPDF page object
+        band_bottom: y coordinate of the bottom of the header band
+        max_paths: Maximum number of paths yielded
+
+    Yields:
+        tuple: (x0, y0, x1, y1) path bounding boxes
+    """
+    yielded = 0
+    for entry in page.get_bboxlog():
+        kind, bbox = entry[0], entry[1]
+        if kind not in PATH_KINDS or bbox[1] >= band_bottom:
+            continue
+        if yielded >= max_paths:
+            logging.info("Header path cap (%d) reached on page %d", max_paths, page.number + 1)
+            return
+        yielded += 1
+        yield bbox
+
+
+class LogoDetector:
+    """
+    Document-level logo detection for images and vector drawings
+
+    Letterhead documents repeat the same logo xref on every page. The
+    detector keeps one image-xref -> placement map for the whole document,
+    built from ``get_images`` (resource dictionary only) and
+    ``get_image_info()`` without hashes, so no image is decoded or digested.
+    Every page with images gets its own content pass: a shared Form XObject
+    can be drawn with a different matrix, or more than once, on each page.
+
+    Geometry is checked before any per-image work: only placements inside the
+    header band are recorded at all.
+
+    Args:
+        doc: The ``fitz.Document`` whose pages will be passed to the detector
+        header_ratio: Logos must start in the top ``header_ratio`` of the page
+        max_width_ratio: Maximum logo width as a fraction of the page width
+        min_dim: Minimum logo width/height in points
+        max_dim: Maximum logo height in points
+        image_padding: Points added around detected image logos
+        max_paths: Cap on header-band paths examined per page (chart-heavy pages)
+    """
+
+    def __init__(self, doc, header_ratio=0.15, max_width_ratio=0.40, min_dim=15, max_dim=200, image_padding=2, max_paths=MAX_HEADER_PATHS):
+        self.doc = doc
+        self.header_ratio = header_ratio
+        self.max_width_ratio = max_width_ratio
+        self.min_dim = min_dim
+        self.max_dim = max_dim
+        self.image_padding = image_padding
+        self.max_paths = max_paths
+        self.vectors = True  # Cleared to skip drawings (resource governor)
+
+        self.placements = {}        # xref -> {page_num: [header-band rects]}
+        self.stats = {"pages": 0}
+
+    def header_band(self, page):
+        """Bottom edge (y) of the header band for a page"""
+        return page.rect.height * self.header_ratio
+
+    def is_logo_rect(self, rect, page_rect):
+        """Header-band geometry test shared by every strategy"""
+        return (rect.y0 < page_rect.height * self.header_ratio and
+                self.min_dim < rect.width < page_rect.width * self.max_width_ratio and
+                self.min_dim < rect.height < self.max_dim and
+                rect.is_valid and not rect.is_empty)
+
+    @staticmethod
+    def _xrefs_by_size(images):
+        """(width, height, bpc) -> xref for image sizes used by exactly one xref"""
+        by_size = {}
+        for item in images:
+            by_size.setdefault((item[2], item[3], item[4]), set()).add(item[0])
+        return {size: xrefs.pop() for size, xrefs in by_size.items() if len(xrefs) == 1}
+
+    def _page_placements(self, page):
+        """Header-band image placements of one page, recorded in the xref map"""
+        # get_images only reads the resource dictionary; pages without
+        # images never need a content-stream pass
+        images = page.get_images(full=True)
+        if not images:
+            return []
+
+        band_y = self.header_band(page)
+        xref_for = self._xrefs_by_size(images)
+        found = []
+        # One content pass for all images; without hashes nothing is decoded.
+        # The xref is matched by image size (0 when ambiguous); the logo
+        # decision itself only depends on the placement.
+        for info in page.get_image_info():
+            rect = fitz.Rect(info["bbox"])
+            if rect.y0 >= band_y:
+                continue  # Outside the header band - no further work
+            found.append((xref_for.get((info["width"], info["height"], info["bpc"]), 0), rect))
+        self._record(page.number, found)
+        return found
+
+    def _record(self, page_num, found):
+        for xref, rect in found:
+            self.placements.setdefault(xref, {}).setdefault(page_num, []).append(rect)
+
+    def image_logo_rects(self, page):
+        """
+        Image-based logo boxes for a page
+
+        Returns:
+            list: fitz.Rect boxes, expanded by ``image_padding``
+        """
+        self.stats["pages"] += 1
+        page_rect = page.rect
+        pad = self.image_padding
+        return [(rect + (-pad, -pad, pad, pad)).normalize()
+                for _, rect in self._page_placements(page) if self.is_logo_rect(rect, page_rect)]
+
+    def vector_logo_rects(self, page):
+        """
+        Vector-drawing logo boxes for a page
+
+        Path boxes come from ``iter_header_path_rects``, so no path item
+        lists are built and paths below the header band are dropped unread.
+
+        Returns:
+            list: fitz.Rect boxes
+        """
+        if not self.vectors:
+            return []
+        page_rect = page.rect
+        boxes = []
+        for bbox in iter_header_path_rects(page, self.header_band(page), max_paths=self.max_paths):
+            rect = fitz.Rect(bbox)
+            if self.is_logo_rect(rect, page_rect):
+                boxes.append(rect)
+        return boxes
+
+    def log_stats(self):
+        """Log how many pages and header-band xrefs were seen"""
+        logging.info("Logo detector: %d page(s), %d xref(s) in header band",
+                     self.stats["pages"], len(self.placements))
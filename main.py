@@ -1,13 +1,9 @@
 # main.py (Final Corrected Implementation)
 import streamlit as st
-import pandas as pd
 import os
-from io import BytesIO
-import base64
 import zipfile
 import time
 import uuid
-import sys
 import tempfile
 
 # Set page configuration FIRST - before any other Streamlit commands or imports
@@ -20,10 +16,10 @@ st.set_page_config(
 )
 
 # Then import other modules and functions
-from pdf_processor import process_pdf_with_enhanced_protection, display_pdf_file, generate_preview, display_pdf_preview
-from scanned_files import detect_scanned_pdf, process_scanned_pdf
-from reset import check_for_reset_flag, clear_uploads
-# Modified import to avoid duplicate set_page_config
+# Only the lightweight UI modules are imported up front. The processing stack
+# (fitz, pdf_processor, scanned_files) is loaded on first use so the landing
+# page renders without paying for it. Set DATA_SHIELD_FAST_START=0 to import
+# everything eagerly (e.g. for pre-warmed workers).
 from landing import show_landing_page
 from user_journey import (
     horizontal_stepper, 
@@ -34,14 +30,172 @@ from user_journey import (
     create_section_header
 )
 
+FAST_START = os.environ.get("DATA_SHIELD_FAST_START", "1") != "0"
+
+# Lazy wrappers - the real implementations are imported on first call
+def process_pdf_with_enhanced_protection(*args, **kwargs):
+    from pdf_processor import process_pdf_with_enhanced_protection as _impl
+    return _impl(*args, **kwargs)
+
+def display_pdf_file(*args, **kwargs):
+    from pdf_processor import display_pdf_file as _impl
+    return _impl(*args, **kwargs)
+
+def detect_scanned_pdf(*args, **kwargs):
+    from scanned_files import detect_scanned_pdf as _impl
+    return _impl(*args, **kwargs)
+
+def process_scanned_pdf(*args, **kwargs):
+    from scanned_files import process_scanned_pdf as _impl
+    return _impl(*args, **kwargs)
+
+def check_for_reset_flag(*args, **kwargs):
+    from reset import check_for_reset_flag as _impl
+    return _impl(*args, **kwargs)
+
+def clear_uploads(*args, **kwargs):
+    from reset import clear_uploads as _impl
+    return _impl(*args, **kwargs)
+
+if not FAST_START:
+    import pdf_processor, scanned_files, reset  # noqa: F401 - eager warm-up
+
+def get_job_manifest():
+    """Persistent job manifest shared by all Step 4 batches"""
+    from job_manifest import JobManifest
+    return JobManifest(os.path.join("downloads", "jobs.sqlite3"))
+
+def get_content_store():
+    """Content-addressed store for originals and outputs (size-capped)"""
+    from content_store import ContentStore
+    max_mb = int(os.environ.get("DATA_SHIELD_STORE_MB", "2048"))
+    return ContentStore(os.path.join("downloads", "store"), max_bytes=max_mb * 1024 * 1024)
+
+def pin_stored_file(path):
+    """Take a reference on a stored file for this session (once)"""
+    sha = os.path.splitext(os.path.basename(path))[0]
+    if 'store_refs' not in st.session_state:
+        st.session_state.store_refs = set()
+    if sha not in st.session_state.store_refs:
+        get_content_store().add_ref(sha)
+        st.session_state.store_refs.add(sha)
+
+def store_original(pdf):
+    """Store an upload by content hash and return its path"""
+    store = get_content_store()
+    if 'store_refs' not in st.session_state:
+        st.session_state.store_refs = set()
+    sha = store.put(pdf.getvalue(), ref=False)
+    if sha not in st.session_state.store_refs:
+        store.add_ref(sha)
+        st.session_state.store_refs.add(sha)
+    return store.path(sha)
+
+def store_output(work_path):
+    """Move a finished output into the content store and return its stored path"""
+    store = get_content_store()
+    sha = store.put_file(work_path)
+    pin_stored_file(store.path(sha))
+    return store.path(sha)
+
+def release_stored_files():
+    """Drop this session's references so the files become evictable"""
+    store = get_content_store()
+    for sha in st.session_state.get('store_refs', set()):
+        store.release(sha)
+    st.session_state.store_refs = set()
+
+@st.cache_resource(show_spinner=False)
+def get_preview_renderer():
+    """Background preview renderer shared by all sessions (one worker pool per process)"""
+    from prerender import PreviewRenderer
+    return PreviewRenderer()
+
+def prerender_review(*paths):
+    """Queue background rendering of the Step 5 previews for these files"""
+    renderer = get_preview_renderer()
+    for path in paths:
+        renderer.submit(path)
+
+def display_review_pdf(path, key):
+    """Show pre-rendered preview pages, falling back to the full PDF viewer"""
+    preview = get_preview_renderer().result(path)
+    if preview is None:
+        st.info("Preview is still rendering in the background...")
+        if st.button("Refresh preview", key=f"refresh_{key}"):
+            st.rerun()
+    elif preview.get("error") or not preview["images"]:
+        display_pdf_file(path)
+        return
+    else:
+        for page_num, image in enumerate(preview["images"], start=1):
+            st.image(image, caption=f"Page {page_num} of {preview['page_count']}", use_container_width=True)
+    
+    # The full embedded viewer is only built on request
+    if st.checkbox("Show full document", key=f"full_{key}"):
+        display_pdf_file(path)
+
+def display_visual_diff(pdf_path, output_path, key):
+    """List the pages and regions that changed between original and output"""
+    if 'visual_diffs' not in st.session_state:
+        st.session_state.visual_diffs = {}
+    
+    diff_key = (pdf_path, output_path)
+    changes = st.session_state.visual_diffs.get(diff_key)
+    if changes is None:
+        from visual_diff import diff_documents
+        with st.spinner("Comparing pages..."):
+            changes = diff_documents(pdf_path, output_path)
+        st.session_state.visual_diffs[diff_key] = changes
+    
+    if not changes:
+        st.info("No visual changes found between the original and the processed document.")
+        return
+    
+    st.write(f"{len(changes)} page(s) changed")
+    labels = [f"Page {change['page']} - {len(change['boxes'])} region(s)" for change in changes]
+    selected = st.selectbox("Jump to page", range(len(changes)), format_func=lambda i: labels[i], key=f"diff_page_{key}")
+    change = changes[selected]
+    st.image(change['overlay'], caption=f"Changed regions on page {change['page']}", use_container_width=True)
+
 def process_single_pdf(pdf, words_to_replace, pdf_path, idx):
     """Helper function to process a single PDF and update UI"""
     # Create progress indicator
     progress_bar = st.progress(0)
     status_text = st.empty()
     
-    # Define output path
-    output_pdf_path = pdf_path.replace(".pdf", "_masked.pdf")
+    if 'processed_info' not in st.session_state:
+        st.session_state.processed_info = {}
+    
+    # Resume: skip files the job manifest already completed with these options
+    from job_manifest import hash_bytes, hash_options
+    manifest = get_job_manifest()
+    input_hash = hash_bytes(pdf.getvalue())
+    options_hash = hash_options({
+        "engine": "streamlit",
+        "words": sorted(words_to_replace),
+        "remove_logos": st.session_state.processing_options['remove_logos'],
+        "add_watermarks": st.session_state.processing_options['add_watermarks']
+    })
+    record = manifest.completed(input_hash, options_hash)
+    if record:
+        # Identical input and options - serve the stored output
+        log_data = (record['details'] or {}).get('log', [])
+        pin_stored_file(record['output_path'])
+        st.session_state.processed_info[pdf.name] = {
+            'path': record['output_path'],
+            'original_path': pdf_path,
+            'log': log_data,
+            'processing_time': record['seconds'] or 0
+        }
+        prerender_review(pdf_path, record['output_path'])
+        progress_bar.progress(100)
+        status_text.text("Already processed - reusing previous result")
+        return record['output_path'], log_data
+    manifest.start(input_hash, options_hash, name=pdf.name)
+    
+    # Work file; moved into the content store once processing succeeds
+    output_pdf_path = os.path.join("downloads", f"{input_hash[:16]}_{options_hash[:16]}_masked.pdf")
     
     # Process document with progress updates
     status_text.text("Checking document type...")
@@ -53,14 +207,25 @@ def process_single_pdf(pdf, words_to_replace, pdf_path, idx):
         status_text.text("Detected scanned PDF. Using optimized processing...")
         progress_bar.progress(25)
         
-        # Process scanned PDF with special handling
+        # Process scanned PDF with special handling; pages matching previously
+        # processed scans reuse their stored regions instead. This route is not
+        # windowed (see Pdf_processor.process_pdf_windowed), so long scans are
+        # still held in memory whole
+        from scan_hash_index import ScanHashIndex, process_with_scan_index
         start_time = time.time()
-        log_data = process_scanned_pdf(
-            pdf_path, 
-            words_to_replace, 
+        log_data = process_with_scan_index(
+            pdf_path,
             output_pdf_path,
-            remove_logos=st.session_state.processing_options['remove_logos'],
-            add_watermarks=st.session_state.processing_options['add_watermarks']
+            options_hash,
+            lambda in_path, out_path: process_scanned_pdf(
+                in_path, 
+                words_to_replace, 
+                out_path,
+                remove_logos=st.session_state.processing_options['remove_logos'],
+                add_watermarks=st.session_state.processing_options['add_watermarks']
+            ),
+            ScanHashIndex(os.path.join("downloads", "scan_index.sqlite3")),
+            terms=words_to_replace
         )
         processing_time = time.time() - start_time
     else:
@@ -74,28 +239,102 @@ def process_single_pdf(pdf, words_to_replace, pdf_path, idx):
             words_to_replace, 
             output_pdf_path, 
             remove_logos=st.session_state.processing_options['remove_logos'],
-            add_watermarks=st.session_state.processing_options['add_watermarks']
+            add_watermarks=st.session_state.processing_options['add_watermarks'],
+            term_index=get_term_index(pdf)
         )
         processing_time = time.time() - start_time
     
     progress_bar.progress(75)
     
-    # Track processed files in session state
-    if 'processed_info' not in st.session_state:
-        st.session_state.processed_info = {}
+    # Record the outcome so a restarted batch continues where it stopped
+    # Only a "FINISHED OK" run leaves an output file (a skipped file has none)
+    if log_data and "FINISHED OK" in log_data[-1] and os.path.exists(output_pdf_path):
+        output_pdf_path = store_output(output_pdf_path)
+        manifest.finish(input_hash, options_hash, output_pdf_path, processing_time,
+                        name=pdf.name, details={'log': log_data})
+    else:
+        manifest.fail(input_hash, options_hash, log_data[-1] if log_data else "no output",
+                      processing_time, name=pdf.name)
     
+    # Track processed files in session state
     st.session_state.processed_info[pdf.name] = {
         'path': output_pdf_path,
+        'original_path': pdf_path,
         'log': log_data,
         'processing_time': processing_time
     }
     
+    # Start rendering the Step 5 previews while the next file is processed
+    prerender_review(pdf_path, output_pdf_path)
+    
     # Update progress and status
     progress_bar.progress(100)
     status_text.text(f"Processing complete in {processing_time:.2f} seconds")
     
     return output_pdf_path, log_data
 
+def display_masked_preview(pdf):
+    """Show the masked version of a PDF for its current word list (incremental)"""
+    from functools import partial
+    from incremental import IncrementalRedactor
+    from pdf_processor import process_page, display_pdf_preview
+    
+    options = st.session_state.processing_options
+    if 'incremental_redactors' not in st.session_state:
+        st.session_state.incremental_redactors = {}
+    
+    # One redactor per file and option set; it keeps the last rendered output
+    key = (pdf.name, options['remove_logos'], options['add_watermarks'])
+    redactor = st.session_state.incremental_redactors.get(key)
+    if redactor is None:
+        redactor = IncrementalRedactor(
+            pdf.getvalue(),
+            partial(process_page, remove_logos=options['remove_logos'], add_watermarks=options['add_watermarks']),
+            term_index=get_term_index(pdf)
+        )
+        st.session_state.incremental_redactors[key] = redactor
+    
+    words = st.session_state.file_words_to_mask.get(pdf.name, [])
+    try:
+        masked_bytes = redactor.update(words)
+        st.caption(f"Re-rendered {redactor.last_pages_rendered} page(s)")
+        st.markdown(display_pdf_preview(masked_bytes), unsafe_allow_html=True)
+    except Exception as e:
+        st.error(f"Masked preview failed: {str(e)}")
+
+def get_term_index(pdf):
+    """Term index for an uploaded PDF, built once per upload and kept in session state"""
+    import hashlib
+    from term_index import TermIndex
+    
+    if 'term_indexes' not in st.session_state:
+        st.session_state.term_indexes = {}
+    
+    key = hashlib.sha256(pdf.getvalue()).hexdigest()
+    if key not in st.session_state.term_indexes:
+        st.session_state.term_indexes[key] = TermIndex.from_bytes(pdf.getvalue())
+    return st.session_state.term_indexes[key]
+
+def display_term_hits(pdf):
+    """Show how often and where the word being typed occurs, before it is added"""
+    term = (st.session_state.get('new_word') or "").strip()
+    if not term:
+        return
+    
+    index = get_term_index(pdf)
+    result = index.lookup(term)
+    if result['count']:
+        pages = ", ".join(str(p) for p in result['pages'][:20])
+        if len(result['pages']) > 20:
+            pages += ", ..."
+        st.caption(f"'{term}': {result['count']} hit(s) on page(s) {pages}")
+    else:
+        completions = index.complete(term.split()[-1], limit=5)
+        message = f"'{term}': no whole-word matches"
+        if completions:
+            message += " - similar words: " + ", ".join(f"{token} ({count})" for token, count in completions)
+        st.caption(message)
+
 # Helper function to display word list to avoid the columns nesting issue
 def display_word_list(words, current_file):
     """Display the list of words to mask directly in the UI"""
@@ -199,6 +438,11 @@ def main():
                 # Display success message
                 st.success(f"Successfully uploaded {len(uploaded_pdfs)} document(s)")
                 
+                # Index each upload once so Step 2 can show term hits instantly
+                with st.spinner("Indexing documents..."):
+                    for pdf in uploaded_pdfs:
+                        get_term_index(pdf)
+                
                 # Show uploaded files in a grid
                 columns = st.columns(3)
                 for i, pdf in enumerate(uploaded_pdfs):
@@ -293,6 +537,10 @@ def main():
                         
                         # Clean up temporary file
                         os.unlink(tmp_file_path)
+                        
+                        # Masked preview - only pages affected by word list edits are re-rendered
+                        if st.checkbox("Preview masked result", key=f"masked_preview_{selected_pdf.name}"):
+                            display_masked_preview(selected_pdf)
                     
                     with col2:
                         # Word masking section
@@ -307,6 +555,7 @@ def main():
                             key="new_word",
                             help="Type a word or phrase to mask and press Enter"
                         )
+                        display_term_hits(selected_pdf)
                         
                         # Add and Clear buttons
                         col_add, col_clear = st.columns(2)
@@ -347,6 +596,10 @@ def main():
                     
                     # Clean up temporary file
                     os.unlink(tmp_file_path)
+                    
+                    # Masked preview - only pages affected by word list edits are re-rendered
+                    if st.checkbox("Preview masked result", key=f"masked_preview_{selected_pdf.name}"):
+                        display_masked_preview(selected_pdf)
                 
                 with col2:
                     # Word masking section with header
@@ -361,6 +614,7 @@ def main():
                         key="new_word",
                         help="Type a word or phrase to mask and press Enter"
                     )
+                    display_term_hits(selected_pdf)
                     
                     # Add and Clear buttons
                     col_add, col_clear = st.columns(2)
@@ -446,16 +700,9 @@ def main():
             
             # Process PDFs
             if st.session_state.uploaded_pdfs:
-                # Save all PDFs to disk to ensure they are available
+                # Save all PDFs to the content store (by hash, so names can't collide)
                 for pdf in st.session_state.uploaded_pdfs:
-                    pdf_path = os.path.join("downloads", pdf.name)
-                    
-                    # Ensure downloads directory exists
-                    os.makedirs("downloads", exist_ok=True)
-                    
-                    if not os.path.exists(pdf_path):
-                        with open(pdf_path, "wb") as f:
-                            f.write(pdf.getvalue())
+                    store_original(pdf)
                 
                 # Count PDFs with words to process
                 pdfs_to_process = []
@@ -495,7 +742,7 @@ def main():
                             for idx, pdf in enumerate(pdfs_to_process):
                                 status_text.text(f"Processing {pdf.name} ({idx+1}/{len(pdfs_to_process)})")
                                 words_to_replace = st.session_state.file_words_to_mask[pdf.name]
-                                pdf_path = os.path.join("downloads", pdf.name)
+                                pdf_path = store_original(pdf)
                                 
                                 try:
                                     # Process the PDF
@@ -547,7 +794,7 @@ def main():
                     processed_data = st.session_state.processed_info[pdf_name]
                     output_path = processed_data['path']
                     log_data = processed_data['log']
-                    pdf_path = os.path.join("downloads", pdf_name)
+                    pdf_path = processed_data.get('original_path', os.path.join("downloads", pdf_name))
                     
                     # Show the processed version with original side by side
                     with tabs[idx]:
@@ -567,7 +814,7 @@ def main():
                                 <h5 style="margin: 0;">📄 Original PDF</h5>
                             </div>
                             """, unsafe_allow_html=True)
-                            display_pdf_file(pdf_path)
+                            display_review_pdf(pdf_path, f"original_{idx}")
                         
                         with col2:
                             st.markdown("""
@@ -575,7 +822,11 @@ def main():
                                 <h5 style="margin: 0;">🔒 Processed PDF</h5>
                             </div>
                             """, unsafe_allow_html=True)
-                            display_pdf_file(output_path)
+                            display_review_pdf(output_path, f"processed_{idx}")
+                        
+                        # Jump straight to the redacted regions
+                        if st.checkbox("Show changed regions", key=f"diff_{idx}"):
+                            display_visual_diff(pdf_path, output_path, idx)
                         
                         # Show log data in an expander
                         if log_data:
@@ -648,12 +899,11 @@ def main():
                     </div>
                     """, unsafe_allow_html=True)
                     
-                    # Create ZIP of processed files
-                    processed_paths = [info['path'] for info in st.session_state.processed_info.values()]
-                    zip_path = os.path.join("downloads", "masked_pdfs.zip")
+                    # Create ZIP of processed files (stored outputs are named by hash)
+                    zip_path = os.path.join("downloads", f"masked_pdfs_{st.session_state.run_id}.zip")
                     with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                        for processed_file in processed_paths:
-                            zipf.write(processed_file, os.path.basename(processed_file))
+                        for pdf_name, info in st.session_state.processed_info.items():
+                            zipf.write(info['path'], f"{os.path.splitext(pdf_name)[0]}_masked.pdf")
                     
                     # Bulk download button
                     with open(zip_path, "rb") as f:
@@ -682,6 +932,7 @@ def main():
                     st.session_state.current_file = None
                     st.session_state.processed_info = {}
                     st.session_state.journey_step = 1
+                    release_stored_files()
                     clear_uploads()
                     st.rerun()
             else:
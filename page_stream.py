@@ -0,0 +1,103 @@
+# page_stream.py
+import os
+import json
+import base64
+import shutil
+from concurrent.futures import wait
+
+import fitz
+
+POLL_INTERVAL = 0.1  # Seconds between checks for pages written by a worker
+
+
+def single_page_pdf(doc, page_num):
+    """Copy one page of a document into a PDF of its own"""
+    part = fitz.open()
+    try:
+        part.insert_pdf(doc, from_page=page_num, to_page=page_num)
+        return part.write(garbage=1)
+    finally:
+        part.close()
+
+
+def sse_event(event, data):
+    """Format one server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def page_event(name, page_num, page_count, pdf_bytes):
+    """A ``page`` event carrying one redacted page as a base64 single-page PDF"""
+    return sse_event("page", {
+        "file": name,
+        "page": page_num + 1,
+        "total": page_count,
+        "pdf": base64.b64encode(pdf_bytes).decode("ascii")
+    })
+
+
+class PageSpool:
+    """
+    Hands redacted pages from a worker process to a streaming response
+
+    The spool is passed to the worker as the ``page_sink`` of
+    ``custom.redact_pdf_bytes`` (it only holds a directory name, so it
+    pickles into the pool). Each finished page is written there as a
+    single-page PDF; the response side collects them with ``take_pages``
+    and deletes each file once read, so only pages not yet sent are kept.
+    The worker writes the whole output to ``output_path`` in the same
+    directory, from where it is moved into the content store.
+
+    Args:
+        directory: Spool directory for this job (removed by ``remove``)
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.output_path = os.path.join(directory, "output")  # Not a page name: take_pages skips it
+        os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, page_num, page_count, pdf_bytes):
+        path = os.path.join(self.directory, f"{page_num:06d}-{page_count:06d}.pdf")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(pdf_bytes)
+        os.replace(tmp_path, path)  # The reader never sees a partial page
+
+    def take_pages(self):
+        """
+        Pages written since the last call
+
+        Returns:
+            list: (page_num, page_count, pdf_bytes) in page order
+        """
+        try:
+            names = sorted(name for name in os.listdir(self.directory) if name.endswith(".pdf"))
+        except FileNotFoundError:
+            return []
+        pages = []
+        for name in names:
+            page_num, page_count = (int(value) for value in name[:-4].split("-"))
+            path = os.path.join(self.directory, name)
+            with open(path, "rb") as f:
+                pages.append((page_num, page_count, f.read()))
+            os.remove(path)
+        return pages
+
+    def remove(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def stream_job_pages(name, future, spool, poll=POLL_INTERVAL):
+    """
+    Yield ``page`` events for a pool job as its pages are written
+
+    Returns once the job has finished and every page it wrote was sent; the
+    caller then reads the job's result from the future.
+    """
+    while True:
+        done = future.done()
+        for page_num, page_count, pdf_bytes in spool.take_pages():
+            yield page_event(name, page_num, page_count, pdf_bytes)
+        if done:
+            return
+        wait([future], timeout=poll)
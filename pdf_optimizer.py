@@ -0,0 +1,220 @@
+# pdf_optimizer.py
+"""
+Output optimisation: merge duplicate image streams and drop unreferenced
+objects.
+
+Letterhead PDFs often embed the same logo once per page, and redaction
+leaves orphaned image streams behind. Images are fingerprinted by the
+SHA-256 of their raw stream plus their dictionary, every reference to a
+duplicate is pointed at one canonical xref, and the file is written with
+garbage collection so the duplicates and orphans are dropped.
+
+Usage:
+    python pdf_optimizer.py input.pdf [output.pdf]
+"""
+import os
+import re
+import sys
+import hashlib
+import logging
+
+import fitz
+
+_REFERENCE = re.compile(r"(?<![\d.])(\d+) 0 R\b")
+
+
+def _object_digest(doc, xref, cache):
+    """Hash of an object's dictionary and raw stream data, with references resolved the same way"""
+    if xref not in cache:
+        cache[xref] = f"#{xref}"  # Placeholder while resolving, in case of reference cycles
+        text = _REFERENCE.sub(lambda match: _object_digest(doc, int(match.group(1)), cache),
+                              doc.xref_object(xref, compressed=True))
+        digest = hashlib.sha256(text.encode("utf-8", "replace"))
+        if doc.xref_is_stream(xref):
+            digest.update(doc.xref_stream_raw(xref) or b"")
+        cache[xref] = digest.hexdigest()
+    return cache[xref]
+
+
+def image_fingerprint(doc, xref, cache=None):
+    """
+    Hash of an image's raw stream and its dictionary
+
+    References in the dictionary (soft mask, ICC colour space) are replaced
+    by the hash of the object they point to, so copies that each carry their
+    own identical mask or colour space still match.
+    """
+    return _object_digest(doc, xref, {} if cache is None else cache)
+
+
+def _image_xrefs(doc):
+    for xref in range(1, doc.xref_length()):
+        if doc.xref_is_stream(xref) and doc.xref_get_key(xref, "Subtype") == ("name", "/Image"):
+            yield xref
+
+
+# Where an image can be referenced from: XObject resources (of pages, Form
+# XObjects, Type3 fonts, patterns and appearance streams), masks of other
+# images and page thumbnails
+_IMAGE_REFERRING_KEYS = ("SMask", "Mask", "Thumb")
+
+
+def _resolve(value):
+    return int(value.split()[0])
+
+
+def _xobject_dict(doc, xref):
+    """
+    Locate an object's XObject resource dictionary
+
+    Returns:
+        tuple: (xref, key) holding the dictionary inline, (xref, None) when
+        the dictionary is an object of its own, or None
+    """
+    kind, value = doc.xref_get_key(xref, "Resources")
+    if kind == "xref":
+        xref, key = _resolve(value), "XObject"
+    elif kind == "dict":
+        key = "Resources/XObject"
+    else:
+        return None
+    kind, value = doc.xref_get_key(xref, key)
+    if kind == "xref":
+        return _resolve(value), None
+    if kind == "dict":
+        return xref, key
+    return None
+
+
+def _redirect_references(doc, replacements):
+    """
+    Point every indirect reference to a merged image at its canonical xref
+
+    Only the keys that can refer to an image are visited (resource
+    XObject dictionaries and _IMAGE_REFERRING_KEYS), not every key of
+    every object.
+    """
+    def replace(match):
+        xref = int(match.group(1))
+        return f"{replacements.get(xref, xref)} 0 R"
+
+    def redirect(xref, key):
+        kind, value = doc.xref_get_key(xref, key)
+        if kind not in ("xref", "dict", "array"):
+            return
+        updated = _REFERENCE.sub(replace, value)
+        if updated != value:
+            doc.xref_set_key(xref, key, updated)
+
+    resource_dicts = set()
+    for xref in range(1, doc.xref_length()):
+        if xref in replacements:
+            continue
+        try:
+            location = _xobject_dict(doc, xref)
+            for key in _IMAGE_REFERRING_KEYS:
+                redirect(xref, key)
+        except Exception:
+            continue  # Free or broken entries
+        if location is None or location in resource_dicts:
+            continue  # Resource dictionaries shared by many pages are rewritten once
+        resource_dicts.add(location)
+        owner, key = location
+        if key is not None:
+            redirect(owner, key)
+        else:
+            # Key by key: the names of a stand-alone XObject dictionary
+            for name in doc.xref_get_keys(owner):
+                redirect(owner, name)
+
+
+def merge_duplicate_images(doc):
+    """
+    Merge identical image streams into one xref each (in place)
+
+    Only references change; the duplicates become unreferenced and are
+    removed when the document is saved with ``garbage`` >= 1.
+
+    Args:
+        doc: Open fitz.Document
+
+    Returns:
+        dict: images (image streams seen) and merged (duplicates redirected)
+    """
+    canonical = {}
+    replacements = {}
+    cache = {}
+    stats = {"images": 0, "merged": 0}
+    for xref in _image_xrefs(doc):
+        stats["images"] += 1
+        fingerprint = image_fingerprint(doc, xref, cache)
+        if fingerprint in canonical:
+            replacements[xref] = canonical[fingerprint]
+        else:
+            canonical[fingerprint] = xref
+    if replacements:
+        _redirect_references(doc, replacements)
+        stats["merged"] = len(replacements)
+        logging.info("Merged %d duplicate image stream(s) of %d", stats["merged"], stats["images"])
+    return stats
+
+
+def write_optimized(doc):
+    """
+    Merge duplicate images and serialise without unreferenced objects
+
+    Returns:
+        tuple: (PDF bytes, merge stats)
+    """
+    stats = merge_duplicate_images(doc)
+    # garbage=4 also merges other identical objects and streams (e.g. fonts)
+    return doc.tobytes(garbage=4, deflate=True), stats
+
+
+def optimize_pdf_bytes(pdf_bytes):
+    """
+    Optimise a PDF held in memory
+
+    Returns:
+        tuple: (optimised bytes, report with images, merged, bytes_before,
+            bytes_after and saved)
+    """
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        out_bytes, stats = write_optimized(doc)
+    finally:
+        doc.close()
+    if len(out_bytes) >= len(pdf_bytes):
+        out_bytes = pdf_bytes  # Already compact - keep the original
+    report = dict(stats, bytes_before=len(pdf_bytes), bytes_after=len(out_bytes),
+                  saved=len(pdf_bytes) - len(out_bytes))
+    logging.info("Optimised PDF: %d -> %d bytes (%d saved)",
+                 report["bytes_before"], report["bytes_after"], report["saved"])
+    return out_bytes, report
+
+
+def optimize_file(path, output_path=None):
+    """
+    Optimise a PDF on disk (in place unless ``output_path`` is given)
+
+    Returns:
+        dict: The report from ``optimize_pdf_bytes``
+    """
+    with open(path, "rb") as f:
+        pdf_bytes = f.read()
+    out_bytes, report = optimize_pdf_bytes(pdf_bytes)
+    output_path = output_path or path
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(out_bytes)
+    os.replace(tmp_path, output_path)
+    return report
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print(__doc__.strip().splitlines()[-1].strip())
+        sys.exit(2)
+    result = optimize_file(*sys.argv[1:])
+    print(f"{result['merged']} duplicate image(s) merged, "
+          f"{result['bytes_before']} -> {result['bytes_after']} bytes ({result['saved']} saved)")
@@ -0,0 +1,101 @@
+# prerender.py
+import os
+import atexit
+import logging
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+PREVIEW_PAGES = 5     # Pages rendered per document for Step 5
+PREVIEW_DPI = 72      # Low DPI - enough for side-by-side review
+CACHE_ENTRIES = 64    # Rendered documents kept in memory
+
+
+def render_preview_pages(pdf_path, max_pages=PREVIEW_PAGES, dpi=PREVIEW_DPI):
+    """
+    Render the first pages of a PDF to PNG (runs in a worker process)
+
+    Args:
+        pdf_path: PDF file to render
+        max_pages: Number of pages to render
+        dpi: Render resolution
+
+    Returns:
+        dict: page_count and a list of PNG bytes
+    """
+    import fitz  # Imported in the worker only
+
+    doc = fitz.open(pdf_path)
+    try:
+        images = []
+        for page_num in range(min(max_pages, doc.page_count)):
+            images.append(doc[page_num].get_pixmap(dpi=dpi).tobytes("png"))
+        return {"page_count": doc.page_count, "images": images}
+    finally:
+        doc.close()
+
+
+class PreviewRenderer:
+    """
+    Background pre-rendering of review previews
+
+    Files are submitted as soon as Step 4 finishes them, and Step 5 only
+    reads finished results, so review tabs never render on the script
+    thread. PyMuPDF is not thread-safe, so the rendering itself runs in a
+    small process pool; futures and the cache are managed from threads.
+    The Streamlit server is multi-threaded, so workers are started with
+    "spawn" rather than forked, and the pool is shut down at exit. Create
+    one renderer per process (``main.get_preview_renderer``).
+
+    Args:
+        max_workers: Worker processes used for rendering
+    """
+
+    def __init__(self, max_workers=2):
+        self.pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+        self.futures = OrderedDict()
+        self.lock = threading.Lock()
+        atexit.register(self.shutdown)
+
+    def shutdown(self):
+        """Stop the worker processes, dropping renders not yet started"""
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _key(pdf_path, max_pages, dpi):
+        # The mtime makes a rewritten file render again
+        return (os.path.abspath(pdf_path), os.path.getmtime(pdf_path), max_pages, dpi)
+
+    def submit(self, pdf_path, max_pages=PREVIEW_PAGES, dpi=PREVIEW_DPI):
+        """Start rendering a file in the background (no-op if already queued)"""
+        if not os.path.exists(pdf_path):
+            return None
+        key = self._key(pdf_path, max_pages, dpi)
+        with self.lock:
+            future = self.futures.get(key)
+            if future is None:
+                future = self.pool.submit(render_preview_pages, pdf_path, max_pages, dpi)
+                self.futures[key] = future
+                while len(self.futures) > CACHE_ENTRIES:
+                    self.futures.popitem(last=False)
+            else:
+                self.futures.move_to_end(key)
+            return future
+
+    def result(self, pdf_path, max_pages=PREVIEW_PAGES, dpi=PREVIEW_DPI):
+        """
+        Finished preview for a file, without blocking
+
+        Returns:
+            dict or None: The rendered preview, or None while still rendering
+            (rendering is started if the file was never submitted)
+        """
+        future = self.submit(pdf_path, max_pages, dpi)
+        if future is None or not future.done():
+            return None
+        try:
+            return future.result()
+        except Exception as e:
+            logging.warning("Preview rendering failed for %s: %s", pdf_path, e)
+            return {"page_count": 0, "images": [], "error": str(e)}
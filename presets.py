@@ -0,0 +1,181 @@
+# presets.py
+import re
+import logging
+
+from custom import open_pdf_bytes, open_pdf_file, redact_pdf_bytes
+from resource_governor import ResourceGovernor
+from template_registry import get_registry
+
+# Label rules per module field. Each pattern matches a label at the start of a
+# line; the value is the rest of the line after a separator (or a capitalised
+# word/number), or the next non-empty line when the label stands alone.
+SEPARATOR = r"(?:\s*[:\-–]\s*|\s+(?=[A-Z0-9])|\s*$)"
+
+PRESETS = {
+    "bgv": {
+        "redact_numbers": False,
+        "redact_logos": True,
+        "fields": {
+            "candidate_name": [r"candidate(?:'s)?\s+name", r"name\s+of\s+(?:the\s+)?candidate", r"applicant\s+name", r"full\s+name"],
+            "case_reference": [r"case\s+(?:ref(?:erence)?|id|no\.?|number)", r"reference\s+(?:no\.?|number)", r"report\s+(?:id|no\.?|number)"],
+            "dob": [r"date\s+of\s+birth", r"d\.?o\.?b\.?", r"birth\s+date"],
+            "level": [r"level\s+of\s+(?:check|verification)", r"check\s+level", r"package"],
+            "address": [r"(?:current|permanent|residential)?\s*address"],
+            "civil": [r"civil\s+(?:proceedings|litigation|records?)"],
+            "criminal": [r"criminal\s+(?:proceedings|records?|check)"],
+            "court": [r"court\s+(?:record|records)\s*(?:verification|check)?"],
+            "employment": [r"(?:previous\s+)?employer(?:\s+name)?", r"employment\s+(?:verification|history)", r"company\s+name"],
+            "vendor": [r"vendor(?:\s+name)?", r"verified\s+by", r"(?:screening|verification)\s+agency"],
+        },
+    },
+    "offer": {
+        "redact_numbers": False,  # Enabled by the salary field
+        "redact_logos": False,
+        "fields": {
+            "name": [r"(?:candidate|employee)?\s*name", r"dear(?:\s+(?:mr|mrs|ms|miss|dr)\.?)?"],
+            "designation": [r"designation", r"(?:job\s+)?title", r"position", r"role"],
+            "salary": [r"(?:annual\s+)?ctc", r"(?:gross|basic|base|annual|monthly)\s+(?:salary|pay)", r"salary", r"compensation"],
+        },
+        "number_fields": {"salary"},
+    },
+}
+
+MIN_VALUE_LENGTH = 2
+MAX_VALUE_LENGTH = 120
+
+
+def _compile(module):
+    preset = PRESETS[module]
+    compiled = {}
+    for field, labels in preset["fields"].items():
+        # Only the label is case-insensitive; the capitalisation check in
+        # SEPARATOR keeps "Name of the company" from matching "name"
+        compiled[field] = [re.compile(r"^\s*(?i:" + label + r")(?![A-Za-z])" + SEPARATOR + r"(.*)$")
+                           for label in labels]
+    return compiled
+
+
+_COMPILED = {module: _compile(module) for module in PRESETS}
+
+
+def parse_page_range(spec, page_count):
+    """
+    Parse a page range such as "1,3,5-12" into 0-based page numbers
+
+    Returns:
+        set or None: Page numbers, or None for all pages
+    """
+    if not spec or not spec.strip():
+        return None
+    pages = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            first, last = int(start), int(end)
+        else:
+            first = last = int(part)
+        if first < 1 or last < first:
+            raise ValueError(f"Invalid page range: {part}")
+        pages.update(range(first - 1, min(last, page_count)))
+    return pages
+
+
+def extract_field_values(doc, module, fields, pages=None):
+    """
+    Find the values of the selected preset fields in a document
+
+    Args:
+        doc: fitz.Document
+        module: "bgv" or "offer"
+        fields: Selected field names
+        pages: Optional set of 0-based page numbers to read
+
+    Returns:
+        list: Distinct values to redact as terms
+    """
+    rules = [(field, pattern) for field in fields
+             for pattern in _COMPILED[module].get(field, [])]
+    values = []
+    seen = set()
+    for page_num, page in enumerate(doc):
+        if pages is not None and page_num not in pages:
+            continue
+        lines = [line.strip() for line in page.get_text("text").splitlines()]
+        for idx, line in enumerate(lines):
+            if not line:
+                continue
+            for field, pattern in rules:
+                match = pattern.match(line)
+                if not match:
+                    continue
+                value = match.group(1).strip().rstrip(",;")
+                if not value:
+                    # Label on its own line - the value follows
+                    value = next((l for l in lines[idx + 1:idx + 3] if l), "")
+                if MIN_VALUE_LENGTH <= len(value) <= MAX_VALUE_LENGTH and value.lower() not in seen:
+                    seen.add(value.lower())
+                    values.append(value)
+                break
+    return values
+
+
+def preset_options(module, fields):
+    """Number and logo rules for a module and its selected fields"""
+    preset = PRESETS[module]
+    redact_numbers = preset["redact_numbers"] or bool(set(fields) & preset.get("number_fields", set()))
+    return {"redact_numbers": redact_numbers, "redact_logos": preset["redact_logos"]}
+
+
+def redact_with_preset(pdf_bytes, module, fields, page_range=None, registry_path=None, limits=None, doc=None):
+    """
+    Redact one document with a module preset (runs in a worker process)
+
+    Field values are extracted with the preset's label rules and redacted as
+    terms by ``redact_pdf_bytes``, together with the preset's number and logo
+    rules.
+
+    Args:
+        pdf_bytes: Raw PDF bytes, or None with ``doc``
+        module: "bgv" or "offer"
+        fields: Selected field names
+        page_range: Optional page range string ("1,3,5-12")
+        registry_path: Optional template registry path (SQLite)
+        limits: Optional ResourceGovernor limits; the governor is created
+            here so its clock and memory baseline belong to this worker
+        doc: Optional document already opened (e.g. by ``open_pdf_file``)
+
+    Returns:
+        bytes: Redacted PDF
+    """
+    governor = ResourceGovernor(**limits) if limits is not None else None
+    # Parsed once: the same document is used for extraction and redaction
+    if doc is None:
+        doc = open_pdf_bytes(pdf_bytes)
+    try:
+        if governor is not None:
+            governor.check_pages(doc.page_count)
+        pages = parse_page_range(page_range, doc.page_count)
+        terms = extract_field_values(doc, module, fields, pages)
+    except Exception:
+        doc.close()
+        raise
+
+    logging.info("%s preset: %d value(s) found for fields %s", module, len(terms), sorted(fields))
+    options = preset_options(module, fields)
+    return redact_pdf_bytes(
+        pdf_bytes, terms,
+        redact_logos=options["redact_logos"],
+        redact_numbers=options["redact_numbers"],
+        pages=pages,
+        template_registry=get_registry(registry_path) if registry_path else None,
+        doc=doc,
+        governor=governor
+    )
+
+
+def redact_preset_file(pdf_path, module, fields, page_range=None, registry_path=None, limits=None):
+    """``redact_with_preset`` for a PDF on disk, opened by path instead of read into memory"""
+    return redact_with_preset(None, module, fields, page_range, registry_path, limits, doc=open_pdf_file(pdf_path))
@@ -0,0 +1,220 @@
+# raster_logo_detection.py
+"""
+Raster logo detection for scanned pages.
+
+``LogoDetector`` only sees image placements and vector drawings, so a logo
+that is part of a full-page scan is invisible to it. This detector renders
+the header band of a page at low DPI, marks ink pixels against the
+estimated paper colour, groups them into blobs on a tile grid and keeps
+blobs whose size, density and column profile look like a logo rather than
+a line of text.
+
+PyMuPDF is not thread-safe, so bands are rendered in the calling thread and
+only the NumPy analysis (which releases the GIL, see
+``visual_diff.tile_regions``) runs in the thread pool, overlapping with the
+rendering of the next pages. At most two pages per worker are rendered
+ahead of the analysis, so memory does not grow with the page count.
+
+Benchmark:
+    python raster_logo_detection.py scanned.pdf [workers ...]
+"""
+import os
+import sys
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz
+import numpy as np
+
+from visual_diff import tile_grid, tile_regions
+
+RASTER_DPI = 50
+HEADER_RATIO = 0.15       # Top band searched for logos
+INK_THRESHOLD = 48        # Grey-level distance from the paper colour that counts as ink
+TILE_SIZE = 3             # Pixels per tile; nearby strokes within a tile join one blob
+SCAN_COVERAGE = 0.8       # Image area fraction that makes a page a scan
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+# Blob rules (sizes in points)
+LOGO_MIN_DIM = 15
+LOGO_MAX_HEIGHT = 200
+LOGO_MAX_WIDTH_RATIO = 0.40
+LOGO_MIN_DENSITY = 0.20
+TEXT_GAP_RATIO = 0.25     # Text lines have many empty columns between glyphs and words
+TEXT_LINE_HEIGHT = 24     # A wide blob lower than this is a line of text
+TEXT_LINE_ASPECT = 3.0
+
+
+def is_scanned_page(page, coverage=SCAN_COVERAGE):
+    """True when one image covers most of the page"""
+    page_area = abs(page.rect)
+    if not page_area:
+        return False
+    return any(abs(fitz.Rect(info["bbox"]) & page.rect) >= coverage * page_area
+               for info in page.get_image_info())
+
+
+def render_band(page, top_ratio, bottom_ratio, dpi=RASTER_DPI):
+    """
+    Render a horizontal band of a page to a greyscale array
+
+    Returns:
+        tuple: (uint8 array, band rect in page coordinates)
+    """
+    rect = page.rect
+    clip = fitz.Rect(rect.x0, rect.y0 + rect.height * top_ratio, rect.x1, rect.y0 + rect.height * bottom_ratio)
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False, clip=clip)
+    samples = np.frombuffer(pix.samples, dtype=np.uint8)
+    return samples.reshape(pix.height, pix.stride)[:, :pix.width].copy(), clip
+
+
+def ink_mask(gray, threshold=INK_THRESHOLD):
+    """Pixels that differ from the paper colour (the band's median grey)"""
+    background = np.median(gray)
+    return np.abs(gray.astype(np.int16) - int(background)) > threshold
+
+
+def find_blobs(gray, band, page_width, dpi=RASTER_DPI, tile=TILE_SIZE):
+    """
+    Logo candidate boxes in one rendered band (runs in a worker thread)
+
+    Args:
+        gray: Greyscale band from ``render_band``
+        band: The band's rect in page coordinates
+        page_width: Page width in points
+
+    Returns:
+        list: dicts with rect (fitz.Rect) and density
+    """
+    mask = ink_mask(gray)
+    if not mask.any():
+        return []
+    scale = 72.0 / dpi
+    candidates = []
+    for r0, c0, r1, c1 in tile_regions(tile_grid(mask, tile)):
+        y0, x0 = r0 * tile, c0 * tile
+        y1, x1 = min(r1 * tile, mask.shape[0]), min(c1 * tile, mask.shape[1])
+        blob = mask[y0:y1, x0:x1]
+        density = float(blob.mean())
+        width, height = (x1 - x0) * scale, (y1 - y0) * scale
+        # Projection profile: share of columns without ink inside the blob
+        gap_ratio = float((~blob.any(axis=0)).mean())
+        text_line = height < TEXT_LINE_HEIGHT and width > TEXT_LINE_ASPECT * height
+
+        if (LOGO_MIN_DIM <= width <= page_width * LOGO_MAX_WIDTH_RATIO and
+                LOGO_MIN_DIM <= height <= LOGO_MAX_HEIGHT and
+                density >= LOGO_MIN_DENSITY and gap_ratio < TEXT_GAP_RATIO and not text_line):
+            rect = fitz.Rect(band.x0 + x0 * scale, band.y0 + y0 * scale,
+                             band.x0 + x1 * scale, band.y0 + y1 * scale)
+            candidates.append({"rect": rect, "density": round(density, 3)})
+    return candidates
+
+
+class RasterLogoDetector:
+    """
+    Finds logo candidates in the pixels of scanned pages
+
+    Args:
+        workers: Threads for the NumPy analysis
+        dpi: Render resolution
+        header_ratio: Height fraction of the logo band
+        only_scanned: Skip pages without a page-sized image
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, dpi=RASTER_DPI, header_ratio=HEADER_RATIO, only_scanned=True):
+        self.workers = workers
+        self.dpi = dpi
+        self.header_ratio = header_ratio
+        self.only_scanned = only_scanned
+
+    def render_page(self, page):
+        """Render a page's header band (caller thread - PyMuPDF is not thread-safe)"""
+        return render_band(page, 0, self.header_ratio, self.dpi)
+
+    def page_candidates(self, page):
+        """Candidates for a single page, analysed in the calling thread"""
+        if self.only_scanned and not is_scanned_page(page):
+            return []
+        gray, band = self.render_page(page)
+        return find_blobs(gray, band, page.rect.width, self.dpi)
+
+    def logo_rects(self, page):
+        """Logo boxes for a single page (e.g. for a preview or a per-page pipeline)"""
+        return [c["rect"] for c in self.page_candidates(page)]
+
+    def detect(self, doc, pages=None, governor=None):
+        """
+        Candidate boxes for each page
+
+        Args:
+            doc: fitz.Document
+            pages: Optional iterable of 0-based page numbers (default: all)
+            governor: Optional ResourceGovernor, checked before each page is
+                rendered; detection stops once it reports degraded mode
+
+        Returns:
+            dict: page number -> list of candidates (rect, density);
+            pages not reached after a stop are missing
+
+        Raises:
+            BudgetExceeded: If the governor's time or memory budget is hit
+        """
+        page_nums = range(doc.page_count) if pages is None else sorted(pages)
+        results = {}
+        scanned = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            in_flight = deque()
+            for page_num in page_nums:
+                if governor is not None:
+                    governor.check(f"raster page {page_num + 1}")
+                    if governor.degraded:
+                        logging.warning("Skipping raster logo detection from page %d", page_num + 1)
+                        break
+                page = doc[page_num]
+                if self.only_scanned and not is_scanned_page(page):
+                    results[page_num] = []
+                    continue
+                if len(in_flight) >= 2 * self.workers:
+                    done_num, future = in_flight.popleft()
+                    results[done_num] = future.result()
+                gray, band = self.render_page(page)
+                in_flight.append((page_num, pool.submit(find_blobs, gray, band, page.rect.width, self.dpi)))
+                scanned += 1
+            for page_num, future in in_flight:
+                results[page_num] = future.result()
+        found = sum(len(boxes) for boxes in results.values())
+        if found:
+            logging.info("Raster detection: %d candidate(s) on %d scanned page(s)", found, scanned)
+        return results
+
+
+def benchmark(pdf_path, worker_counts=(1, 2, 4)):
+    """
+    Pages per second of ``RasterLogoDetector.detect`` for each worker count
+
+    Returns:
+        dict: workers -> pages/second
+    """
+    rates = {}
+    doc = fitz.open(pdf_path)
+    try:
+        for workers in worker_counts:
+            detector = RasterLogoDetector(workers=workers, only_scanned=False)
+            start = time.perf_counter()
+            results = detector.detect(doc)
+            elapsed = time.perf_counter() - start
+            rates[workers] = doc.page_count / elapsed if elapsed else float("inf")
+            print(f"{workers} worker(s): {rates[workers]:.1f} pages/s "
+                  f"({sum(len(b) for b in results.values())} candidates)")
+    finally:
+        doc.close()
+    return rates
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__.strip().splitlines()[-1].strip())
+        sys.exit(2)
+    benchmark(sys.argv[1], tuple(int(n) for n in sys.argv[2:]) or (1, 2, 4))
@@ -0,0 +1,114 @@
+# redaction_records.py
+from array import array
+
+import fitz
+
+# Record kinds
+TERM = 0
+NUMBER = 1
+LOGO = 2
+KIND_NAMES = ("term", "number", "logo")
+
+
+class RedactionRecord:
+    """One redaction: rect, kind, fill colour and optional replacement text"""
+
+    __slots__ = ("rect", "kind", "fill", "text")
+
+    def __init__(self, rect, kind, fill=(0, 0, 0), text=None):
+        self.rect = rect
+        self.kind = kind
+        self.fill = fill
+        self.text = text
+
+    def __repr__(self):
+        return f"RedactionRecord({self.rect!r}, {KIND_NAMES[self.kind]}, fill={self.fill}, text={self.text!r})"
+
+
+class RedactionBatch:
+    """
+    The redactions found on one page, stored as parallel arrays
+
+    Detectors call ``add`` with plain coordinates, so a hit costs four
+    floats and two bytes instead of a ``fitz.Rect`` plus a dict or tuple.
+    Fill colours are kept in a small palette and replacement texts only for
+    the entries that have one. ``fitz.Rect`` objects are created when the
+    batch is turned into annotations (or explicitly through ``rects``).
+    """
+
+    __slots__ = ("coords", "kinds", "fill_ids", "palette", "texts")
+
+    def __init__(self):
+        self.coords = array("d")      # x0, y0, x1, y1 per entry
+        self.kinds = array("B")
+        self.fill_ids = array("B")
+        self.palette = []             # Distinct fill colours
+        self.texts = {}               # Entry index -> replacement text
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def _fill_id(self, fill):
+        fill = tuple(fill)
+        try:
+            return self.palette.index(fill)
+        except ValueError:
+            self.palette.append(fill)
+            return len(self.palette) - 1
+
+    def add(self, x0, y0, x1, y1, kind, fill=(0, 0, 0), text=None):
+        """Add one redaction given by its coordinates"""
+        if text is not None:
+            self.texts[len(self.kinds)] = text
+        self.coords.extend((x0, y0, x1, y1))
+        self.kinds.append(kind)
+        self.fill_ids.append(self._fill_id(fill))
+
+    def add_rect(self, rect, kind, fill=(0, 0, 0), text=None):
+        self.add(rect.x0, rect.y0, rect.x1, rect.y1, kind, fill, text)
+
+    def extend(self, rects, kind, fill=(0, 0, 0)):
+        """Add several rects of one kind and fill"""
+        fill_id = self._fill_id(fill)
+        for rect in rects:
+            self.coords.extend((rect.x0, rect.y0, rect.x1, rect.y1))
+            self.kinds.append(kind)
+            self.fill_ids.append(fill_id)
+
+    def rect(self, index):
+        return fitz.Rect(*self.coords[4 * index:4 * index + 4])
+
+    def fill(self, index):
+        return self.palette[self.fill_ids[index]]
+
+    def indexes(self, kind=None):
+        if kind is None:
+            return range(len(self.kinds))
+        return [i for i, k in enumerate(self.kinds) if k == kind]
+
+    def count(self, kind):
+        return self.kinds.count(kind)
+
+    def rects(self, kind=None):
+        """``fitz.Rect`` for every entry (of one kind)"""
+        return [self.rect(i) for i in self.indexes(kind)]
+
+    def __iter__(self):
+        for i in range(len(self.kinds)):
+            yield RedactionRecord(self.rect(i), self.kinds[i], self.fill(i), self.texts.get(i))
+
+    def add_annots(self, page, indexes=None, **annot_options):
+        """
+        Add redaction annotations for entries of the batch
+
+        Args:
+            page: fitz.Page
+            indexes: Entries to add (default: all)
+            annot_options: Extra ``add_redact_annot`` arguments (fontsize,
+                text_color, align, ...); an entry's own text takes
+                precedence over a ``text`` given here
+        """
+        default_text = annot_options.pop("text", None)
+        for i in (range(len(self.kinds)) if indexes is None else indexes):
+            page.add_redact_annot(self.rect(i), text=self.texts.get(i, default_text),
+                                  fill=self.fill(i), **annot_options)
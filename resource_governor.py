@@ -0,0 +1,116 @@
+# resource_governor.py
+import os
+import time
+import logging
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_MAX_PAGES = int(os.environ.get("MAX_PDF_PAGES", "500"))
+DEFAULT_MAX_SECONDS = float(os.environ.get("MAX_PDF_SECONDS", "60"))
+DEFAULT_MAX_MEMORY_MB = float(os.environ.get("MAX_PDF_MEMORY_MB", "1024"))
+DEGRADE_AT = 0.5  # Fraction of a budget after which cheaper modes are used
+
+
+class BudgetExceeded(Exception):
+    """A document went over one of its resource budgets"""
+
+    def __init__(self, resource_name, limit, used):
+        super().__init__(resource_name, limit, used)
+        self.resource_name = resource_name
+        self.limit = limit
+        self.used = used
+
+    def __str__(self):
+        return f"Document exceeds the {self.resource_name} limit ({self.used:g} > {self.limit:g})"
+
+
+def current_rss_mb():
+    """Resident memory of this process in MB, or None if it cannot be read"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if resource is not None:
+        # Peak rather than current usage, in KB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return None
+
+
+class ResourceGovernor:
+    """
+    Per-document budgets for pages, wall-clock time and memory
+
+    The processing loop calls ``check()`` between stages (e.g. between
+    pages). Work inside a single stage is not interrupted, so budgets bound
+    a document to roughly its limit plus one page of work.
+
+    Once half of the time or memory budget is used, ``degraded`` turns True
+    and callers switch to cheaper modes (skip drawings-based logo detection,
+    sample pages for analysis). Going over a budget raises ``BudgetExceeded``,
+    which the Flask app turns into a 422 response.
+
+    Memory is measured as growth of the process RSS since the governor was
+    created, so it is only meaningful for one document at a time per process.
+
+    Args:
+        max_pages: Maximum page count
+        max_seconds: Wall-clock budget
+        max_memory_mb: Memory growth budget
+    """
+
+    def __init__(self, max_pages=DEFAULT_MAX_PAGES, max_seconds=DEFAULT_MAX_SECONDS, max_memory_mb=DEFAULT_MAX_MEMORY_MB):
+        self.max_pages = max_pages
+        self.max_seconds = max_seconds
+        self.max_memory_mb = max_memory_mb
+        self.start = time.perf_counter()
+        self.baseline_mb = current_rss_mb()
+        self._degraded = False
+
+    def limits(self):
+        """Constructor arguments, e.g. to rebuild the governor in a worker process"""
+        return {"max_pages": self.max_pages, "max_seconds": self.max_seconds, "max_memory_mb": self.max_memory_mb}
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def memory_used_mb(self):
+        current = current_rss_mb()
+        if current is None or self.baseline_mb is None:
+            return 0.0
+        return max(0.0, current - self.baseline_mb)
+
+    def check_pages(self, page_count):
+        """Reject documents over the page budget before any page is processed"""
+        if self.max_pages and page_count > self.max_pages:
+            raise BudgetExceeded("page count", self.max_pages, page_count)
+
+    def check(self, stage=""):
+        """
+        Enforce the time and memory budgets
+
+        Raises:
+            BudgetExceeded: If a budget is used up
+        """
+        elapsed = self.elapsed()
+        if self.max_seconds and elapsed > self.max_seconds:
+            raise BudgetExceeded("time (seconds)", self.max_seconds, round(elapsed, 1))
+        memory = self.memory_used_mb()
+        if self.max_memory_mb and memory > self.max_memory_mb:
+            raise BudgetExceeded("memory (MB)", self.max_memory_mb, round(memory))
+
+        if not self._degraded and (
+                (self.max_seconds and elapsed > self.max_seconds * DEGRADE_AT) or
+                (self.max_memory_mb and memory > self.max_memory_mb * DEGRADE_AT)):
+            self._degraded = True
+            logging.warning("Resource budget half used at %s (%.1fs, %.0f MB) - switching to cheaper modes",
+                            stage or "check", elapsed, memory)
+
+    @property
+    def degraded(self):
+        """True once cheaper processing modes should be used"""
+        return self._degraded
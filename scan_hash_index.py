@@ -0,0 +1,341 @@
+# scan_hash_index.py
+import os
+import json
+import time
+import shutil
+import sqlite3
+import logging
+import tempfile
+import fitz
+import numpy as np
+
+from visual_diff import render_gray, diff_pages, changed_mask, DIFF_DPI, DIFF_THRESHOLD
+
+HASH_SIZE = 16          # 16 x 16 difference hash = 256 bits
+HASH_RENDER_WIDTH = 128 # Pixels across the page before downsampling
+MAX_DISTANCE = 12       # Hamming distance (of 256 bits) that still counts as a match
+LABEL_INK_RATIO = 0.02  # Share of a region's changed pixels off the fill colour that means a label was drawn
+TERM_PADDING = 2        # Points a term hit may stick out of its stored region
+
+
+def page_dhash(page, hash_size=HASH_SIZE):
+    """
+    Perceptual difference hash of a page image
+
+    The page is rendered in greyscale at a tiny size, area-averaged down to
+    ``hash_size`` x ``hash_size + 1`` cells, and each bit records whether a
+    cell is brighter than its left neighbour. Rescans of the same form end up
+    a few bits apart; different forms are far apart.
+
+    Returns:
+        numpy.ndarray: Packed hash bits (uint8, ``hash_size ** 2 / 8`` bytes)
+    """
+    # get_pixmap takes an integer dpi; the render only needs to be roughly HASH_RENDER_WIDTH wide
+    dpi = max(1, round(72.0 * HASH_RENDER_WIDTH / page.rect.width))
+    gray = render_gray(page, dpi=dpi).astype(np.float32)
+    height, width = gray.shape
+    row_edges = np.linspace(0, height, hash_size + 1).astype(int)[:-1]
+    col_edges = np.linspace(0, width, hash_size + 2).astype(int)[:-1]
+    cells = np.add.reduceat(np.add.reduceat(gray, row_edges, axis=0), col_edges, axis=1)
+    counts = np.outer(np.diff(np.append(row_edges, height)), np.diff(np.append(col_edges, width)))
+    cells /= counts
+    return np.packbits(cells[:, 1:] > cells[:, :-1])
+
+
+class ScanHashIndex:
+    """
+    Perceptual-hash index of processed scanned pages
+
+    Maps the hash of a scanned page image (plus page size and the options
+    hash of the job) to the regions the scanned pipeline redacted on it.
+    Only geometry is stored: each region's rectangle, its fill colour and
+    whether the pipeline drew a label in it. No pixels of a processed
+    document are kept, so nothing of one document can appear in another.
+
+    A new page within ``max_distance`` bits of a known page is only reused
+    when every hit of the job's terms in its text layer lies inside a stored
+    region; the regions are then redacted again on the new page (fill and
+    "XXXX" label) and the scanned pipeline is skipped. Pages that fail the
+    check, or have no text layer to check, go through the pipeline.
+
+    Regions are learned with the visual diff engine from the pipeline's own
+    input and output, so the index never needs to know how the pipeline
+    decided what to redact. Lookups compare a page against every entry for
+    the same options at once (XOR + popcount over a NumPy array).
+
+    Args:
+        db_path: SQLite file (created if missing)
+        max_distance: Hamming distance that still counts as a match
+    """
+
+    def __init__(self, db_path, max_distance=MAX_DISTANCE):
+        self.db_path = db_path
+        self.max_distance = max_distance
+        self._cache = {}  # options_hash -> (hash matrix, entries)
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS scan_pages (
+                    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+                    options_hash TEXT NOT NULL,
+                    page_hash    BLOB NOT NULL,
+                    page_width   INTEGER NOT NULL,
+                    page_height  INTEGER NOT NULL,
+                    boxes        TEXT NOT NULL,
+                    hits         INTEGER NOT NULL DEFAULT 0,
+                    created_at   REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS scan_pages_options ON scan_pages (options_hash)")
+            # Earlier entries held PNG crops of processed pages - never keep those
+            conn.execute("DELETE FROM scan_pages WHERE boxes LIKE '%\"png\"%'")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _entries(self, options_hash):
+        cached = self._cache.get(options_hash)
+        if cached is None:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT id, page_hash, page_width, page_height, boxes FROM scan_pages WHERE options_hash=?",
+                    (options_hash,)
+                ).fetchall()
+            # Entries from before fills were stored hold bare boxes; skip them
+            rows = [row for row in rows if _has_fills(row[4])]
+            hashes = (np.array([np.frombuffer(row[1], dtype=np.uint8) for row in rows])
+                      if rows else np.zeros((0, HASH_SIZE * HASH_SIZE // 8), dtype=np.uint8))
+            cached = (hashes, rows)
+            self._cache[options_hash] = cached
+        return cached
+
+    @staticmethod
+    def _page_size(page):
+        return round(page.rect.width), round(page.rect.height)
+
+    def lookup(self, page, options_hash, terms=(), page_hash=None):
+        """
+        Stored redaction regions for a matching known page
+
+        Args:
+            page: Scanned page to look up
+            options_hash: Hash of the job options
+            terms: The job's terms, re-checked on the page (``terms_covered``)
+            page_hash: Precomputed ``page_dhash`` of the page
+
+        Returns:
+            list or None: Region dicts (rect, fill, label), or None if no
+            known page matches and passes the term check
+        """
+        hashes, rows = self._entries(options_hash)
+        if not rows:
+            return None
+        page_hash = page_dhash(page) if page_hash is None else page_hash
+
+        distances = np.unpackbits(hashes ^ page_hash, axis=1).sum(axis=1)
+        width, height = self._page_size(page)
+        for idx in np.argsort(distances):
+            if distances[idx] > self.max_distance:
+                break
+            entry_id, _, entry_width, entry_height, boxes = rows[idx]
+            if (entry_width, entry_height) != (width, height):
+                continue
+            regions = [dict(region, rect=fitz.Rect(region["rect"])) for region in json.loads(boxes)]
+            if not terms_covered(page, [region["rect"] for region in regions], terms):
+                logging.info("Scan index: page %d matched a known page but its terms are not covered",
+                             page.number + 1)
+                return None
+            with self._connect() as conn:
+                conn.execute("UPDATE scan_pages SET hits=hits+1 WHERE id=?", (entry_id,))
+            return regions
+        return None
+
+    def add(self, page, options_hash, regions, page_hash=None):
+        """Record the regions redacted on a processed page (dicts from ``page_regions``)"""
+        page_hash = page_dhash(page) if page_hash is None else page_hash
+        width, height = self._page_size(page)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO scan_pages (options_hash, page_hash, page_width, page_height, boxes, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (options_hash, page_hash.tobytes(), width, height,
+                 json.dumps([dict(region, rect=[round(v, 2) for v in region["rect"]]) for region in regions]),
+                 time.time())
+            )
+        self._cache.pop(options_hash, None)
+
+
+def _has_fills(boxes):
+    regions = json.loads(boxes)
+    return all(isinstance(region, dict) and "fill" in region for region in regions)
+
+
+def terms_covered(page, rects, terms):
+    """
+    Whether every hit of every term on a page lies inside one of ``rects``
+
+    A page without a text layer cannot be checked, so it only passes when
+    there are no terms to look for.
+    """
+    terms = [str(term).strip() for term in terms if str(term).strip()]
+    if not terms:
+        return True
+    if not page.get_text("text").strip():
+        return False
+    padded = [fitz.Rect(rect) + (-TERM_PADDING, -TERM_PADDING, TERM_PADDING, TERM_PADDING) for rect in rects]
+    return all(any(rect.contains(hit) for rect in padded)
+               for term in terms for hit in page.search_for(term))
+
+
+def render_rgb(page, dpi=DIFF_DPI):
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csRGB, alpha=False)
+    samples = np.frombuffer(pix.samples, dtype=np.uint8)
+    return samples.reshape(pix.height, pix.stride)[:, :pix.width * 3].reshape(pix.height, pix.width, 3)
+
+
+def page_regions(original_page, redacted_page, boxes, dpi=DIFF_DPI):
+    """
+    Geometry of the pipeline's redactions on one page
+
+    Each diff box is shrunk to the pixels that actually changed, and only
+    those pixels of the output are summarised: their median colour is the
+    fill, and enough pixels off that colour mean a label was drawn.
+
+    Returns:
+        list: dicts with rect ([x0, y0, x1, y1]), fill (RGB 0-1) and label
+    """
+    mask = changed_mask(render_gray(original_page, dpi), render_gray(redacted_page, dpi))
+    output = render_rgb(redacted_page, dpi)
+    height = min(mask.shape[0], output.shape[0])
+    width = min(mask.shape[1], output.shape[1])
+    scale = dpi / 72.0
+    regions = []
+    for box in boxes:
+        r0, c0 = max(0, int(box.y0 * scale)), max(0, int(box.x0 * scale))
+        r1, c1 = min(height, int(np.ceil(box.y1 * scale))), min(width, int(np.ceil(box.x1 * scale)))
+        rows, cols = np.nonzero(mask[r0:r1, c0:c1])
+        if not len(rows):
+            continue
+        pixels = output[r0:r1, c0:c1][rows, cols].astype(np.int16)
+        fill = np.median(pixels, axis=0)
+        off_fill = (np.abs(pixels - fill).max(axis=1) > DIFF_THRESHOLD).mean()
+        regions.append({
+            "rect": [(c0 + cols.min()) / scale, (r0 + rows.min()) / scale,
+                     (c0 + cols.max() + 1) / scale, (r0 + rows.max() + 1) / scale],
+            "fill": [round(float(v) / 255, 3) for v in fill],
+            "label": bool(off_fill > LABEL_INK_RATIO)
+        })
+    return regions
+
+
+def apply_regions(page, regions):
+    """
+    Redact stored regions on a scanned page
+
+    Everything under each region is removed (image pixels included) and
+    filled with the region's colour, with an "XXXX" label where the pipeline
+    drew one.
+    """
+    for region in regions:
+        fill = tuple(region["fill"])
+        dark = sum(fill) / 3 < 0.5
+        page.add_redact_annot(region["rect"], text="XXXX" if region["label"] else None, fontsize=8,
+                              fill=fill, text_color=(1, 1, 1) if dark else (0, 0, 0),
+                              align=fitz.TEXT_ALIGN_CENTER)
+    if regions:
+        page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_PIXELS)
+
+
+def process_with_scan_index(pdf_path, output_path, options_hash, run_pipeline, index, terms=()):
+    """
+    Process a scanned PDF, reusing stored regions for known pages
+
+    Pages that match the index (and pass the term check) are redacted from
+    their stored regions. The
+    remaining pages are extracted into a temporary PDF and sent through
+    ``run_pipeline`` (the regular scanned pipeline), then the regions it
+    produced are learned for next time.
+
+    Args:
+        pdf_path: Scanned input PDF
+        output_path: Where the redacted PDF is written
+        options_hash: Hash of the job options (terms and flags)
+        run_pipeline: Callable (input_path, output_path) -> log list
+        index: ScanHashIndex
+        terms: The job's terms, re-checked on every matched page
+
+    Returns:
+        list: Log lines
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        hashes = [page_dhash(page) for page in doc]
+        known = {}
+        for page_num, page in enumerate(doc):
+            regions = index.lookup(page, options_hash, terms, page_hash=hashes[page_num])
+            if regions is not None:
+                known[page_num] = regions
+        unknown = [page_num for page_num in range(doc.page_count) if page_num not in known]
+
+        if not known:
+            log_data = run_pipeline(pdf_path, output_path)
+            if log_data and "FINISHED FAILED" not in log_data[-1]:
+                _learn(index, pdf_path, output_path, options_hash, hashes)
+            return log_data
+
+        log_data = [f"Scan index: {len(known)} of {doc.page_count} page(s) matched known scanned pages"]
+        work_dir = tempfile.mkdtemp(prefix="scan_index_")
+        try:
+            processed = None
+            if unknown:
+                # Run the expensive pipeline on the unknown pages only
+                part_in = os.path.join(work_dir, "unknown.pdf")
+                part_out = os.path.join(work_dir, "unknown_masked.pdf")
+                part = fitz.open()
+                for page_num in unknown:
+                    part.insert_pdf(doc, from_page=page_num, to_page=page_num)
+                part.save(part_in)
+                part.close()
+
+                part_log = run_pipeline(part_in, part_out)
+                log_data.extend(part_log or [])
+                if not part_log or "FINISHED FAILED" in part_log[-1]:
+                    return log_data
+                _learn(index, part_in, part_out, options_hash, [hashes[page_num] for page_num in unknown])
+                processed = fitz.open(part_out)
+
+            for page_num, regions in known.items():
+                apply_regions(doc[page_num], regions)
+
+            # Swap in the pipeline's pages (back to front keeps indices valid)
+            for part_num in reversed(range(len(unknown))):
+                page_num = unknown[part_num]
+                doc.delete_page(page_num)
+                doc.insert_pdf(processed, from_page=part_num, to_page=part_num, start_at=page_num)
+            if processed is not None:
+                processed.close()
+
+            doc.save(output_path, garbage=4, deflate=True)
+            log_data.append(f"--- FINISHED OK: '{os.path.basename(pdf_path)}' ---")
+            return log_data
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    finally:
+        doc.close()
+
+
+def _learn(index, input_path, output_path, options_hash, hashes):
+    """Store the geometry of the regions the pipeline changed on each page"""
+    original = fitz.open(input_path)
+    redacted = fitz.open(output_path)
+    try:
+        for page_num in range(min(original.page_count, redacted.page_count)):
+            change = diff_pages(original[page_num], redacted[page_num], overlay=False)
+            regions = page_regions(original[page_num], redacted[page_num], change["boxes"]) if change else []
+            index.add(original[page_num], options_hash, regions, page_hash=hashes[page_num])
+    except Exception as e:
+        logging.warning("Scan index learning failed: %s", e)
+    finally:
+        original.close()
+        redacted.close()
@@ -0,0 +1,127 @@
+# startup_benchmark.py
+"""
+Startup benchmark for the Streamlit app.
+
+Runs a fresh interpreter with ``-X importtime`` for each target module and
+reports the wall-clock time plus the slowest imports (cumulative time), so
+cold-start regressions show up before they reach the autoscaled containers.
+
+Usage:
+    python startup_benchmark.py                    # benchmark main.py
+    python startup_benchmark.py main pdf_processor --top 15
+    DATA_SHIELD_FAST_START=0 python startup_benchmark.py main
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_importtime(stderr_text):
+    """
+    Parse ``-X importtime`` output
+
+    Args:
+        stderr_text: stderr captured from ``python -X importtime``
+
+    Returns:
+        list: (module, self_us, cumulative_us) tuples in import order
+    """
+    entries = []
+    for line in stderr_text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us = int(parts[0].strip())
+            cumulative_us = int(parts[1].strip())
+        except ValueError:
+            continue  # Header line
+        entries.append((parts[2][1:].rstrip(), self_us, cumulative_us))  # Keep nesting indent
+    return entries
+
+
+def measure_import(module_name, runs=3):
+    """
+    Import a module in fresh interpreters and collect timings
+
+    Args:
+        module_name: Module to import (e.g. "main")
+        runs: Number of cold interpreters to start; the fastest run is kept
+
+    Returns:
+        dict: wall-clock seconds, import breakdown and return code
+    """
+    best = None
+    for _ in range(max(1, runs)):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+            cwd=BASE_DIR,
+            capture_output=True,
+            text=True,
+        )
+        wall = time.perf_counter() - start
+        if best is None or wall < best["wall_seconds"]:
+            best = {
+                "module": module_name,
+                "wall_seconds": wall,
+                "imports": parse_importtime(proc.stderr),
+                "returncode": proc.returncode,
+                "error": proc.stderr.strip().splitlines()[-1] if proc.returncode else "",
+            }
+    return best
+
+
+def top_level_breakdown(imports):
+    """Aggregate cumulative time per top-level package (e.g. fitz, streamlit)"""
+    totals = {}
+    for name, _self_us, cumulative_us in imports:
+        # Nested imports are indented; only count outermost entries per package
+        if name != name.lstrip():
+            continue
+        package = name.split(".")[0]
+        totals[package] = totals.get(package, 0) + cumulative_us
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def print_report(result, top=10):
+    """Print a human-readable report for one measured module"""
+    print(f"=== import {result['module']} ===")
+    if result["returncode"]:
+        print(f"  FAILED: {result['error']}")
+    print(f"  wall clock: {result['wall_seconds'] * 1000:.1f} ms")
+
+    print("  top-level packages (cumulative):")
+    for package, cumulative_us in top_level_breakdown(result["imports"])[:top]:
+        print(f"    {cumulative_us / 1000:9.1f} ms  {package}")
+
+    print("  slowest modules (self):")
+    by_self = sorted(result["imports"], key=lambda entry: entry[1], reverse=True)
+    for name, self_us, _cumulative_us in by_self[:top]:
+        print(f"    {self_us / 1000:9.1f} ms  {name.strip()}")
+    print()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start import time")
+    parser.add_argument("modules", nargs="*", default=["main"], help="Modules to import")
+    parser.add_argument("--runs", type=int, default=3, help="Cold runs per module (best is reported)")
+    parser.add_argument("--top", type=int, default=10, help="Entries to show per section")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module_name in args.modules:
+        result = measure_import(module_name, runs=args.runs)
+        print_report(result, top=args.top)
+        failed = failed or bool(result["returncode"])
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+# streaming_upload.py
+import os
+import uuid
+import hashlib
+
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.sansio.multipart import MultipartDecoder, Field, File, Data, Epilogue, NeedData
+
+CHUNK_SIZE = 256 * 1024
+HEAD_BYTES = 1024
+MAX_FIELD_SIZE = 1024 * 1024  # Form fields (e.g. the terms JSON) are kept in memory
+
+
+class UploadPart:
+    """
+    One completed part of a multipart body
+
+    Fields carry their text in ``value``. Files are spooled to ``path`` and
+    carry their size, SHA-256 and the first bytes for the PDF signature
+    check.
+    """
+
+    def __init__(self, name, filename=None):
+        self.name = name
+        self.filename = filename
+        self.value = None
+        self.path = None
+        self.size = 0
+        self.sha256 = None
+        self.head = b""
+
+    @property
+    def is_file(self):
+        return self.filename is not None
+
+
+class MultipartSpooler:
+    """
+    Incremental multipart/form-data parser, fed one body chunk at a time
+
+    Shared by the blocking reader (``iter_multipart``) and the event-loop
+    reader (``aiter_multipart``). File parts are written to ``spool_dir`` as
+    they arrive and hashed on the way; only form fields are held in memory.
+
+    Args:
+        boundary: The multipart boundary from the Content-Type header
+        spool_dir: Directory for file parts (the caller removes the files)
+        max_file_size: Largest file part in bytes, or None for no limit
+    """
+
+    def __init__(self, boundary, spool_dir, max_file_size=None):
+        os.makedirs(spool_dir, exist_ok=True)
+        self.decoder = MultipartDecoder(boundary.encode("latin-1"), max_form_memory_size=MAX_FIELD_SIZE)
+        self.spool_dir = spool_dir
+        self.max_file_size = max_file_size
+        self.finished = False
+        self.part = None
+        self.out = None
+        self.digest = None
+        self.buffer = []
+
+    def feed(self, chunk):
+        """
+        Parse the next body chunk (empty at the end of the body)
+
+        Returns:
+            list: UploadParts completed by this chunk, in body order
+
+        Raises:
+            RequestEntityTooLarge: A file part is over ``max_file_size`` or
+                a form field is over MAX_FIELD_SIZE
+        """
+        completed = []
+        self.decoder.receive_data(chunk or None)
+        event = self.decoder.next_event()
+        while not isinstance(event, NeedData):
+            if isinstance(event, File):
+                self.part = UploadPart(event.name, event.filename or "")
+                self.part.path = os.path.join(self.spool_dir, f"{uuid.uuid4().hex}.part")
+                self.out = open(self.part.path, "wb")
+                self.digest = hashlib.sha256()
+            elif isinstance(event, Field):
+                self.part = UploadPart(event.name)
+                self.buffer = []
+            elif isinstance(event, Data):
+                part = self.part
+                if part.is_file:
+                    part.size += len(event.data)
+                    if self.max_file_size is not None and part.size > self.max_file_size:
+                        # Rejected while it arrives - nothing past the limit is written
+                        raise RequestEntityTooLarge(
+                            f"File '{part.filename}' too large. Maximum size is "
+                            f"{self.max_file_size // (1024 * 1024)}MB.")
+                    self.out.write(event.data)
+                    self.digest.update(event.data)
+                    if len(part.head) < HEAD_BYTES:
+                        part.head += event.data[:HEAD_BYTES - len(part.head)]
+                else:
+                    self.buffer.append(event.data)
+
+                if not event.more_data:
+                    if part.is_file:
+                        self.out.close()
+                        self.out = None
+                        part.sha256 = self.digest.hexdigest()
+                    else:
+                        part.value = b"".join(self.buffer).decode("utf-8", "replace")
+                    completed.append(part)
+                    self.part = None
+            elif isinstance(event, Epilogue):
+                self.finished = True
+                break
+            event = self.decoder.next_event()
+        if not chunk:
+            self.finished = True
+        return completed
+
+    def close(self):
+        """Remove a file part the body ended (or the caller stopped) in the middle of"""
+        if self.out is not None:
+            self.out.close()
+            self.out = None
+            os.remove(self.part.path)
+
+
+def iter_multipart(stream, boundary, spool_dir, chunk_size=CHUNK_SIZE, max_file_size=None):
+    """
+    Parse a multipart/form-data body incrementally
+
+    Each part is yielded as soon as its last byte has been read, so callers
+    can start working on the first file while later files are still being
+    uploaded.
+
+    Args:
+        stream: File-like request body (e.g. ``request.stream``)
+        boundary: The multipart boundary from the Content-Type header
+        spool_dir: Directory for file parts (the caller removes the files)
+        chunk_size: Bytes read per iteration
+        max_file_size: Largest file part in bytes, or None for no limit
+
+    Yields:
+        UploadPart: Completed fields and files, in body order
+
+    Raises:
+        RequestEntityTooLarge: A part is over its size limit
+    """
+    spooler = MultipartSpooler(boundary, spool_dir, max_file_size)
+    try:
+        while not spooler.finished:
+            yield from spooler.feed(stream.read(chunk_size))
+    finally:
+        spooler.close()
+
+
+async def aiter_multipart(chunks, boundary, spool_dir, max_file_size=None):
+    """
+    Parse a multipart/form-data body from an async chunk iterator
+
+    Same as ``iter_multipart`` for ASGI servers, e.g. with Starlette's
+    ``request.stream()``. File writes are small and sequential, so they
+    stay on the event loop.
+
+    Yields:
+        UploadPart: Completed fields and files, in body order
+
+    Raises:
+        RequestEntityTooLarge: A part is over its size limit
+    """
+    spooler = MultipartSpooler(boundary, spool_dir, max_file_size)
+    try:
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            for part in spooler.feed(chunk):
+                yield part
+            if spooler.finished:
+                return
+        for part in spooler.feed(b""):
+            yield part
+    finally:
+        spooler.close()
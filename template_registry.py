@@ -0,0 +1,160 @@
+# template_registry.py
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import fitz
+
+MAX_TEMPLATES = 500   # Least recently used templates are dropped beyond this
+MAX_TERM_LISTS = 20   # Term lists remembered per template
+GRID = 2              # Points; line origins are rounded to this grid
+
+
+def layout_signature(doc):
+    """
+    Text-layout fingerprint of a document
+
+    Built from the page count, the size of every page and the rounded
+    origins of the text lines on the first page (the letterhead and field
+    labels). Letters generated from the same template share the fingerprint
+    even though names and amounts differ. Later pages are not read here;
+    their stored fields are checked when they are used.
+
+    Returns:
+        str: Hex digest
+    """
+    origins = {}
+    for word in doc[0].get_text("words"):
+        # Words come in reading order; the first one of a line is its origin
+        origins.setdefault((word[5], word[6]), (round(word[0] / GRID), round(word[1] / GRID)))
+    sizes = [[round(page.rect.width), round(page.rect.height)] for page in doc.pages()]
+    return hashlib.sha1(json.dumps([doc.page_count, sizes, sorted(origins.values())]).encode("utf-8")).hexdigest()
+
+
+def terms_key(terms):
+    """Stable key for a term list (case-insensitive, order-independent)"""
+    return hashlib.sha1(json.dumps(sorted({t.strip().lower() for t in terms if t.strip()})).encode("utf-8")).hexdigest()
+
+
+class TemplateRegistry:
+    """
+    Registry of known document templates and their field rectangles
+
+    Each template (``layout_signature``) stores the rectangles the full
+    pipeline redacted, per page:
+
+    - ``numbers``: currency fields found by ``find_numbers_simple``.
+    - ``terms``: keyword hits, stored per term list (``terms_key``); a
+      different term list is searched normally.
+
+    Fields are the exact rectangles of the hits. Every page processed in a
+    learning run gets an entry, even an empty one. Stored fields are
+    candidates only: callers search again inside each (slightly padded)
+    field and search the whole page when a page has no entry or a field no
+    longer holds its value.
+
+    Backed by SQLite so the pool worker processes share one registry: every
+    call opens its own short-lived connection, and a learn updates only the
+    rows of its own template in one transaction, so workers never overwrite
+    each other's templates.
+
+    Args:
+        path: SQLite file (created if missing)
+        max_templates: Number of templates kept
+    """
+
+    def __init__(self, path, max_templates=MAX_TEMPLATES):
+        self.path = path
+        self.max_templates = max_templates
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS templates (
+                    signature TEXT PRIMARY KEY,
+                    numbers   TEXT,
+                    hits      INTEGER NOT NULL DEFAULT 0,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS template_terms (
+                    signature  TEXT NOT NULL,
+                    terms_key  TEXT NOT NULL,
+                    fields     TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (signature, terms_key)
+                )
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def match(self, signature, terms, redact_numbers):
+        """
+        Stored fields for a document with this signature
+
+        Returns:
+            dict or None: {"terms": {page: [Rect]} or None,
+            "numbers": {page: [Rect]} or None}, or None for unknown templates
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT numbers FROM templates WHERE signature=?", (signature,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE templates SET hits=hits+1, last_used=? WHERE signature=?", (time.time(), signature))
+            term_row = conn.execute("SELECT fields FROM template_terms WHERE signature=? AND terms_key=?",
+                                    (signature, terms_key(terms))).fetchone()
+
+        def rects(fields):
+            if fields is None:
+                return None
+            return {int(page): [fitz.Rect(r) for r in boxes] for page, boxes in json.loads(fields).items()}
+
+        return {"terms": rects(term_row[0] if term_row else None),
+                "numbers": rects(row[0]) if redact_numbers else None}
+
+    def learn(self, signature, terms, found_by_page, numbers_learned):
+        """
+        Record the fields the full pipeline found for a document
+
+        Args:
+            signature: ``layout_signature`` of the document
+            terms: The term list that was searched
+            found_by_page: {page_num: {"terms": [Rect], "numbers": [Rect]}}
+            numbers_learned: Whether number detection ran (so an empty
+                ``numbers`` list means "no currency fields")
+        """
+        # Empty lists are stored too: "searched, nothing found"
+        term_fields = {str(page_num): [list(r) for r in found.get("terms") or []]
+                       for page_num, found in found_by_page.items()}
+        number_fields = {str(page_num): [list(r) for r in found.get("numbers") or []]
+                         for page_num, found in found_by_page.items()}
+
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")  # One writer at a time across processes
+            conn.execute("INSERT INTO templates (signature, numbers, last_used) VALUES (?, ?, ?) "
+                         "ON CONFLICT(signature) DO UPDATE SET last_used=excluded.last_used"
+                         + (", numbers=excluded.numbers" if numbers_learned else ""),
+                         (signature, json.dumps(number_fields) if numbers_learned else None, now))
+            conn.execute("INSERT OR REPLACE INTO template_terms (signature, terms_key, fields, created_at) "
+                         "VALUES (?, ?, ?, ?)", (signature, terms_key(terms), json.dumps(term_fields), now))
+            # Oldest term lists of this template, then least recently used templates
+            conn.execute("DELETE FROM template_terms WHERE signature=? AND terms_key NOT IN ("
+                         "SELECT terms_key FROM template_terms WHERE signature=? ORDER BY created_at DESC LIMIT ?)",
+                         (signature, signature, MAX_TERM_LISTS))
+            conn.execute("DELETE FROM templates WHERE signature NOT IN ("
+                         "SELECT signature FROM templates ORDER BY last_used DESC LIMIT ?)", (self.max_templates,))
+            conn.execute("DELETE FROM template_terms WHERE signature NOT IN (SELECT signature FROM templates)")
+
+
+_registries = {}
+
+
+def get_registry(path):
+    """Registry for a path, opened once per process (e.g. per pool worker)"""
+    if path not in _registries:
+        _registries[path] = TemplateRegistry(path)
+    return _registries[path]
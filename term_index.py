@@ -0,0 +1,159 @@
+# term_index.py
+import re
+import bisect
+import logging
+import fitz
+
+_EDGE_PUNCT = re.compile(r"^\W+|\W+$")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalise_token(word):
+    """Lowercase a word and strip leading/trailing punctuation"""
+    return _EDGE_PUNCT.sub("", word.lower())
+
+
+def normalise_text(text):
+    """Lowercase text and collapse whitespace runs (for substring checks)"""
+    return _WHITESPACE.sub(" ", text.lower()).strip()
+
+
+class TermIndex:
+    """
+    Per-document inverted index: normalised token -> pages and rectangles
+
+    Built once when a document is uploaded so candidate terms can be checked
+    instantly ("where does this occur?") and so the redaction pass only runs
+    ``search_for`` on pages that can actually contain a term.
+
+    Args:
+        doc: Open ``fitz.Document`` to index (not closed by the index)
+    """
+
+    def __init__(self, doc):
+        self.page_count = doc.page_count
+        self.postings = {}     # token -> list of (page_num, word_idx)
+        self.page_words = []   # page_num -> list of (token, rect tuple, line key)
+        self.page_texts = []   # page_num -> normalised page text
+
+        for page in doc:
+            words = []
+            for x0, y0, x1, y1, text, block_no, line_no, _ in page.get_text("words"):
+                token = normalise_token(text)
+                if not token:
+                    continue
+                self.postings.setdefault(token, []).append((page.number, len(words)))
+                words.append((token, (x0, y0, x1, y1), (block_no, line_no)))
+            self.page_words.append(words)
+
+            # Keep plain and dehyphenated text so substring checks never miss
+            # a match that search_for would find
+            plain = page.get_text("text")
+            dehyphenated = page.get_text("text", flags=fitz.TEXT_DEHYPHENATE)
+            self.page_texts.append(normalise_text(plain) + "\n" + normalise_text(dehyphenated))
+
+        self.tokens = sorted(self.postings)
+        logging.info("Term index built: %d pages, %d distinct tokens", self.page_count, len(self.tokens))
+
+    @classmethod
+    def from_bytes(cls, pdf_bytes):
+        """Build an index straight from PDF bytes"""
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        try:
+            return cls(doc)
+        finally:
+            doc.close()
+
+    def complete(self, prefix, limit=10):
+        """
+        Tokens starting with a prefix, most frequent first
+
+        Args:
+            prefix: Partial word typed by the user
+            limit: Maximum number of completions
+
+        Returns:
+            list: (token, hit count) tuples
+        """
+        prefix = normalise_token(prefix)
+        if not prefix:
+            return []
+        start = bisect.bisect_left(self.tokens, prefix)
+        end = bisect.bisect_left(self.tokens, prefix + "\uffff")
+        matches = [(token, len(self.postings[token])) for token in self.tokens[start:end]]
+        matches.sort(key=lambda item: item[1], reverse=True)
+        return matches[:limit]
+
+    def _phrase_hits(self, tokens, prefix):
+        """Yield (page_num, [word entries]) for consecutive-token matches"""
+        if len(tokens) == 1 and prefix:
+            start = bisect.bisect_left(self.tokens, tokens[0])
+            end = bisect.bisect_left(self.tokens, tokens[0] + "\uffff")
+            first_postings = [p for token in self.tokens[start:end] for p in self.postings[token]]
+        else:
+            first_postings = self.postings.get(tokens[0], [])
+
+        for page_num, word_idx in first_postings:
+            words = self.page_words[page_num]
+            span = words[word_idx:word_idx + len(tokens)]
+            if len(span) != len(tokens):
+                continue
+            matched = True
+            for pos, (token, _, _) in enumerate(span[1:], start=1):
+                wanted = tokens[pos]
+                last = pos == len(tokens) - 1
+                if token != wanted and not (prefix and last and token.startswith(wanted)):
+                    matched = False
+                    break
+            if matched:
+                yield page_num, span
+
+    def lookup(self, term, prefix=False):
+        """
+        Find where a candidate term occurs
+
+        Args:
+            term: Word or phrase to look up
+            prefix: Treat the last word as a prefix (for type-ahead)
+
+        Returns:
+            dict: term, hit count, sorted page numbers (1-based) and
+                  hits as (page number, rect) pairs with one rect per line
+        """
+        tokens = [normalise_token(t) for t in term.split()]
+        tokens = [t for t in tokens if t]
+        result = {"term": term, "count": 0, "pages": [], "hits": []}
+        if not tokens:
+            return result
+
+        pages = set()
+        for page_num, span in self._phrase_hits(tokens, prefix):
+            # Phrases can wrap; emit one rectangle per line
+            line_rects = {}
+            for _, rect, line_key in span:
+                if line_key in line_rects:
+                    line_rects[line_key] |= fitz.Rect(rect)
+                else:
+                    line_rects[line_key] = fitz.Rect(rect)
+            for rect in line_rects.values():
+                result["hits"].append((page_num + 1, rect))
+            result["count"] += 1
+            pages.add(page_num + 1)
+
+        result["pages"] = sorted(pages)
+        return result
+
+    def candidate_pages(self, term):
+        """
+        Pages whose text contains a term as a substring (case-insensitive)
+
+        This is a superset of the pages where ``page.search_for`` finds the
+        term, so the redaction pass can skip all other pages safely.
+
+        Returns:
+            set: 0-based page numbers
+        """
+        needle = normalise_text(term)
+        if not needle:
+            return set()
+        return {n for n, text in enumerate(self.page_texts) if needle in text}
@@ -0,0 +1,210 @@
+# visual_diff.py
+import logging
+import fitz
+import numpy as np
+
+DIFF_DPI = 50           # Low DPI is plenty to locate redaction boxes
+DIFF_THRESHOLD = 24     # Grey-level difference that counts as a change
+TILE_SIZE = 8           # Pixels per tile when grouping changes into regions
+OVERLAY_COLOR = (230, 40, 40)
+
+
+def render_gray(page, dpi=DIFF_DPI):
+    """
+    Rasterise a page to a greyscale NumPy array
+
+    Args:
+        page: PyMuPDF page object
+        dpi: Render resolution
+
+    Returns:
+        numpy.ndarray: uint8 array of shape (height, width)
+    """
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+    samples = np.frombuffer(pix.samples, dtype=np.uint8)
+    return samples.reshape(pix.height, pix.stride)[:, :pix.width]
+
+
+def changed_mask(original, redacted, threshold=DIFF_THRESHOLD):
+    """
+    Boolean mask of pixels that differ between two renders
+
+    Renders of different size (e.g. a page box changed) are compared over
+    their common area; everything outside it counts as changed.
+    """
+    height = max(original.shape[0], redacted.shape[0])
+    width = max(original.shape[1], redacted.shape[1])
+    common_h = min(original.shape[0], redacted.shape[0])
+    common_w = min(original.shape[1], redacted.shape[1])
+
+    mask = np.ones((height, width), dtype=bool)
+    diff = np.abs(original[:common_h, :common_w].astype(np.int16) -
+                  redacted[:common_h, :common_w].astype(np.int16))
+    mask[:common_h, :common_w] = diff > threshold
+    return mask
+
+
+def tile_grid(mask, tile=TILE_SIZE):
+    """Reduce a pixel mask to a tile mask (a tile is set if any pixel in it is)"""
+    height, width = mask.shape
+    rows = -(-height // tile)
+    cols = -(-width // tile)
+    padded = np.zeros((rows * tile, cols * tile), dtype=bool)
+    padded[:height, :width] = mask
+    return padded.reshape(rows, tile, cols, tile).any(axis=(1, 3))
+
+
+def tile_regions(tiles):
+    """
+    Group set tiles into connected regions (8-connectivity)
+
+    Labels are propagated with whole-array NumPy operations (each set tile
+    takes the largest label among its neighbours, and labels that meet are
+    merged with pointer jumping, until nothing changes), so the work runs
+    outside the GIL and worker threads analysing other pages are not held
+    up. The number of rounds grows with the log of a region's length.
+
+    Returns:
+        list: (row0, col0, row1, col1) tile bounds, end-exclusive
+    """
+    rows, cols = np.nonzero(tiles)
+    if not len(rows):
+        return []
+    height, width = tiles.shape
+    labels = np.zeros((height + 2, width + 2), dtype=np.int32)
+    inner = labels[1:-1, 1:-1]
+    inner[rows, cols] = np.arange(1, len(rows) + 1, dtype=np.int32)
+    while True:
+        spread = inner.copy()
+        for dr in (0, 1, 2):
+            for dc in (0, 1, 2):
+                np.maximum(spread, labels[dr:dr + height, dc:dc + width], out=spread)
+        # Every label takes the largest label any of its tiles reached, then
+        # label chains are followed to their end, so merges compound
+        best = np.arange(len(rows) + 1, dtype=np.int32)
+        np.maximum.at(best, inner[rows, cols], spread[rows, cols])
+        while True:
+            jumped = best[best]
+            if np.array_equal(jumped, best):
+                break
+            best = jumped
+        merged = best[inner]
+        if np.array_equal(merged, inner):
+            break
+        inner[...] = merged
+
+    # Bounding box per label: sort the set tiles by label, reduce each run
+    found = inner[rows, cols]
+    order = np.argsort(found, kind="stable")
+    found, rows, cols = found[order], rows[order], cols[order]
+    starts = np.flatnonzero(np.r_[True, found[1:] != found[:-1]])
+    regions = list(zip(np.minimum.reduceat(rows, starts).tolist(), np.minimum.reduceat(cols, starts).tolist(),
+                       (np.maximum.reduceat(rows, starts) + 1).tolist(), (np.maximum.reduceat(cols, starts) + 1).tolist()))
+    regions.sort()
+    return regions
+
+
+def overlay_image(redacted, mask, regions, tile=TILE_SIZE):
+    """
+    PNG of the redacted render with changed pixels tinted and regions outlined
+
+    Returns:
+        bytes: PNG image
+    """
+    height, width = redacted.shape
+    rgb = np.repeat(redacted[:, :, None], 3, axis=2).astype(np.uint16)
+    tint = mask[:height, :width]
+    color = np.array(OVERLAY_COLOR, dtype=np.uint16)
+    rgb[tint] = (rgb[tint] + color) // 2
+    rgb = rgb.astype(np.uint8)
+
+    for r0, c0, r1, c1 in regions:
+        y0, x0 = r0 * tile, c0 * tile
+        if y0 >= height or x0 >= width:
+            continue  # Region lies outside this render (page size changed)
+        y1, x1 = min(r1 * tile, height) - 1, min(c1 * tile, width) - 1
+        rgb[y0, x0:x1 + 1] = OVERLAY_COLOR
+        rgb[y1, x0:x1 + 1] = OVERLAY_COLOR
+        rgb[y0:y1 + 1, x0] = OVERLAY_COLOR
+        rgb[y0:y1 + 1, x1] = OVERLAY_COLOR
+
+    pix = fitz.Pixmap(fitz.csRGB, width, height, np.ascontiguousarray(rgb).tobytes(), False)
+    return pix.tobytes("png")
+
+
+def diff_pages(original_page, redacted_page, dpi=DIFF_DPI, threshold=DIFF_THRESHOLD, tile=TILE_SIZE, overlay=True):
+    """
+    Diff one pair of pages
+
+    Returns:
+        dict or None: boxes (fitz.Rect in PDF points), changed_ratio and the
+        overlay PNG, or None if the pages render identically
+    """
+    original = render_gray(original_page, dpi)
+    redacted = render_gray(redacted_page, dpi)
+
+    # Byte-identical renders need no array work at all
+    if original.shape == redacted.shape and original.tobytes() == redacted.tobytes():
+        return None
+
+    mask = changed_mask(original, redacted, threshold)
+    if not mask.any():
+        return None
+
+    regions = tile_regions(tile_grid(mask, tile))
+    scale = 72.0 / dpi
+    height, width = mask.shape
+    boxes = [
+        fitz.Rect(c0 * tile * scale, r0 * tile * scale,
+                  min(c1 * tile, width) * scale, min(r1 * tile, height) * scale)
+        for r0, c0, r1, c1 in regions
+    ]
+    return {
+        "boxes": boxes,
+        "changed_ratio": float(mask.mean()),
+        "overlay": overlay_image(redacted, mask, regions, tile) if overlay else None,
+    }
+
+
+def diff_documents(original_path, redacted_path, dpi=DIFF_DPI, threshold=DIFF_THRESHOLD, tile=TILE_SIZE,
+                   overlay=True, max_pages=None):
+    """
+    Diff matching pages of an original PDF and its redacted version
+
+    Pages that render identically are skipped, so the result only lists
+    pages a reviewer needs to look at.
+
+    Args:
+        original_path: Original PDF
+        redacted_path: Redacted (``_masked.pdf``) PDF
+        dpi: Render resolution
+        threshold: Grey-level difference that counts as a change
+        tile: Tile size (pixels) used to group changes into regions
+        overlay: Build an overlay PNG per changed page
+        max_pages: Only diff the first ``max_pages`` pages
+
+    Returns:
+        list: dicts with page (1-based), boxes, changed_ratio and overlay
+    """
+    original_doc = fitz.open(original_path)
+    redacted_doc = fitz.open(redacted_path)
+    try:
+        if original_doc.page_count != redacted_doc.page_count:
+            logging.warning("Page count differs: %d original vs %d redacted",
+                            original_doc.page_count, redacted_doc.page_count)
+        page_count = min(original_doc.page_count, redacted_doc.page_count)
+        if max_pages is not None:
+            page_count = min(page_count, max_pages)
+
+        changes = []
+        for page_num in range(page_count):
+            result = diff_pages(original_doc[page_num], redacted_doc[page_num], dpi, threshold, tile, overlay)
+            if result:
+                result["page"] = page_num + 1
+                changes.append(result)
+
+        logging.info("Visual diff: %d of %d page(s) changed", len(changes), page_count)
+        return changes
+    finally:
+        original_doc.close()
+        redacted_doc.close()